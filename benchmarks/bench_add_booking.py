@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+'''
+Benchmarks Booking.add_booking and reports the p50/p99 latency and the statements per booking.
+
+Network round trips are what dominate add_booking against MySQL. To make them visible on a local SQLite database,
+--rtt-ms adds a simulated round-trip delay to every statement and commit.
+
+    python benchmarks/bench_add_booking.py -n 500 --rtt-ms 0.5
+'''
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+# Use a throwaway SQLite database unless DATABASE_URL is set, and import the API modules from src/
+DATABASE_PATH: str = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DATABASE_PATH}")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from sqlalchemy import event
+from utils import crud, models, schemas
+from utils.database import engine, SessionLocal
+
+
+def setup_database(rooms: int) -> None:
+    '''Creates the tables and the reference data, like create-tables-1.sql does.'''
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.add_all([models.BookingStatus(name=name) for name in ["Unconfirmed", "Booked", "Ongoing", "Complete", "Cancelled"]])
+        db.add_all([models.GovtIdType(name=name) for name in ["AADHAR", "PAN", "Voter ID", "Driving License", "Passport"]])
+        db.add_all([models.RoomType(room_type=name) for name in ["Standard", "Delux", "Club", "Suite"]])
+        db.add_all([models.RoomState(room_state=name) for name in ["Booked", "Available", "Maintenance"]])
+        db.add(models.Employee(emp_id=1001, first_name="Front", last_name="Desk", email="desk@example.com",
+                               phone="9000000000", is_active=True, password_hash="x"))
+        db.add(models.EmployeeAddress(emp_id=1001, first_line="1 Main Rd", second_line="Block A", landmark=None,
+                                      district="Central", state="KA", pin="560001", address_type="Permanent"))
+        db.add_all([models.Room(room_number=100 + i, r_type_id=1, state_id=2) for i in range(rooms)])
+        db.add(models.BookingIdGenerator(last_booking_id=1001))
+        db.commit()
+
+
+def booking_payload(room_number: int, guest: int) -> schemas.BookingIn:
+    return schemas.BookingIn(
+        customer=schemas.CustomerIn(
+            customer_details=schemas.CustomerBase(first_name="Bench", middle_name=None, last_name="Guest",
+                                                  email=f"bench{guest}@example.com", phone=f"95{guest:08d}"),
+            customer_address=schemas.CustomerAddressBase(first_line="1 Bench Rd", second_line="Block B", landmark=None,
+                                                         district="Central", state="KA", pin="560001", address_type="Permanent")),
+        booking=schemas.BookingBase(booked_on=datetime(2024, 1, 1), checkin=date(2024, 2, 1), checkout=date(2024, 2, 3),
+                                    government_id_type="PAN", government_id_number="PAN1", room_num=room_number,
+                                    comments=None, emp_id=1001))
+
+
+def percentile(values: list[float], p: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * p))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--bookings", type=int, default=300)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="Simulated round-trip time per statement and commit.")
+    parser.add_argument("--new-customers", action="store_true", help="Create a new customer with every booking.")
+    args = parser.parse_args()
+
+    setup_database(args.bookings)
+    statements: list[int] = [0]
+
+    def round_trip(*_) -> None:
+        statements[0] += 1
+        if args.rtt_ms:
+            time.sleep(args.rtt_ms / 1000)
+
+    event.listen(engine, "before_cursor_execute", round_trip)
+    event.listen(engine, "commit", round_trip)
+
+    latencies: list[float] = []
+    for i in range(args.bookings):
+        payload: schemas.BookingIn = booking_payload(100 + i, i if args.new_customers else 0)
+        with SessionLocal() as db:
+            start: float = time.perf_counter()
+            crud.Booking(db).add_booking(payload)
+            latencies.append((time.perf_counter() - start) * 1000)
+    # The first booking also warms the caches and creates the customer
+    latencies, round_trips = latencies[1:], statements[0]
+    print(f"bookings: {args.bookings}  rtt: {args.rtt_ms} ms  new customers: {args.new_customers}")
+    print(f"round trips per booking: {round_trips / args.bookings:.1f}")
+    print(f"p50: {statistics.median(latencies):.2f} ms  p99: {percentile(latencies, 0.99):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
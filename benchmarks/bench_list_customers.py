@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+'''
+Benchmarks Customer.list_customers and Employee.list_employees, the read paths of /cust/list/ and /emp/list/,
+and reports the CPU time and the peak memory allocated per row returned.
+
+    python benchmarks/bench_list_customers.py -n 5000 --page 500
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Use a throwaway SQLite database unless DATABASE_URL is set, and import the API modules from src/
+DATABASE_PATH: str = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DATABASE_PATH}")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from sqlalchemy import insert
+from utils import crud, models
+from utils.database import engine, SessionLocal
+
+
+def setup_database(rows: int) -> None:
+    '''Creates the tables with rows customers and rows employees, each with one address.'''
+    models.Base.metadata.create_all(bind=engine)
+    address: dict = {"first_line": "1 Bench Rd", "second_line": "Block B", "landmark": None, "district": "Central",
+                     "state": "KA", "pin": "560001", "address_type": "Permanent"}
+    with SessionLocal() as db:
+        db.execute(insert(models.Customer), [
+            {"customer_id": i, "first_name": "Bench", "middle_name": None, "last_name": "Guest",
+             "email": f"guest{i}@example.com", "phone": f"95{i:08d}"} for i in range(1, rows + 1)])
+        db.execute(insert(models.CustomerAddress), [{**address, "customer_id": i} for i in range(1, rows + 1)])
+        db.execute(insert(models.Employee), [
+            {"emp_id": i, "first_name": "Bench", "middle_name": None, "last_name": "Clerk", "email": f"clerk{i}@example.com",
+             "phone": f"90{i:08d}", "is_active": True, "password_hash": "x" * 60, "login_count": 0} for i in range(1, rows + 1)])
+        db.execute(insert(models.EmployeeAddress), [{**address, "emp_id": i} for i in range(1, rows + 1)])
+        db.commit()
+
+
+def measure(name: str, rows: int, page: int, list_page) -> None:
+    '''Lists all the rows page by page, following the cursors, and prints the time and peak memory per row.'''
+    tracemalloc.start()
+    start: float = time.process_time()
+    with SessionLocal() as db:
+        cursor: str|None = None
+        listed: int = 0
+        while True:
+            result, cursor = list_page(db, page, cursor)
+            listed += len(result)
+            if cursor is None:
+                break
+    elapsed: float = time.process_time() - start
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert listed == rows, f"{name} listed {listed} of {rows} rows"
+    print(f"{name}: {elapsed / rows * 1e6:.1f} us/row  peak {peak / page:.0f} B/row of a page")
+
+
+def list_customers(db, limit: int, cursor: str|None):
+    customer = crud.Customer(db)
+    return customer.list_customers(0, limit, cursor), customer.next_cursor
+
+
+def list_employees(db, limit: int, cursor: str|None):
+    employee = crud.Employee(db)
+    return employee.list_employees(0, limit, cursor=cursor), employee.next_cursor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--rows", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=500, help="Rows per page.")
+    args = parser.parse_args()
+
+    setup_database(args.rows)
+    print(f"rows: {args.rows}  page: {args.page}")
+    measure("/cust/list/", args.rows, args.page, list_customers)
+    measure("/emp/list/", args.rows, args.page, list_employees)
+
+
+if __name__ == "__main__":
+    main()
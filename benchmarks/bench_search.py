@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+'''
+Benchmarks the customer search index behind /cust/search/: the time to build it from the Customers table,
+its size, and the latency of searches by partial name, name with a typo, partial phone and email.
+
+    python benchmarks/bench_search.py -n 1000000
+'''
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Use a throwaway SQLite database unless DATABASE_URL is set, and import the API modules from src/
+DATABASE_PATH: str = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DATABASE_PATH}")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from sqlalchemy import insert
+from utils import models
+from utils.database import engine, SessionLocal
+from utils.search_index import customer_search
+
+FIRST_NAMES: list[str] = ["Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Ayaan", "Krishna", "Ishaan",
+                          "Ananya", "Diya", "Aadhya", "Saanvi", "Pari", "Anika", "Navya", "Myra", "Sara", "Meera"]
+LAST_NAMES: list[str] = ["Sharma", "Verma", "Iyer", "Nair", "Reddy", "Rao", "Gupta", "Patel", "Mehta", "Joshi",
+                         "Kulkarni", "Menon", "Pillai", "Bose", "Das", "Sen", "Chopra", "Kapoor", "Malhotra", "Banerjee"]
+
+
+def setup_database(rows: int) -> None:
+    '''Creates the Customers table with rows customers of random names.'''
+    models.Base.metadata.create_all(bind=engine)
+    rng: random.Random = random.Random(7)
+    with SessionLocal() as db:
+        for start in range(1, rows + 1, 50000):
+            db.execute(insert(models.Customer), [
+                {"customer_id": i, "first_name": rng.choice(FIRST_NAMES), "middle_name": None, "last_name": f"{rng.choice(LAST_NAMES)}{i % 997}",
+                 "email": f"guest{i}@example.com", "phone": f"9{i:09d}"} for i in range(start, min(start + 50000, rows + 1))])
+        db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50, help="Searches per query.")
+    args = parser.parse_args()
+
+    setup_database(args.rows)
+    with SessionLocal() as db:
+        start: float = time.perf_counter()
+        customer_search.load(db)
+        print(f"rows: {args.rows}  build: {time.perf_counter() - start:.1f} s  {customer_search.stats()}")
+        queries: dict[str, str] = {
+            "partial name": "kulkar",
+            "full name": "ananya kulkarni512",
+            "typo": "kulkrni512",
+            "partial phone": f"9{args.rows // 2:09d}"[:8],
+            "email": f"guest{args.rows // 3}@",
+        }
+        for name, query in queries.items():
+            timings: list[float] = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                ids: list[int] = customer_search.search(db, query, 0, 20)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{name:14} {query!r:24} median {statistics.median(timings):6.2f} ms  max {max(timings):6.2f} ms  {len(ids)} results")
+
+
+if __name__ == "__main__":
+    main()
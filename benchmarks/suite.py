@@ -0,0 +1,440 @@
+#!/usr/bin/env python
+'''
+Benchmark suite of the API and the crud layer. It seeds a local database to the given sizes, serves the FastAPI api
+with uvicorn and measures the throughput and the p50/p95/p99 latency of the main endpoints over HTTP, then times
+the crud methods behind them. The results are written as JSON; compare them with a baseline to find regressions.
+
+    python benchmarks/suite.py run --customers 10000 --bookings 10000 --out results.json
+    python benchmarks/suite.py run --out results.json --baseline baseline.json
+    python benchmarks/suite.py compare baseline.json results.json --threshold 0.2
+
+The database is a throwaway SQLite file unless DATABASE_URL is set. Against MySQL, point DATABASE_URL at an empty
+database: the suite creates the tables and the reference data, like create-tables-1.sql does.
+Results are only comparable when they come from the same machine, database and sizes; compare warns when the sizes differ.
+'''
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+# Use a throwaway SQLite database unless DATABASE_URL is set, and import the API modules from src/
+DATABASE_PATH: str = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DATABASE_PATH}")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("BLOB_STORE_PATH", os.path.join(os.path.dirname(DATABASE_PATH), "blobs"))
+ROOT_PATH: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_PATH, "src"))
+
+# Version of the results format
+RESULTS_VERSION: int = 1
+BENCH_EMAIL: str = "bench@example.com"
+BENCH_PASSWORD: str = "bench-password"
+# First day of the seeded bookings. The bookings made by the benchmark come after them.
+SEED_CHECKIN: date = date(2024, 2, 1)
+SEED_BATCH_SIZE: int = 10000
+FIRST_NAMES: list[str] = ["Aarav", "Vivaan", "Aditya", "Arjun", "Ishaan", "Ananya", "Diya", "Saanvi", "Navya", "Meera"]
+LAST_NAMES: list[str] = ["Sharma", "Verma", "Iyer", "Nair", "Reddy", "Rao", "Gupta", "Patel", "Mehta", "Joshi"]
+
+
+@dataclass
+class Sizes:
+    customers: int
+    rooms: int
+    bookings: int
+    employees: int
+
+
+@dataclass
+class Result:
+    # "api" or "crud"
+    kind: str
+    name: str
+    requests: int
+    errors: int
+    throughput_rps: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+@dataclass
+class Regression:
+    name: str
+    metric: str
+    baseline: float
+    current: float
+    # Relative change, positive when worse
+    change: float
+
+
+def percentile(values: list[float], p: float) -> float:
+    '''Returns the p quantile (0 to 1) of the values by the nearest-rank method.'''
+    ordered: list[float] = sorted(values)
+    # The rank is rounded first so that e.g. 100 * 0.95 isn't read as 95.00000000000001
+    return ordered[min(len(ordered), max(1, math.ceil(round(len(ordered) * p, 9)))) - 1]
+
+
+def summarize(kind: str, name: str, latencies: list[float], errors: int, elapsed: float) -> Result:
+    '''Returns the result of a benchmark from its latencies in milliseconds and its wall time in seconds.'''
+    return Result(kind=kind, name=name, requests=len(latencies), errors=errors,
+                  throughput_rps=round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+                  mean_ms=round(statistics.fmean(latencies), 3), p50_ms=round(percentile(latencies, 0.50), 3),
+                  p95_ms=round(percentile(latencies, 0.95), 3), p99_ms=round(percentile(latencies, 0.99), 3))
+
+
+#==========================
+# Database
+#==========================
+def seed_database(sizes: Sizes) -> None:
+    '''Bootstraps the database, then adds the customers, rooms, bookings and employees of the given sizes.'''
+    from sqlalchemy import insert, update
+    from utils import migrations, models
+    from utils.database import engine, SessionLocal
+    from utils.hashing import password_hasher
+
+    rng: random.Random = random.Random(7)
+    address: dict = {"first_line": "1 Bench Rd", "second_line": "Block B", "landmark": None, "district": "Central",
+                     "state": "KA", "pin": "560001", "address_type": "Permanent"}
+    if not migrations.bootstrap(engine, log=lambda line: None):
+        raise RuntimeError("The benchmark database should be empty.")
+    with SessionLocal() as db:
+        db.execute(update(models.BookingIdGenerator).values(last_booking_id=1001 + sizes.bookings))
+        # The employee the benchmark logs in as, then the other employees, who share its password hash
+        password_hash: str = password_hasher.hash(BENCH_PASSWORD)
+        db.execute(insert(models.Employee), [
+            {"emp_id": i, "first_name": "Bench", "middle_name": None, "last_name": "Clerk",
+             "email": BENCH_EMAIL if i == 1 else f"clerk{i}@example.com", "phone": f"90{i:08d}",
+             "is_active": True, "password_hash": password_hash, "login_count": 0} for i in range(1, sizes.employees + 1)])
+        db.execute(insert(models.EmployeeAddress), [{**address, "emp_id": i} for i in range(1, sizes.employees + 1)])
+        # Standard, Club and Suite rooms. The "Delux" type of the reference data isn't a schemas.RoomType, so its rooms can't be listed.
+        db.execute(insert(models.Room), [
+            {"room_id": i, "room_number": 100 + i, "r_type_id": (1, 3, 4)[i % 3], "state_id": 2} for i in range(1, sizes.rooms + 1)])
+        for start in range(1, sizes.customers + 1, SEED_BATCH_SIZE):
+            ids: range = range(start, min(start + SEED_BATCH_SIZE, sizes.customers + 1))
+            db.execute(insert(models.Customer), [
+                {"customer_id": i, "first_name": rng.choice(FIRST_NAMES), "middle_name": None, "last_name": rng.choice(LAST_NAMES),
+                 "email": f"guest{i}@example.com", "phone": f"95{i:08d}"} for i in ids])
+            db.execute(insert(models.CustomerAddress), [{**address, "customer_id": i} for i in ids])
+        # Each room gets consecutive two-night bookings, so that the seeded bookings never overlap
+        for start in range(0, sizes.bookings, SEED_BATCH_SIZE):
+            db.execute(insert(models.Booking), [
+                {"booking_id": f"B{1002 + i}", "booked_on": datetime(2024, 1, 1),
+                 "checkin": SEED_CHECKIN + timedelta(days=2 * (i // sizes.rooms)),
+                 "checkout": SEED_CHECKIN + timedelta(days=2 * (i // sizes.rooms) + 2), "govt_id_num": f"ID{i}",
+                 "exp_date": None, "comments": None, "booking_status_id": 2, "customer_id": 1 + i % sizes.customers,
+                 "room_id": 1 + i % sizes.rooms, "govt_id_type_id": 2, "emp_id": 1 + i % sizes.employees}
+                for i in range(start, min(start + SEED_BATCH_SIZE, sizes.bookings))])
+        db.commit()
+
+
+def booking_payload(sizes: Sizes, i: int) -> dict:
+    '''Returns the /booking/add/ payload of the i-th booking made by the benchmark: an existing customer and a free room.'''
+    # The nights after the seeded bookings, two per booking and room
+    first_free: date = SEED_CHECKIN + timedelta(days=2 * (sizes.bookings // sizes.rooms + 1))
+    checkin: date = first_free + timedelta(days=2 * (i // sizes.rooms))
+    customer: int = 1 + i % sizes.customers
+    return {
+        "customer": {
+            "customer_details": {"first_name": "Bench", "middle_name": None, "last_name": "Guest",
+                                 "email": f"guest{customer}@example.com", "phone": f"95{customer:08d}"},
+            "customer_address": {"first_line": "1 Bench Rd", "second_line": "Block B", "landmark": None,
+                                 "district": "Central", "state": "KA", "pin": "560001", "address_type": "Permanent"}},
+        "booking": {"booked_on": "2024-01-01T00:00:00", "checkin": checkin.isoformat(), "checkout": (checkin + timedelta(days=2)).isoformat(),
+                    "government_id_type": "PAN", "government_id_number": "PAN1", "room_num": 101 + i % sizes.rooms,
+                    "comments": None, "emp_id": 1},
+    }
+
+
+#==========================
+# API benchmarks
+#==========================
+class Server:
+    '''Serves the api with uvicorn on a free local port, in a background thread.'''
+    def __init__(self):
+        import uvicorn
+        import cloudbeds
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port: int = probe.getsockname()[1]
+        self.url: str = f"http://127.0.0.1:{self.port}"
+        self.__server = uvicorn.Server(uvicorn.Config(cloudbeds.api, host="127.0.0.1", port=self.port, log_level="warning", access_log=False))
+        self.__thread = threading.Thread(target=self.__server.run, daemon=True)
+
+    def __enter__(self) -> "Server":
+        self.__thread.start()
+        while not self.__server.started:
+            if not self.__thread.is_alive():
+                raise RuntimeError("The API server didn't start.")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.__server.should_exit = True
+        self.__thread.join()
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    # Returns the keyword arguments of the i-th request, such as params or json
+    request: Callable[[int], dict]
+    path: str
+    # Sent without the access token
+    anonymous: bool = False
+    # Requests per run. Defaults to --requests.
+    requests: int|None = None
+
+
+def api_endpoints(sizes: Sizes, requests: int) -> list[Endpoint]:
+    '''Returns the benchmarked endpoints. Each request reads a different page or row, so that no single row stays cached.'''
+    rng: random.Random = random.Random(11)
+    return [
+        # bcrypt makes logins much slower than the other requests; a few are enough for stable percentiles
+        Endpoint("/auth/token", "POST", lambda i: {"data": {"username": BENCH_EMAIL, "password": BENCH_PASSWORD}}, "/auth/token",
+                 anonymous=True, requests=max(10, requests // 10)),
+        Endpoint("/booking/add/", "POST", lambda i: {"json": booking_payload(sizes, i)}, "/booking/add/"),
+        Endpoint("/booking/list/", "GET", lambda i: {"params": {"skip": rng.randrange(max(1, sizes.bookings - 20)), "limit": 20}}, "/booking/list/"),
+        Endpoint("/room/list/", "GET", lambda i: {"params": {"skip": rng.randrange(max(1, sizes.rooms - 20)), "limit": 20}}, "/room/list/"),
+        Endpoint("/cust/", "GET", lambda i: {"params": {"query": f"95{1 + rng.randrange(sizes.customers):08d}"}}, "/cust/"),
+        Endpoint("/emp/list/", "GET", lambda i: {"params": {"skip": rng.randrange(max(1, sizes.employees - 20)), "limit": 20}}, "/emp/list/"),
+    ]
+
+
+def run_endpoint(url: str, token: str, endpoint: Endpoint, requests: int, concurrency: int, warmup: int) -> Result:
+    '''Sends the requests of the endpoint from concurrency clients and returns their latencies.'''
+    import httpx
+    headers: dict = {} if endpoint.anonymous else {"Authorization": f"Bearer {token}"}
+    counter: list[int] = [0]
+    counter_lock = threading.Lock()
+    latencies: list[float] = []
+    errors: list[int] = [0]
+
+    def next_index() -> int|None:
+        with counter_lock:
+            if counter[0] >= warmup + requests:
+                return None
+            counter[0] += 1
+            return counter[0] - 1
+
+    def client_loop() -> None:
+        with httpx.Client(base_url=url, headers=headers, timeout=60) as client:
+            while (i := next_index()) is not None:
+                start: float = time.perf_counter()
+                response = client.request(endpoint.method, endpoint.path, **endpoint.request(i))
+                elapsed: float = (time.perf_counter() - start) * 1000
+                with counter_lock:
+                    if i >= warmup:
+                        latencies.append(elapsed)
+                        if response.status_code >= 400:
+                            errors[0] += 1
+
+    # The first warmup requests aren't measured
+    threads: list[threading.Thread] = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    start: float = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize("api", endpoint.name, latencies, errors[0], time.perf_counter() - start)
+
+
+def run_api(sizes: Sizes, requests: int, concurrency: int, warmup: int, only: set[str]|None, log: Callable[[str], None]) -> list[Result]:
+    '''Benchmarks the endpoints over HTTP.'''
+    import httpx
+    results: list[Result] = []
+    with Server() as server:
+        token: str = httpx.post(f"{server.url}/auth/token", data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD}).json()["access_token"]
+        for endpoint in api_endpoints(sizes, requests):
+            if only is not None and endpoint.name not in only:
+                continue
+            result: Result = run_endpoint(server.url, token, endpoint, endpoint.requests or requests, concurrency, warmup)
+            log(format_result(result))
+            results.append(result)
+    return results
+
+
+#==========================
+# crud benchmarks
+#==========================
+def crud_benchmarks(sizes: Sizes) -> list[tuple[str, Callable]]:
+    '''Returns the crud methods behind the benchmarked endpoints, by name. Each one takes a session and the run number.'''
+    from utils import crud
+    rng: random.Random = random.Random(13)
+    middle: date = SEED_CHECKIN + timedelta(days=sizes.bookings // sizes.rooms)
+    # The last seeded nights, when only part of the rooms are booked
+    last: date = SEED_CHECKIN + timedelta(days=2 * (sizes.bookings // sizes.rooms))
+    return [
+        ("Customer.get_customer", lambda db, i: crud.Customer(db).get_customer(f"95{1 + rng.randrange(sizes.customers):08d}")),
+        ("Customer.get_customers", lambda db, i: crud.Customer(db).get_customers([f"guest{1 + rng.randrange(sizes.customers)}@example.com" for _ in range(50)])),
+        ("Customer.list_customers", lambda db, i: crud.Customer(db).list_customers(rng.randrange(max(1, sizes.customers - 20)), 20)),
+        ("Customer.search_customers", lambda db, i: crud.Customer(db).search_customers(rng.choice(LAST_NAMES)[:5], 0, 20)),
+        ("Employee.list_employees", lambda db, i: crud.Employee(db).list_employees(rng.randrange(max(1, sizes.employees - 20)), 20)),
+        ("Room.list_rooms", lambda db, i: crud.Room(db).list_rooms(rng.randrange(max(1, sizes.rooms - 20)), 20)),
+        ("Room.list_available_rooms", lambda db, i: crud.Room(db).list_available_rooms(last, last + timedelta(days=2))),
+        ("Booking.list_bookings", lambda db, i: crud.Booking(db).list_bookings(rng.randrange(max(1, sizes.bookings - 20)), 20)),
+        ("Booking.get_occupancy", lambda db, i: crud.Booking(db).get_occupancy(middle, 30)),
+    ]
+
+
+def run_crud(sizes: Sizes, repeat: int, warmup: int, only: set[str]|None, log: Callable[[str], None]) -> list[Result]:
+    '''Times the crud methods, each call on a new session like the API does.'''
+    from utils.database import SessionLocal
+    results: list[Result] = []
+    for name, call in crud_benchmarks(sizes):
+        if only is not None and name not in only:
+            continue
+        latencies: list[float] = []
+        errors: int = 0
+        started: float = time.perf_counter()
+        for i in range(warmup + repeat):
+            with SessionLocal() as db:
+                start: float = time.perf_counter()
+                try:
+                    call(db, i)
+                except Exception:
+                    errors += i >= warmup
+                elapsed: float = (time.perf_counter() - start) * 1000
+            if i >= warmup:
+                latencies.append(elapsed)
+            else:
+                started = time.perf_counter()
+        result: Result = summarize("crud", name, latencies, errors, time.perf_counter() - started)
+        log(format_result(result))
+        results.append(result)
+    return results
+
+
+#==========================
+# Results
+#==========================
+def format_result(result: Result) -> str:
+    return (f"{result.kind:4} {result.name:28} {result.throughput_rps:9.1f} req/s  p50 {result.p50_ms:8.2f} ms  "
+            f"p95 {result.p95_ms:8.2f} ms  p99 {result.p99_ms:8.2f} ms  errors {result.errors}")
+
+
+def git_commit() -> str|None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_PATH, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def results_document(sizes: Sizes, settings: dict, results: list[Result]) -> dict:
+    '''Returns the JSON document of a run. Results are keyed by "<kind>:<name>", e.g. "api:/booking/add/".'''
+    from utils.database import engine
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                        "database": engine.dialect.name},
+        "sizes": asdict(sizes),
+        "settings": settings,
+        "results": {f"{result.kind}:{result.name}": asdict(result) for result in results},
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float, min_delta_ms: float) -> list[Regression]:
+    '''
+    Returns the regressions of the current results against the baseline: a p50, p95 or p99 latency that grew,
+    or a throughput that dropped, by more than threshold (e.g. 0.1 for 10%). Latency changes smaller than min_delta_ms
+    are ignored, as they are within the noise of fast requests. Results that are missing from either run are skipped.
+    '''
+    regressions: list[Regression] = []
+    for key, before in baseline["results"].items():
+        after: dict|None = current["results"].get(key)
+        if after is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if before[metric] > 0 and after[metric] - before[metric] > min_delta_ms and after[metric] > before[metric] * (1 + threshold):
+                regressions.append(Regression(key, metric, before[metric], after[metric], round(after[metric] / before[metric] - 1, 3)))
+        if before["throughput_rps"] > 0 and after["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append(Regression(key, "throughput_rps", before["throughput_rps"], after["throughput_rps"],
+                                          round(1 - after["throughput_rps"] / before["throughput_rps"], 3)))
+        if after["errors"] > before["errors"]:
+            regressions.append(Regression(key, "errors", before["errors"], after["errors"], float(after["errors"] - before["errors"])))
+    return regressions
+
+
+def report(baseline: dict, current: dict, threshold: float, min_delta_ms: float) -> int:
+    '''Prints the comparison of two runs and returns the exit status: 1 if there are regressions.'''
+    if baseline.get("sizes") != current.get("sizes") or baseline.get("environment", {}).get("database") != current.get("environment", {}).get("database"):
+        print(f"warning: the runs have different sizes or databases: {baseline.get('sizes')} vs {current.get('sizes')}", file=sys.stderr)
+    for key in sorted(set(baseline["results"]) & set(current["results"])):
+        before, after = baseline["results"][key], current["results"][key]
+        print(f"{key:34} p95 {before['p95_ms']:8.2f} -> {after['p95_ms']:8.2f} ms  "
+              f"{before['throughput_rps']:9.1f} -> {after['throughput_rps']:9.1f} req/s")
+    regressions: list[Regression] = compare(baseline, current, threshold, min_delta_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression.name} {regression.metric}: {regression.baseline} -> {regression.current} ({regression.change:+.0%})")
+    print(f"{len(regressions)} regressions (threshold {threshold:.0%}, min delta {min_delta_ms} ms)")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Seeds the database, runs the benchmarks and writes the results.")
+    run_parser.add_argument("--customers", type=int, default=10000)
+    run_parser.add_argument("--rooms", type=int, default=500)
+    run_parser.add_argument("--bookings", type=int, default=10000)
+    run_parser.add_argument("--employees", type=int, default=100)
+    run_parser.add_argument("--requests", type=int, default=200, help="Measured requests per endpoint and calls per crud method.")
+    run_parser.add_argument("--concurrency", type=int, default=4, help="Concurrent API clients.")
+    run_parser.add_argument("--warmup", type=int, default=10, help="Requests and calls made before measuring.")
+    run_parser.add_argument("--only", nargs="+", default=None, help="Names of the endpoints and crud methods to run, e.g. /cust/ Customer.get_customer.")
+    run_parser.add_argument("--skip-api", action="store_true")
+    run_parser.add_argument("--skip-crud", action="store_true")
+    run_parser.add_argument("--out", default=None, help="File to write the JSON results to. Defaults to stdout.")
+    run_parser.add_argument("--baseline", default=None, help="Results to compare with once the run ends.")
+    run_parser.add_argument("--threshold", type=float, default=0.1)
+    run_parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    compare_parser = commands.add_parser("compare", help="Compares two results files. Exits with status 1 on regressions.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative change that counts as a regression.")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Latency changes below it are ignored.")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as baseline_file, open(args.current) as current_file:
+            sys.exit(report(json.load(baseline_file), json.load(current_file), args.threshold, args.min_delta_ms))
+
+    sizes: Sizes = Sizes(customers=args.customers, rooms=args.rooms, bookings=args.bookings, employees=args.employees)
+    only: set[str]|None = set(args.only) if args.only else None
+    log: Callable[[str], None] = lambda line: print(line, file=sys.stderr)
+    log(f"seeding {asdict(sizes)}")
+    seed_database(sizes)
+    results: list[Result] = []
+    if not args.skip_api:
+        results += run_api(sizes, args.requests, args.concurrency, args.warmup, only, log)
+    if not args.skip_crud:
+        results += run_crud(sizes, args.requests, args.warmup, only, log)
+    document: dict = results_document(sizes, {"requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup}, results)
+    if args.out:
+        with open(args.out, "w") as out:
+            json.dump(document, out, indent=2)
+    else:
+        print(json.dumps(document, indent=2))
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            sys.exit(report(json.load(baseline_file), document, args.threshold, args.min_delta_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -65,6 +65,7 @@ CREATE TABLE EmployeeAddresses(
     state VARCHAR(20) NOT NULL,
     pin VARCHAR(10) NOT NULL,
     PRIMARY KEY(address_id),
+    KEY `fk_employee_id` (`emp_id`),
 	CONSTRAINT `fk_employee_id`
 	FOREIGN KEY (`emp_id`)
 	REFERENCES `Employees` (`emp_id`),
@@ -104,7 +105,10 @@ CREATE TABLE Customers (
     last_name VARCHAR(20) NOT NULL,
     email VARCHAR(40),
     phone VARCHAR(20) NOT NULL,
-    PRIMARY KEY(customer_id)
+    PRIMARY KEY(customer_id),
+    -- Customers are looked up and de-duplicated by phone and by email
+    UNIQUE KEY `uq_customer_phone` (`phone`),
+    UNIQUE KEY `uq_customer_email` (`email`)
 );    
 
 CREATE TABLE CustomerAddresses(
@@ -239,7 +243,7 @@ CREATE TABLE Rooms(
 
 CREATE TABLE Bookings(
 	id INT NOT NULL AUTO_INCREMENT,
-    -- Uses generate_booking_id trigger to generate the booking ID 
+    -- Allocated by the API from BookingIDGenerator
 	booking_id varchar(20)NOT NULL,
 	-- Holds 1-to-1 relationship with Customers.customer_id
 	customer_id INT NOT NULL,
@@ -257,10 +261,10 @@ CREATE TABLE Bookings(
     govt_id_num VARCHAR(45) NOT NULL,
     -- Government ID expirt date
     exp_date DATE,
-    govt_id_img BLOB NULL,
+    -- SHA-256 key of the government ID image in the blob store (src/utils/blob_store.py)
+    govt_id_img_key CHAR(64) NULL,
     -- Holds 1-to-1 relationship with Rooms.room_num
     room_id INT NOT NULL,
-    KEY `fk_bk_room_id` (`room_id`),
     CONSTRAINT `fk_room_id` FOREIGN KEY (`room_id`) REFERENCES `Rooms` (`room_id`),    
     comments VARCHAR(255),
     -- Holds 1-to-1 relationship with Employees.emp_id
@@ -269,7 +273,15 @@ CREATE TABLE Bookings(
     CONSTRAINT `fk_bk_emp_id` FOREIGN KEY (`emp_id`) REFERENCES `Employees` (`emp_id`),    
     -- Holds 1-to-1 relationship with CustomerAddresses.address_id
     -- customer_address INT NOT NULL,
-    PRIMARY KEY (id)
+    PRIMARY KEY (id),
+    -- Used to page through the bookings by (checkin, id)
+    KEY `idx_bk_checkin_id` (`checkin`, `id`),
+    -- Used to look up a booking by its booking ID
+    UNIQUE KEY `idx_bk_booking_id` (`booking_id`),
+    -- Used to check the bookings of a room for overlaps. It also serves the room_id foreign key.
+    KEY `idx_bk_room_dates` (`room_id`, `checkin`, `checkout`, `booking_status_id`),
+    -- Used to find the bookings that overlap a date window
+    KEY `idx_bk_checkout` (`checkout`)
 );
 
 -- Table to store the last used booking id. We need this table to generate realworkd booking IDs
@@ -280,27 +292,23 @@ CREATE TABLE BookingIDGenerator (
 -- Set the starting value of the booking ID
 INSERT INTO BookingIDGenerator (last_booking_id) VALUES (1001);
 
--- Trigger to generate custom booking IDs
-DELIMITER //
-
-CREATE TRIGGER generate_booking_id
-BEFORE INSERT ON Bookings
-FOR EACH ROW
-BEGIN
-    DECLARE new_booking_id INT;
-
-    -- Lock the BookingIDGenerator table to prevent race conditions
-    -- and ensure that only one transaction can update the last_booking_id.
-    -- This ensures atomicity and consistency.
-    SELECT last_booking_id + 1 INTO new_booking_id
-    FROM BookingIDGenerator
-    FOR UPDATE;
+-- Booking IDs (B<last_booking_id>) are allocated by the API in blocks of BOOKING_ID_BLOCK_SIZE (see src/utils/booking_ids.py).
+-- Databases created before that change have a generate_booking_id trigger. Drop it with migrations/001_drop_booking_id_trigger.sql.
 
-    SET NEW.booking_id = CONCAT('B', new_booking_id);
-
-    -- Update the last_booking_id directly in the row that was locked.
-    UPDATE BookingIDGenerator SET last_booking_id = new_booking_id;
-END;
-//
+-- Migrations applied to the database (see src/utils/migrations.py). This file creates the schema of the latest
+-- migration, so they are all recorded as applied. Add the new migrations here when this file is updated for them.
+CREATE TABLE SchemaVersion (
+    version INT NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    applied_at DATETIME NOT NULL,
+    PRIMARY KEY (version)
+);
 
-DELIMITER ;
+INSERT INTO SchemaVersion (version, name, applied_at)
+VALUES
+    (1, '001_drop_booking_id_trigger', NOW()),
+    (2, '002_add_govt_id_img_key', NOW()),
+    (3, '003_drop_govt_id_img', NOW()),
+    (4, '004_add_performance_indexes', NOW()),
+    (5, '005_normalize_customer_phones', NOW()),
+    (6, '006_lowercase_customer_emails', NOW());
@@ -0,0 +1,10 @@
+-- The API now allocates booking IDs in blocks from BookingIDGenerator (src/utils/booking_ids.py).
+-- Run this before deploying that version: the trigger would overwrite the booking_id chosen by the API,
+-- and it locks the BookingIDGenerator row for every booking.
+DROP TRIGGER IF EXISTS generate_booking_id;
+
+-- The allocator needs exactly one generator row. Create it from the highest booking number if it is missing.
+INSERT INTO BookingIDGenerator (last_booking_id)
+SELECT COALESCE(MAX(CAST(SUBSTRING(booking_id, 2) AS UNSIGNED)), 1001)
+FROM Bookings
+WHERE NOT EXISTS (SELECT 1 FROM BookingIDGenerator);
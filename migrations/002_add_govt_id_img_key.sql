@@ -0,0 +1,6 @@
+-- Government ID images move from the Bookings rows to the blob store (src/utils/blob_store.py),
+-- and a booking references its image by the SHA-256 key of the image.
+-- Run this before deploying that version, then move the existing images from src/ with
+--   python -m utils.blob_store
+-- and then run 003_drop_govt_id_img.sql.
+ALTER TABLE Bookings ADD COLUMN govt_id_img_key CHAR(64) NULL AFTER exp_date;
@@ -0,0 +1,3 @@
+-- Run after `python -m utils.blob_store` has moved the images to the blob store (see 002_add_govt_id_img_key.sql).
+-- Images that the blob store rejected are reported by that command and are dropped here.
+ALTER TABLE Bookings DROP COLUMN govt_id_img;
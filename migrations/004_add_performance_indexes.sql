@@ -0,0 +1,23 @@
+-- Indexes of the predicates of the hot queries, checked by `python -m utils.migrations check`:
+-- * Bookings.booking_id, used by every lookup by booking ID. Booking IDs are unique, so the index enforces it.
+-- * Bookings (room_id, checkin, checkout, booking_status_id), used by the overlap checks of the booking writes.
+--   It serves the room_id foreign key as well, so fk_bk_room_id is dropped.
+-- * Bookings.checkout, used by the occupancy grid to find the bookings that overlap a window.
+-- * Customers.phone and Customers.email, used to find the customer of a booking. The API treats them as unique.
+-- The unique keys can't be added while the tables hold duplicates. Find them first with
+--   SELECT booking_id FROM Bookings GROUP BY booking_id HAVING COUNT(*) > 1;
+--   SELECT phone FROM Customers GROUP BY phone HAVING COUNT(*) > 1;
+--   SELECT email FROM Customers WHERE email IS NOT NULL GROUP BY email HAVING COUNT(*) > 1;
+-- The indexes are built online: reads and writes of the tables continue while they are built.
+ALTER TABLE Bookings
+    ADD UNIQUE KEY `idx_bk_booking_id` (`booking_id`),
+    ADD KEY `idx_bk_room_dates` (`room_id`, `checkin`, `checkout`, `booking_status_id`),
+    ADD KEY `idx_bk_checkout` (`checkout`),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE Bookings DROP KEY `fk_bk_room_id`, ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE Customers
+    ADD UNIQUE KEY `uq_customer_phone` (`phone`),
+    ADD UNIQUE KEY `uq_customer_email` (`email`),
+    ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,8 @@
+-- Phone numbers are stored without separators (spaces, dots, dashes and parentheses), the form that the API
+-- looks customers up in (see src/utils/customer_keys.py). Rewrite the phone numbers stored before that change.
+-- Numbers that differ only by their separators collide on uq_customer_phone. Find them first with
+--   SELECT REGEXP_REPLACE(phone, '[[:space:]().-]', '') AS normalized, COUNT(*) FROM Customers
+--   GROUP BY normalized HAVING COUNT(*) > 1;
+UPDATE Customers
+SET phone = REGEXP_REPLACE(phone, '[[:space:]().-]', '')
+WHERE phone REGEXP '[[:space:]().-]';
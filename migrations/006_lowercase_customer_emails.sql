@@ -0,0 +1,7 @@
+-- Customer emails are stored lowercased, the form that the API looks customers up in (see src/utils/customer_keys.py),
+-- so that uq_customer_email rejects emails that differ only in case on every backend, including SQLite whose
+-- comparisons are case-sensitive. Rewrite the emails stored before that change. The column collation is
+-- case-insensitive, so BINARY finds the rows with upper-case letters.
+UPDATE Customers
+SET email = LOWER(email)
+WHERE BINARY email <> LOWER(email);
@@ -1,26 +1,49 @@
 #!/usr/bin/env python
 
-from fastapi import FastAPI, Depends, HTTPException, status
-from typing import List, Annotated
-from utils import models, schemas, crud
-from utils.database import SessionLocal, engine
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, UploadFile, status
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import List, Annotated, Iterator
+from utils import models, schemas, crud, cloudbeds_exceptions, customer_import, migrations
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.database import engine, SessionLocal, get_db, get_pool_stats
+from utils.async_crud import AsyncCrud, run_sync
 from sqlalchemy.orm.session import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 #from werkzeug.security import generate_password_hash
 from utils import auth 
 from utils.auth import get_current_employee
+from utils.token_cache import token_cache
+from utils.availability import availability_index
+from utils.room_locks import room_locks
+from utils.query_metrics import query_metrics, QueryMetricsMiddleware
+from utils import resource_versions as versions
+from utils.resource_versions import conditional_get, etag_matches, ETAG_CACHE_CONTROL
+from utils.blob_store import blob_store, BlobWriter, BlobInfo, BLOB_MAX_SIZE
 from fastapi.middleware.cors import CORSMiddleware
 
 
 #Used in Test endpoints
 from pydantic import EmailStr
+import io
 import uvicorn
 import traceback
 
 #from datetime import date
 
-models.Base.metadata.create_all(bind=engine)
+# Create the missing tables. An empty database, such as a new SQLite file, also gets the reference data.
+migrations.bootstrap(engine)
 
-api = FastAPI(title="CloudBeds API", version="1.0.0" )
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    # Build the room availability index before the first request
+    with SessionLocal() as db:
+        availability_index.load(db)
+    yield
+
+api = FastAPI(title="CloudBeds API", version="1.0.0", lifespan=lifespan)
 api.include_router(auth.router)
 
 origins = [
@@ -34,18 +57,20 @@ api.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read the cursor of the next page returned by the list endpoints
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Server-Timing"],
 )
+# Counts the SQL statements of each request. Added last, so that it wraps the other middleware.
+api.add_middleware(QueryMetricsMiddleware)
 
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Password hashing runs in a bounded pool (see utils/hashing.py). When it is saturated, fail fast instead of queueing.
+@api.exception_handler(cloudbeds_exceptions.ServiceBusy)
+async def service_busy_handler(request: Request, e: cloudbeds_exceptions.ServiceBusy):
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": e.message}, headers={"Retry-After": "1"})
 
-db_dependency = Annotated[Session, Depends(get_db)]
+# Dependency
+db_dependency = Annotated[Session|AsyncSession, Depends(get_db)]
 #db_dependency = Annotated[Session, Depends(get_db)]
 employee_dependency = Annotated[dict, Depends(get_current_employee)]
 
@@ -57,6 +82,45 @@ async def employee(employee:employee_dependency, db: Session = Depends(get_db)):
     if employee is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authentication failed.")
     return {"employee": employee}
+
+@api.get("/admin/token_cache/stats/",
+         name="Token Cache Statistics",
+         response_model=schemas.TokenCacheStats,
+         tags=["Admin"],
+         description='''Returns the size and the hit and miss counters of the verified-token cache.'''
+         )
+async def token_cache_stats(employee:employee_dependency):
+    return token_cache.stats()
+
+@api.get("/admin/db_pool/stats/",
+         name="Database Pool Statistics",
+         response_model=dict[str, schemas.PoolStats],
+         tags=["Admin"],
+         description='''Returns the connection pool statistics of each database engine of this worker:
+         connections checked out and in overflow, checkout wait time histogram and checkout timeouts.'''
+         )
+async def db_pool_stats(employee:employee_dependency):
+    return get_pool_stats()
+
+@api.get("/admin/room_locks/stats/",
+         name="Room Lock Statistics",
+         response_model=schemas.RoomLockStats,
+         tags=["Admin"],
+         description='''Returns the room lock counters of this worker: acquisitions, contended acquisitions and timeouts,
+         the lock wait time histogram and the time spent locking Rooms rows in the database.'''
+         )
+async def room_lock_stats(employee:employee_dependency):
+    return room_locks.stats()
+
+@api.get("/admin/query_metrics/stats/",
+         name="Query Statistics",
+         response_model=dict[str, schemas.RouteQueryStats],
+         tags=["Admin"],
+         description='''Returns the SQL statements, database time and rows of each route of this worker, per request and in total,
+         the routes with the most statements per request first, and how many requests exceeded the query budget of the route.'''
+         )
+async def query_metrics_stats(employee:employee_dependency):
+    return query_metrics.stats()
 #==========================
 # Employee endpoints
 #==========================
@@ -73,17 +137,17 @@ async def employee(employee:employee_dependency, db: Session = Depends(get_db)):
              )
 async def create_employee(employee:employee_dependency, db: db_dependency,
                           payload: schemas.EmployeeIn):
-    employee: crud.Employee = crud.Employee(db=db)
+    employee: AsyncCrud = AsyncCrud(crud.Employee, db)
     # Check if employee already exists
-    result: list[schemas.EmployeeOut]|None = employee.list_employees(query_value=payload.emp_details.email)
+    result: list[schemas.EmployeeOut]|None = await employee.list_employees(query_value=payload.emp_details.email)
     if result:
         raise HTTPException(status_code=400, detail="Email already registered.")
-    result: list[schemas.EmployeeOut]|None = employee.list_employees(query_value=payload.emp_details.phone)
+    result: list[schemas.EmployeeOut]|None = await employee.list_employees(query_value=payload.emp_details.phone)
     if result:
         raise HTTPException(status_code=400, detail="Phone number already registered.")
     
     # Create employee
-    result: schemas.EmployeePasswordOut = employee.create_employee(payload)
+    result: schemas.EmployeePasswordOut = await employee.create_employee(payload)
     return result
 
 @api.post("/emp/reset-password/{emp_id}",
@@ -95,13 +159,13 @@ async def create_employee(employee:employee_dependency, db: db_dependency,
              status_code=status.HTTP_201_CREATED
              )
 async def reset_password(employee:employee_dependency, emp_id: int, db: db_dependency):
-    employee: crud.Employee = crud.Employee(db=db)
+    employee: AsyncCrud = AsyncCrud(crud.Employee, db)
     # Check if the employee exists
-    result: list[schemas.EmployeeOut]|None = employee.list_employees(query_value=emp_id)
+    result: list[schemas.EmployeeOut]|None = await employee.list_employees(query_value=emp_id)
     if result == None:
         raise HTTPException(status_code=404, detail="Employee not found.")
     
-    result: schemas.EmployeePasswordOut = employee.reset_password(emp_id)
+    result: schemas.EmployeePasswordOut = await employee.reset_password(emp_id)
     return result
 
 # @api.post("/emp/add/", 
@@ -127,7 +191,7 @@ async def reset_password(employee:employee_dependency, emp_id: int, db: db_depen
          If employee isn't found in the database, it returns HTTP 404.'''
          )
 async def get_employee(employee:employee_dependency, id: int|EmailStr,  db: Session = Depends(get_db)):
-    employee: schemas.EmployeeOut|None = crud.get_employee(id, db)
+    employee: schemas.EmployeeOut|None = await run_sync(db, lambda session: crud.get_employee(id, session))
     if employee:
         return employee
     else:
@@ -141,18 +205,49 @@ async def get_employee(employee:employee_dependency, id: int|EmailStr,  db: Sess
          response_model=List[schemas.EmployeeOut],
          tags=["Employee"],
          description= '''Returns the list of all employees from the database.
-         If the database is empty, it returns HTTP 404.'''
+         Pass the X-Next-Cursor response header as the cursor parameter to get the next page.
+         If the database is empty, it returns HTTP 404. If the cursor is invalid, it returns HTTP 400.'''
          )
-async def list_employee(employee:employee_dependency, db: Session = Depends(get_db), skip: int = 0, limit: int = 20, query_value: int|None = None):
-    cb_employee: crud.Employee = crud.Employee(db=db)
+async def list_employee(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.EMPLOYEES))], response: Response, db: Session = Depends(get_db), skip: int = 0, limit: int = 20, query_value: int|None = None, cursor: str|None = None):
+    cb_employee: AsyncCrud = AsyncCrud(crud.Employee, db)
+    try:
+        employees: List[schemas.EmployeeOut]|None = await cb_employee.list_employees(skip, limit, query_value, cursor)
+    except Exception as e:
+        match e.__class__.__name__:
+            case "ValueError":
+                # Such as a malformed cursor
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
 
-    employees: List[schemas.EmployeeOut]|None = cb_employee.list_employees(skip, limit, query_value)
-    
     if employees:
+        if cb_employee.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = cb_employee.next_cursor
         return employees
     else:
         raise HTTPException(status_code=404, detail="There are no employees in the database.")        
 
+@api.get("/emp/search/",
+         name="Search Employees",
+         response_model=List[schemas.EmployeeOut],
+         tags=["Employee"],
+         description= '''Returns the employees whose name, phone or email matches the query, best match first.
+         Partial words and words with a typo match. Page through the matches with skip and limit.
+         If the query is too short or too long, it returns HTTP 400.'''
+         )
+async def search_employees(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.EMPLOYEES))], q: str, db: Session = Depends(get_db), skip: int = 0, limit: int = 20):
+    cb_employee: AsyncCrud = AsyncCrud(crud.Employee, db)
+    try:
+        employees: List[schemas.EmployeeOut] = await cb_employee.search_employees(q, skip, limit)
+        return employees
+    except Exception as e:
+        traceback.print_exc()
+        match e.__class__.__name__:
+            case "ValueError":
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
+
 # Update operations
 # @api.put("/emp/password_reset/{emp_id}",
 #          name="Reset Employee Password",
@@ -177,9 +272,9 @@ async def list_employee(employee:employee_dependency, db: Session = Depends(get_
          If employee ID isn't found in the database, it returns HTTP 404.'''
          )
 async def manage_employee(employee:employee_dependency, emp_id: int, is_active: bool, db: Session = Depends(get_db)):
-    employee: schemas.EmployeeOut|None = crud.get_employee(emp_id, db)
+    employee: schemas.EmployeeOut|None = await run_sync(db, lambda session: crud.get_employee(emp_id, session))
     if employee:
-        result: schemas.ManageEmployeeOut = crud.manage_employee(emp_id, is_active, db)        
+        result: schemas.ManageEmployeeOut = await run_sync(db, lambda session: crud.manage_employee(emp_id, is_active, session))
         return result
     else:
         raise HTTPException(status_code=400, detail="Provided employee ID doesn't exist.")
@@ -196,9 +291,9 @@ async def manage_employee(employee:employee_dependency, emp_id: int, is_active:
             description='''Adds a new government ID type to the database.
             If the government ID type already exists, it returns HTTP 400.''')
 async def add_gov_id(employee:employee_dependency, payload: schemas.GovtIdTypeBase , db: Session = Depends(get_db)):
-    Booking: crud.Booking = crud.Booking(db)
+    Booking: AsyncCrud = AsyncCrud(crud.Booking, db)
     try:
-        result: schemas.GenericMessage = Booking.add_supported_govt_id_type(payload)
+        result: schemas.GenericMessage = await Booking.add_supported_govt_id_type(payload)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -215,10 +310,10 @@ async def add_gov_id(employee:employee_dependency, payload: schemas.GovtIdTypeBa
             description= '''Returns the list of all supported government IDs from the database.
             If the database is empty, it returns HTTP 404.'''
             )
-async def list_gov_id(employee:employee_dependency, db: Session = Depends(get_db)):
+async def list_gov_id(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.GOVT_ID_TYPES))], db: Session = Depends(get_db)):
     try:
-        Booking: crud.Booking = crud.Booking(db)
-        govt_ids: list[schemas.GovtIdTypeBase] = Booking.get_supported_govt_id_types()
+        Booking: AsyncCrud = AsyncCrud(crud.Booking, db)
+        govt_ids: list[schemas.GovtIdTypeBase] = await Booking.get_supported_govt_id_types()
         return govt_ids
     except Exception as e:
             raise HTTPException(status_code=404, detail=e.__str__())
@@ -235,14 +330,39 @@ async def list_gov_id(employee:employee_dependency, db: Session = Depends(get_db
             description='''Creates a booking record in the database.
             If a booking fails, returns HTTP 500.''')
 async def add_booking(employee:employee_dependency, payload: schemas.BookingIn, db: Session = Depends(get_db)):
-        booking: crud.Booking = crud.Booking(db)
+        booking: AsyncCrud = AsyncCrud(crud.Booking, db)
+        try:
+            result: schemas.BookingResult = await booking.add_booking(payload)
+            return result
+        except Exception as e:
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise HTTPException(status_code=400, detail=str(e.__str__()))
+                case "ServiceBusy":
+                    # Answered with HTTP 503 by service_busy_handler
+                    raise
+                case _:
+                    raise HTTPException(status_code=500, detail=str(e.__str__()))
+
+@api.post("/booking/bulk_add/",
+            name="Add Bookings",
+            response_model=schemas.BulkBookingResult,
+            tags=["Booking"],
+            description='''Creates many bookings, such as a group or conference block, in one transaction.
+            By default either all bookings are created or, if any of them is invalid, none is and it returns HTTP 400.
+            With partial set to true, the valid bookings are created and the result reports the error of each of the others.''')
+async def add_bookings(employee:employee_dependency, payload: schemas.BulkBookingIn, db: Session = Depends(get_db)):
+        booking: AsyncCrud = AsyncCrud(crud.Booking, db)
         try:
-            result: schemas.BookingResult = booking.add_booking(payload)
+            result: schemas.BulkBookingResult = await booking.add_bookings(payload)
             return result
         except Exception as e:
             match e.__class__.__name__:
                 case "ValueError":
                     raise HTTPException(status_code=400, detail=str(e.__str__()))
+                case "ServiceBusy":
+                    # Answered with HTTP 503 by service_busy_handler
+                    raise
                 case _:
                     raise HTTPException(status_code=500, detail=str(e.__str__()))
 
@@ -254,9 +374,9 @@ async def add_booking(employee:employee_dependency, payload: schemas.BookingIn,
             description='''Sets the status of the specified booking to Ongoing.
             If the booking isn't found in the database, it returns HTTP 404.''')
 async def set_booking_status(employee:employee_dependency, booking_id: str, db: Session = Depends(get_db)):
-    booking: crud.Booking = crud.Booking(db)
+    booking: AsyncCrud = AsyncCrud(crud.Booking, db)
     try:
-        result: schemas.GenericMessage = booking.set_booking_status(booking_id)
+        result: schemas.GenericMessage = await booking.set_booking_status(booking_id)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -271,11 +391,14 @@ async def set_booking_status(employee:employee_dependency, booking_id: str, db:
             response_model=list[schemas.BookingOut],
             tags=["Booking"],
             description= '''Returns the list of all bookings from the database.
+            Pass the X-Next-Cursor response header as the cursor parameter to get the next page.
             If the database is empty, it returns HTTP 404.''')
-async def list_bookings(employee:employee_dependency, db: Session = Depends(get_db), skip: int = 0, limit: int = 20, booking_id: str |None = None):
-    booking: crud.Booking = crud.Booking(db)
+async def list_bookings(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.BOOKINGS, versions.CUSTOMERS, versions.ROOMS, versions.GOVT_ID_TYPES))], response: Response, db: Session = Depends(get_db), skip: int = 0, limit: int = 20, booking_id: str |None = None, cursor: str|None = None):
+    booking: AsyncCrud = AsyncCrud(crud.Booking, db)
     try:
-        bookings: list[schemas.BookingOut] = booking.list_bookings(skip, limit, booking_id)
+        bookings: list[schemas.BookingOut] = await booking.list_bookings(skip, limit, booking_id, cursor)
+        if booking.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = booking.next_cursor
         return bookings
     except Exception as e:
         match e.__class__.__name__:
@@ -283,6 +406,53 @@ async def list_bookings(employee:employee_dependency, db: Session = Depends(get_
                 raise HTTPException(status_code=404, detail=str(e.__str__()))
             case _:
                 raise HTTPException(status_code=500, detail=str(e.__str__()))
+@api.get("/booking/export/",
+            name="Export Bookings",
+            tags=["Booking"],
+            response_class=StreamingResponse,
+            description= '''Streams the bookings, ordered by the checkin date, as NDJSON (default) or CSV.
+            Filter them by checkin date range and status. The government ID images aren't exported.''')
+async def export_bookings(employee:employee_dependency, format: str = "ndjson", checkin_from: date|None = None,
+                          checkin_to: date|None = None, status: str|None = None):
+    # The export reads a server-side cursor from its own session, so that the session outlives the request dependencies.
+    # It uses the synchronous engine in both DB modes; StreamingResponse iterates the chunks in a worker thread.
+    db: Session = SessionLocal()
+    try:
+        chunks: Iterator[str] = await run_in_threadpool(crud.Booking(db).export_bookings, format, checkin_from, checkin_to, status)
+    except Exception as e:
+        db.close()
+        match e.__class__.__name__:
+            case "ValueError":
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
+
+    def stream() -> Iterator[str]:
+        try:
+            yield from chunks
+        finally:
+            db.close()
+
+    return StreamingResponse(stream(), media_type=crud.Booking.EXPORT_FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="bookings.{format}"'})
+
+@api.get("/booking/occupancy/",
+            name="Occupancy Grid",
+            response_model=schemas.Occupancy,
+            tags=["Booking"],
+            description= '''Returns the booking status of every room for each night from start, as run-length encoded rows.
+            Each row is [status_id, nights, status_id, nights, ...] and 0 is a free night. The statuses field names the ids.''')
+async def get_occupancy(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.BOOKINGS, versions.ROOMS))], start: date, days: int = 30, db: Session = Depends(get_db)):
+    booking: AsyncCrud = AsyncCrud(crud.Booking, db)
+    try:
+        grid: schemas.Occupancy = await booking.get_occupancy(start, days)
+        return grid
+    except Exception as e:
+        match e.__class__.__name__:
+            case "ValueError":
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
 # Update booking
 @api.put("/booking/update/{booking_id}",
             name="Update Booking",
@@ -291,14 +461,17 @@ async def list_bookings(employee:employee_dependency, db: Session = Depends(get_
             description='''Updates the specified booking.
             If the booking isn't found in the database, it returns HTTP 404.''')
 async def update_booking(employee:employee_dependency, booking_id: str, payload: schemas.BookingIn, db: Session = Depends(get_db)):
-    booking: crud.Booking = crud.Booking(db)
+    booking: AsyncCrud = AsyncCrud(crud.Booking, db)
     try:
-        result: schemas.GenericMessage = booking.update_booking(booking_id, payload)
+        result: schemas.GenericMessage = await booking.update_booking(booking_id, payload)
         return result
     except Exception as e:
         match e.__class__.__name__:
             case "ValueError":
                 raise HTTPException(status_code=404, detail=str(e.__str__()))
+            case "ServiceBusy":
+                # Answered with HTTP 503 by service_busy_handler
+                raise
             case _:
                 raise HTTPException(status_code=500, detail=str(e.__str__()))
 
@@ -309,9 +482,9 @@ async def update_booking(employee:employee_dependency, booking_id: str, payload:
             description='''Cancels the specified booking.
             If the booking isn't found in the database, it returns HTTP 404.''')
 async def cancel_booking(employee:employee_dependency, booking_id: str, db: Session = Depends(get_db)):
-    booking: crud.Booking = crud.Booking(db)
+    booking: AsyncCrud = AsyncCrud(crud.Booking, db)
     try:
-        result: schemas.GenericMessage = booking.cancel_booking(booking_id)
+        result: schemas.GenericMessage = await booking.cancel_booking(booking_id)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -320,6 +493,58 @@ async def cancel_booking(employee:employee_dependency, booking_id: str, db: Sess
             case _:
                 raise HTTPException(status_code=500, detail=str(e.__str__()))
 
+@api.post("/booking/govt_id_image/",
+            name="Upload Government ID Image",
+            response_model=schemas.GovtIdImage,
+            tags=["Booking"],
+            description=f'''Stores a government ID image and returns its key. Pass the key as booking.govt_id_image.
+            Send the JPEG, PNG, WebP or PDF file as the request body, not as a form. It is streamed to the blob store.
+            If the file is larger than {BLOB_MAX_SIZE} bytes, it returns HTTP 413. If it isn't an accepted format, it returns HTTP 400.''')
+async def upload_govt_id_image(employee:employee_dependency, request: Request):
+    content_length: str|None = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > BLOB_MAX_SIZE:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=f"The image is larger than {BLOB_MAX_SIZE} bytes.")
+    writer: BlobWriter = await run_in_threadpool(blob_store.writer)
+    try:
+        # Each chunk is hashed and written as it arrives, so that the image is never held in memory
+        async for chunk in request.stream():
+            await run_in_threadpool(writer.write, chunk)
+        info: BlobInfo = await run_in_threadpool(writer.commit)
+        return schemas.GovtIdImage(key=info.key, size=info.size, media_type=info.media_type)
+    except Exception as e:
+        await run_in_threadpool(writer.abort)
+        match e.__class__.__name__:
+            case "ValueError":
+                raise HTTPException(status_code=413 if writer.size > BLOB_MAX_SIZE else 400, detail=str(e.__str__()))
+            case _:
+                raise
+
+@api.get("/booking/govt_id_image/{booking_id}",
+            name="Download Government ID Image",
+            tags=["Booking"],
+            description='''Returns the government ID image of the booking. Range requests are supported.
+            Its ETag is the key of the image. If the booking has no image, it returns HTTP 404.''')
+async def download_govt_id_image(employee:employee_dependency, request: Request, booking_id: str, db: Session = Depends(get_db)):
+    booking: AsyncCrud = AsyncCrud(crud.Booking, db)
+    try:
+        key: str|None = await booking.get_govt_id_image_key(booking_id)
+    except Exception as e:
+        match e.__class__.__name__:
+            case "ValueError":
+                raise HTTPException(status_code=404, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
+    path: str|None = await run_in_threadpool(blob_store.path, key) if key else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="The booking has no government ID image.")
+    # The content of a key never changes, so the key is a strong ETag
+    headers: dict[str, str] = {"ETag": f'"{key}"', "Cache-Control": ETAG_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # FileResponse answers range requests and, if the ASGI server supports the pathsend extension, lets it send the file without copying
+    return FileResponse(path, media_type=await run_in_threadpool(blob_store.media_type, key), headers=headers,
+                        filename=f"{booking_id}-govt-id", content_disposition_type="inline")
+
 #=============================
 # Customer endpoints
 #=============================
@@ -327,13 +552,15 @@ async def cancel_booking(employee:employee_dependency, booking_id: str, db: Sess
          name="Get customer",
          response_model=schemas.CustomerOut,
          tags=["Customer"],
-         description= '''Returns the details of a customer from the database based on the provided query, which can be either a phone number or an email.
+         description= '''Returns the details of a customer from the database based on the provided query, which can be a customer ID, a phone number or an email.
          If the customer isn't available in the database, it returns HTTP 404.'''
          )
 async def get_customer(employee:employee_dependency, query: str, db: Session = Depends(get_db)):
-    customer: crud.Customer = crud.Customer(db)
+    customer: AsyncCrud = AsyncCrud(crud.Customer, db)
     try:
-        customers: schemas.CustomerOut = customer.get_customer(query)
+        customers: schemas.CustomerOut|None = await customer.get_customer(query)
+        if customers is None:
+            raise ValueError("Customer doesn't exist in the database.")
         return customers
     except Exception as e:
         traceback.print_exc()
@@ -343,6 +570,27 @@ async def get_customer(employee:employee_dependency, query: str, db: Session = D
             case _:
                 raise HTTPException(status_code=500, detail=str(e.__str__()))
 
+@api.post("/cust/batch/",
+          name="Get Customers",
+          response_model=schemas.CustomerBatchResult,
+          tags=["Customer"],
+          description=f'''Returns the customers of up to {crud.CUSTOMER_BATCH_MAX_KEYS} keys with one query.
+          Each key can be a customer ID, a phone number or an email. The keys that match no customer are listed in missing.
+          If there are too many keys, it returns HTTP 400.''')
+async def get_customers(employee:employee_dependency, keys: list[str], db: Session = Depends(get_db)):
+    customer: AsyncCrud = AsyncCrud(crud.Customer, db)
+    try:
+        customers: dict[str, schemas.CustomerOut|None] = await customer.get_customers(keys)
+        return schemas.CustomerBatchResult(customers={key: value for key, value in customers.items() if value is not None},
+                                           missing=[key for key, value in customers.items() if value is None])
+    except Exception as e:
+        traceback.print_exc()
+        match e.__class__.__name__:
+            case "ValueError":
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
+
 @api.post("/cust/add/",
           name="Add Customer",
           response_model=schemas.CreateCustomerResult,
@@ -350,9 +598,9 @@ async def get_customer(employee:employee_dependency, query: str, db: Session = D
           description='''Creates a customer record in the database.
           If the provided email exists in the database, returns HTTP 404.''')
 async def add_customer(employee:employee_dependency, payload: schemas.CustomerIn, db: Session = Depends(get_db)):
-    customer: crud.Customer = crud.Customer(db)
+    customer: AsyncCrud = AsyncCrud(crud.Customer, db)
     try:
-        result: schemas.CreateCustomerResult = customer.add_customer(payload)
+        result: schemas.CreateCustomerResult = await customer.add_customer(payload)
         return result
     except Exception as e:
         traceback.print_exc()
@@ -362,17 +610,43 @@ async def add_customer(employee:employee_dependency, payload: schemas.CustomerIn
             case _:
                 raise HTTPException(status_code=500, detail=str(e.__str__()))
 
+@api.post("/cust/import/",
+          name="Import Customers",
+          response_model=schemas.CustomerImportResult,
+          tags=["Customer"],
+          description='''Imports the customers of a CSV or JSONL file, reading it chunk_size rows at a time.
+          The format defaults to the file extension. Duplicates and invalid rows are skipped and reported.
+          For large files, the same import is available from the command line: python -m utils.customer_import FILE''')
+async def import_customers(employee:employee_dependency, file: UploadFile, format: str|None = None,
+                           chunk_size: int = customer_import.CUSTOMER_IMPORT_CHUNK_SIZE, db: Session = Depends(get_db)):
+    customer: AsyncCrud = AsyncCrud(crud.Customer, db)
+    try:
+        stream: io.TextIOWrapper = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        rows = customer_import.read_rows(stream, format or customer_import.detect_format(file.filename))
+        result: schemas.CustomerImportResult = await customer.import_customers(rows, chunk_size)
+        return result
+    except Exception as e:
+        traceback.print_exc()
+        match e.__class__.__name__:
+            case "ValueError" | "UnicodeDecodeError":
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
+
 @api.get("/cust/list/",
          name="List Customers",
          response_model=List[schemas.CustomerOut],
          tags=["Customer"],
          description= '''Returns the list of all customers from the database.
+         Pass the X-Next-Cursor response header as the cursor parameter to get the next page.
          If the database is empty, it returns HTTP 404.'''
          )
-async def list_customers(employee:employee_dependency, db: Session = Depends(get_db), skip: int = 0, limit: int = 20):
-    customer: crud.Customer = crud.Customer(db)
+async def list_customers(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.CUSTOMERS))], response: Response, db: Session = Depends(get_db), skip: int = 0, limit: int = 20, cursor: str|None = None):
+    customer: AsyncCrud = AsyncCrud(crud.Customer, db)
     try:
-        customers: List[schemas.CustomerOut] = customer.list_customers(skip, limit)
+        customers: List[schemas.CustomerOut] = await customer.list_customers(skip, limit, cursor)
+        if customer.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = customer.next_cursor
         return customers
     except Exception as e:
         traceback.print_exc()
@@ -382,6 +656,27 @@ async def list_customers(employee:employee_dependency, db: Session = Depends(get
             case _:
                 raise HTTPException(status_code=500, detail=str(e.__str__()))
 
+@api.get("/cust/search/",
+         name="Search Customers",
+         response_model=List[schemas.CustomerOut],
+         tags=["Customer"],
+         description= '''Returns the customers whose name, phone or email matches the query, best match first.
+         Partial words and words with a typo match, e.g. "sharm" and "shrma" both find Sharma. Page through the matches with skip and limit.
+         If the query is too short or too long, it returns HTTP 400.'''
+         )
+async def search_customers(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.CUSTOMERS))], q: str, db: Session = Depends(get_db), skip: int = 0, limit: int = 20):
+    customer: AsyncCrud = AsyncCrud(crud.Customer, db)
+    try:
+        customers: List[schemas.CustomerOut] = await customer.search_customers(q, skip, limit)
+        return customers
+    except Exception as e:
+        traceback.print_exc()
+        match e.__class__.__name__:
+            case "ValueError":
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
+
 @api.post("/cust/update/",
           name="Update Customer",
           response_model=schemas.GenericMessage,
@@ -390,9 +685,9 @@ async def list_customers(employee:employee_dependency, db: Session = Depends(get
           If the customer isn't found in the database, it returns HTTP 404.'''
           )
 async def update_customer(employee:employee_dependency, payload: schemas.CustomerOut, db: Session = Depends(get_db)):
-    customer: crud.Customer = crud.Customer(db)
+    customer: AsyncCrud = AsyncCrud(crud.Customer, db)
     try:
-        result: schemas.GenericMessage = customer.update_customer(payload)
+        result: schemas.GenericMessage = await customer.update_customer(payload)
         return result
     except Exception as e:
         traceback.print_exc()
@@ -415,9 +710,9 @@ async def update_customer(employee:employee_dependency, payload: schemas.Custome
             tags=["Room"]
             )
 async def delete_room_type(employee:employee_dependency, room_type: str, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        result: schemas.GenericMessage = room.manage_room_types("delete", room_type)
+        result: schemas.GenericMessage = await room.manage_room_types("delete", room_type)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -434,9 +729,9 @@ async def delete_room_type(employee:employee_dependency, room_type: str, db: Ses
             tags=["Room"]
             )
 async def delete_room_state(employee:employee_dependency, room_state: str, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        result: schemas.GenericMessage = room.manage_room_states("delete", room_state)
+        result: schemas.GenericMessage = await room.manage_room_states("delete", room_state)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -453,9 +748,9 @@ async def delete_room_state(employee:employee_dependency, room_state: str, db: S
             If the room isn't found in the database, it returns HTTP 400.''',
             )
 async def delete_room(employee:employee_dependency, room_number: str, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        result: schemas.GenericMessage = room.delete_room(room_number)
+        result: schemas.GenericMessage = await room.delete_room(room_number)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -469,14 +764,16 @@ async def delete_room(employee:employee_dependency, room_number: str, db: Sessio
     response_model=List[schemas.RoomBase],
     tags=["Room"],
     description= '''Returns the list of rooms from the database that match the criteria specified in the payload.
+    Pass the X-Next-Cursor response header as the cursor parameter to get the next page.
     If the database is empty, it returns HTTP 404.'''
     )
-async def list_rooms(employee:employee_dependency, db: Session = Depends(get_db), \
+async def list_rooms(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.ROOMS, versions.ROOM_TYPES, versions.ROOM_STATES))], response: Response, db: Session = Depends(get_db), \
                      room_number: str | None = None, \
                      room_type: str | None = None, \
                      room_state: str | None = None, \
                      skip: int | None = None, \
-                     limit: int | None = None):
+                     limit: int | None = None, \
+                     cursor: str | None = None):
     """
     Retrieve the list of all rooms from the database.
 
@@ -490,6 +787,7 @@ async def list_rooms(employee:employee_dependency, db: Session = Depends(get_db)
                                         are ignored and the endpoint returns the room with the specified room number.
     - room_type (str, optional): The room type filter. Defaults to None.
     - room_state (str, optional): The room state filter. Defaults to None.
+    - cursor (str, optional): The X-Next-Cursor header of the previous page. If specified, skip is ignored.
 
     Returns:
     - List[schemas.RoomBase] | None: A list of rooms matching the specified filters.
@@ -499,9 +797,30 @@ async def list_rooms(employee:employee_dependency, db: Session = Depends(get_db)
     - HTTPException with status code 400 if a ValueError occurs.
     - HTTPException with status code 500 for any other exception.
     """
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        rooms: List[schemas.RoomBase] = room.list_rooms(skip, limit, room_number, room_type, room_state)
+        rooms: List[schemas.RoomBase] = await room.list_rooms(skip, limit, room_number, room_type, room_state, cursor)
+        if room.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = room.next_cursor
+        return rooms
+    except Exception as e:
+        match e.__class__.__name__:
+            case "ValueError":
+                    raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                    raise HTTPException(status_code=500, detail=str(e.__str__()))
+
+@api.get("/room/available/",
+    name="List Available Rooms",
+    response_model=List[schemas.RoomBase],
+    tags=["Room"],
+    description= '''Returns the rooms in the Available state (not in Maintenance, for example) that have no Booked or Ongoing booking from the checkin date up to the checkout date.
+    The answer comes from the in-memory availability index. If no room is available, it returns HTTP 400.'''
+    )
+async def list_available_rooms(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.BOOKINGS, versions.ROOMS, versions.ROOM_TYPES, versions.ROOM_STATES))], checkin: date, checkout: date, db: Session = Depends(get_db)):
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
+    try:
+        rooms: List[schemas.RoomBase] = await room.list_available_rooms(checkin, checkout)
         return rooms
     except Exception as e:
         match e.__class__.__name__:
@@ -517,9 +836,9 @@ async def list_rooms(employee:employee_dependency, db: Session = Depends(get_db)
          description= '''Returns the list of all room types from the database.
          If the database is empty, it returns HTTP 404.'''
          )
-async def list_room_types(employee:employee_dependency, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
-    room_types: schemas.RoomTypeBase|None = room.get_supported_room_types()
+async def list_room_types(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.ROOM_TYPES))], db: Session = Depends(get_db)):
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
+    room_types: schemas.RoomTypeBase|None = await room.get_supported_room_types()
     if room_types:
         return room_types
     else:
@@ -532,9 +851,9 @@ async def list_room_types(employee:employee_dependency, db: Session = Depends(ge
             description= '''Returns the list of all room states from the database.
             If the database is empty, it returns HTTP 404.'''
             )
-async def list_room_states(employee:employee_dependency, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
-    room_states: schemas.RoomStateBase|None = room.get_supported_room_states()
+async def list_room_states(employee:employee_dependency, etag: Annotated[None, Depends(conditional_get(versions.ROOM_STATES))], db: Session = Depends(get_db)):
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
+    room_states: schemas.RoomStateBase|None = await room.get_supported_room_states()
     if room_states:
         return room_states
     else:
@@ -548,9 +867,28 @@ async def list_room_states(employee:employee_dependency, db: Session = Depends(g
           If the room number already exists, it returns HTTP 400.'''
           )
 async def add_room(employee:employee_dependency, payload: schemas.RoomBase, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
+    try:
+        result: schemas.GenericMessage = await room.add_room(room_number=payload.room_number, room_type=payload.room_type, room_state=payload.room_state)
+        return result
+    except Exception as e:
+        match e.__class__.__name__:
+            case "ValueError":
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
+
+@api.post("/room/bulk_add/",
+          name="Add Rooms",
+          response_model=schemas.BulkRoomResult,
+          tags=["Room"],
+          description='''Adds many rooms to the database, batch_size rooms per insert and commit.
+          Rooms that already exist or repeat in the request are skipped and reported in errors.'''
+          )
+async def add_rooms(employee:employee_dependency, payload: list[schemas.RoomBase], batch_size: int = crud.ROOM_BULK_BATCH_SIZE, db: Session = Depends(get_db)):
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        result: schemas.GenericMessage = room.add_room(room_number=payload.room_number, room_type=payload.room_type, room_state=payload.room_state)
+        result: schemas.BulkRoomResult = await room.add_rooms([row.model_dump(mode="json") for row in payload], batch_size)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -559,6 +897,31 @@ async def add_room(employee:employee_dependency, payload: schemas.RoomBase, db:
             case _:
                 raise HTTPException(status_code=500, detail=str(e.__str__()))
 
+@api.post("/room/bulk_add/csv/",
+          name="Add Rooms from CSV",
+          response_model=schemas.BulkRoomResult,
+          tags=["Room"],
+          description=f'''Adds the rooms of a CSV file with the header room_number,room_type,room_state, batch_size rooms per insert and commit.
+          Invalid rows and rooms that already exist are skipped and reported in errors.
+          If the file is larger than {crud.ROOM_CSV_MAX_SIZE} bytes, it returns HTTP 413.'''
+          )
+async def add_rooms_csv(employee:employee_dependency, file: UploadFile, batch_size: int = crud.ROOM_BULK_BATCH_SIZE, db: Session = Depends(get_db)):
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
+    # Read one byte more than the limit, so that a larger file is rejected without being read into memory
+    content: bytes = await file.read(crud.ROOM_CSV_MAX_SIZE + 1)
+    if len(content) > crud.ROOM_CSV_MAX_SIZE:
+        raise HTTPException(status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=f"The file is larger than {crud.ROOM_CSV_MAX_SIZE} bytes.")
+    try:
+        rooms: list[dict] = crud.Room.parse_rooms_csv(content.decode("utf-8-sig"))
+        result: schemas.BulkRoomResult = await room.add_rooms(rooms, batch_size)
+        return result
+    except Exception as e:
+        match e.__class__.__name__:
+            case "ValueError" | "UnicodeDecodeError":
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))
+
 @api.post("/room_types/add/",
           name="Add Room Type",
           response_model=schemas.GenericMessage,
@@ -567,9 +930,9 @@ async def add_room(employee:employee_dependency, payload: schemas.RoomBase, db:
           If the room type already exists, it returns HTTP 400.'''
           )
 async def add_room_type(employee:employee_dependency, payload: schemas.RoomTypeIn, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        result: schemas.GenericMessage = room.manage_room_types("add", payload.room_type)
+        result: schemas.GenericMessage = await room.manage_room_types("add", payload.room_type)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -586,9 +949,9 @@ async def add_room_type(employee:employee_dependency, payload: schemas.RoomTypeI
           If the room state already exists, it returns HTTP 400.'''
           )
 async def add_room_state(employee:employee_dependency, payload: schemas.RoomTypeIn, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        result: schemas.GenericMessage = room.manage_room_states("add", payload.room_type)
+        result: schemas.GenericMessage = await room.manage_room_states("add", payload.room_type)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -605,9 +968,28 @@ async def add_room_state(employee:employee_dependency, payload: schemas.RoomType
             If the room number doesn't exists, it returns HTTP 400.'''
             )
 async def update_room(employee:employee_dependency, payload: schemas.RoomBase, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
+    try:
+        result: schemas.GenericMessage = await room.update_room(payload.room_number, payload.room_type, payload.room_state)
+        return result
+    except Exception as e:
+        match e.__class__.__name__:
+            case "ValueError":
+                raise HTTPException(status_code=400, detail=str(e.__str__()))
+            case _:
+                raise HTTPException(status_code=500, detail=str(e.__str__()))   
+
+@api.put("/room/bulk_update/",
+            name="Update Rooms",
+            response_model=schemas.BulkRoomResult,
+            tags=["Room"],
+            description='''Sets the type and/or state of a list or a range of rooms, such as putting a whole floor into Maintenance.
+            Listed rooms that don't exist are reported in errors.'''
+            )
+async def update_rooms(employee:employee_dependency, payload: schemas.BulkRoomUpdateIn, batch_size: int = crud.ROOM_BULK_BATCH_SIZE, db: Session = Depends(get_db)):
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        result: schemas.GenericMessage = room.update_room(payload.room_number, payload.room_type, payload.room_state)
+        result: schemas.BulkRoomResult = await room.update_rooms(payload, batch_size)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -624,9 +1006,9 @@ async def update_room(employee:employee_dependency, payload: schemas.RoomBase, d
          If the room state doesn't exists, it returns HTTP 400.'''
          ) 
 async def update_room_type(employee:employee_dependency, room_type: str, new_room_type: str, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        result: schemas.GenericMessage = room.manage_room_types("update", room_type, new_room_type)
+        result: schemas.GenericMessage = await room.manage_room_types("update", room_type, new_room_type)
         return result
     except Exception as e:
         match e.__class__.__name__:
@@ -643,9 +1025,9 @@ async def update_room_type(employee:employee_dependency, room_type: str, new_roo
             If the room state doesn't exists, it returns HTTP 400.'''
             )
 async def update_room_state(employee:employee_dependency, room_state: str, new_room_state: str, db: Session = Depends(get_db)):
-    room: crud.Room = crud.Room(db)
+    room: AsyncCrud = AsyncCrud(crud.Room, db)
     try:
-        result: schemas.GenericMessage = room.manage_room_states("update", room_state, new_room_state)
+        result: schemas.GenericMessage = await room.manage_room_states("update", room_state, new_room_state)
         return result
     except Exception as e:
         match e.__class__.__name__:
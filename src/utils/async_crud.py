@@ -0,0 +1,42 @@
+from typing import Any, Callable, TypeVar
+from sqlalchemy.orm.session import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+async def run_sync(db: Session|AsyncSession, fn: Callable[..., T], *args, **kwargs) -> T:
+    '''
+    Runs fn(session, *args, **kwargs) without blocking the event loop.
+    With an AsyncSession, the function runs on the asyncio driver through AsyncSession.run_sync.
+    With a Session, the function runs in a worker thread.
+
+    Args:
+        * db: (Session|AsyncSession) The session returned by database.get_db.
+        * fn: The function to run. It receives the synchronous session as its first argument.
+    '''
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+class AsyncCrud:
+    '''
+    Async variant of a crud class. Every method of the wrapped class becomes a coroutine that runs through run_sync.
+    Other attributes, such as next_cursor, are read from the wrapped instance.
+
+    Example:
+        booking: AsyncCrud = AsyncCrud(crud.Booking, db)
+        result: schemas.BookingResult = await booking.add_booking(payload)
+    '''
+    def __init__(self, crud_class: type, db: Session|AsyncSession):
+        self.__db: Session|AsyncSession = db
+        self.__crud = crud_class(db.sync_session if isinstance(db, AsyncSession) else db)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.__crud, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await run_sync(self.__db, lambda session: attr(*args, **kwargs))
+        return method
@@ -3,10 +3,12 @@ from typing import Annotated
 from pydantic import SecretStr, EmailStr
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from utils.database import SessionLocal
+from utils.database import get_db
+from utils.async_crud import AsyncCrud, run_sync
+from utils.token_cache import token_cache
 from utils import models, crud, schemas
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt, JWTError
 from dotenv import load_dotenv
@@ -22,35 +24,32 @@ router = APIRouter(
     tags=["auth"]
 )
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
- 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[Session|AsyncSession, Depends(get_db)]
 
 
 @router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
                                  db: db_dependency):
-    cb_employee: crud.Employee = crud.Employee(db=db)
-    employee: models.Employee =  cb_employee.authenticate_employee(form_data.username, form_data.password,)
+    cb_employee: AsyncCrud = AsyncCrud(crud.Employee, db)
+    employee: models.Employee = await cb_employee.authenticate_employee(form_data.username, form_data.password,)
     if not employee:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
-    emp_roles: list[str] | None = [assigned_role.role.name for assigned_role in employee.roles]
-    token = cb_employee.create_access_token(employee.email, employee.emp_id, expires_delta=timedelta(minutes=30), roles=emp_roles)
+    # The roles are lazy-loaded, so read them through the session as well
+    emp_roles: list[str] | None = await run_sync(db, lambda session: [assigned_role.role.name for assigned_role in employee.roles])
+    token = await cb_employee.create_access_token(employee.email, employee.emp_id, expires_delta=timedelta(minutes=30), roles=emp_roles)
     employee_token: schemas.Token = schemas.Token(access_token=token, token_type="bearer")
     return employee_token
 
-async def get_current_employee(token: Annotated[str, Depends(oauth2_bearer)]):
+async def get_current_employee(token: Annotated[str, Depends(oauth2_bearer)], db: db_dependency):
+    # Tokens that were already verified are served from the cache until they expire, or until their employee is deactivated
+    employee: dict|None = token_cache.get(token)
+    if employee:
+        return employee
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: EmailStr = payload.get("sub")
@@ -59,8 +58,14 @@ async def get_current_employee(token: Annotated[str, Depends(oauth2_bearer)]):
         
         if email is None or emp_id is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Couldn't validate user.")
+        # A valid token of a deactivated employee is rejected. Deactivation evicts the cached tokens, so they are checked here again.
+        if not await AsyncCrud(crud.Employee, db).is_active(emp_id):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Couldn't validate user.")
         
-        return {"email": email, "emp_id": emp_id, "roles": roles}
+        employee = {"email": email, "emp_id": emp_id, "roles": roles}
+        if payload.get("exp"):
+            token_cache.put(token, employee, payload["exp"])
+        return employee
 
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Couldn't validate user.")
@@ -0,0 +1,204 @@
+import bisect
+import os
+import threading
+import time
+from datetime import date
+from typing import Callable
+from dotenv import load_dotenv
+from sqlalchemy import select, Row
+from sqlalchemy.orm.session import Session
+from . import models, lookup_cache
+
+# Load environmental variables from .env
+load_dotenv()
+# Seconds after which the index is rebuilt from the database, so that bookings written by other worker processes show up
+AVAILABILITY_INDEX_MAX_AGE: float = float(os.getenv("AVAILABILITY_INDEX_MAX_AGE", "300"))
+# Booking statuses that occupy a room
+ACTIVE_BOOKING_STATUSES: tuple[str, ...] = ("Booked", "Ongoing")
+
+class RoomIntervals:
+    '''
+    The [checkin, checkout) intervals of the active bookings of a room, sorted by checkin.
+    max_checkouts[i] holds the latest checkout of intervals[0..i], which answers overlap queries with one binary search
+    even if the stored intervals overlap each other.
+    '''
+    __slots__ = ("intervals", "checkins", "max_checkouts")
+
+    def __init__(self):
+        self.intervals: list[tuple[date, date, str]] = []
+        self.checkins: list[date] = []
+        self.max_checkouts: list[date] = []
+
+    def __refresh(self, start: int) -> None:
+        for i in range(start, len(self.intervals)):
+            checkout: date = self.intervals[i][1]
+            self.max_checkouts[i] = max(self.max_checkouts[i - 1], checkout) if i else checkout
+
+    def add(self, checkin: date, checkout: date, booking_id: str) -> None:
+        i: int = bisect.bisect_right(self.checkins, checkin)
+        self.intervals.insert(i, (checkin, checkout, booking_id))
+        self.checkins.insert(i, checkin)
+        self.max_checkouts.insert(i, checkout)
+        self.__refresh(i)
+
+    def remove(self, checkin: date, booking_id: str) -> None:
+        i: int = bisect.bisect_left(self.checkins, checkin)
+        while self.intervals[i][2] != booking_id:
+            i += 1
+        del self.intervals[i], self.checkins[i], self.max_checkouts[i]
+        self.__refresh(i)
+
+    def overlaps(self, checkin: date, checkout: date, exclude_booking_id: str|None = None) -> bool:
+        '''Returns True if an interval other than the excluded booking overlaps [checkin, checkout).'''
+        # intervals[:end] start before the requested checkout
+        end: int = bisect.bisect_left(self.checkins, checkout)
+        if end == 0 or self.max_checkouts[end - 1] <= checkin:
+            return False
+        if exclude_booking_id is None:
+            return True
+        return any(interval[1] > checkin and interval[2] != exclude_booking_id for interval in self.intervals[:end])
+
+class RoomAvailabilityIndex:
+    '''
+    Process-wide in-memory index of the rooms and of the intervals of their Booked and Ongoing bookings.
+    It is built from the database on first use (and at API startup), kept up to date by the crud write methods
+    and rebuilt after AVAILABILITY_INDEX_MAX_AGE seconds. The database stays the final arbiter when a booking is written.
+    '''
+    def __init__(self, max_age: float):
+        self.max_age: float = max_age
+        self.__lock = threading.RLock()
+        self.__loaded_at: float|None = None
+        # room_id -> (room_number, r_type_id, state_id)
+        self.__rooms: dict[int, tuple[int, int, int]] = {}
+        # room_number -> room_id
+        self.__room_ids: dict[int, int] = {}
+        # room_id -> intervals of the room
+        self.__intervals: dict[int, RoomIntervals] = {}
+        # booking_id -> (room_id, checkin, checkout)
+        self.__bookings: dict[str, tuple[int, date, date]] = {}
+        # Updates made while a build reads the database, in order, which the build applies before it replaces the index
+        self.__build_writes: list[list[tuple[Callable, tuple]]] = []
+
+    def load(self, db: Session) -> None:
+        '''
+        Builds the index from the database and replaces the current one. The updates made while the database is read
+        are applied again on top of it, since the rows read may predate them.
+        '''
+        writes: list[tuple[Callable, tuple]] = []
+        with self.__lock:
+            self.__build_writes.append(writes)
+        try:
+            active_status_ids: list[int] = [lookup_cache.booking_statuses.get_id(db, name) for name in ACTIVE_BOOKING_STATUSES]
+            rooms: list[Row] = db.execute(select(models.Room.room_id, models.Room.room_number, models.Room.r_type_id, models.Room.state_id)).fetchall()
+            bookings: list[Row] = db.execute(
+                select(models.Booking.booking_id, models.Booking.room_id, models.Booking.checkin, models.Booking.checkout)
+                .where(models.Booking.booking_status_id.in_(active_status_ids))
+            ).fetchall()
+            with self.__lock:
+                self.__rooms, self.__room_ids, self.__intervals, self.__bookings = {}, {}, {}, {}
+                for row in rooms:
+                    self.__set_room(row.room_id, row.room_number, row.r_type_id, row.state_id)
+                for row in bookings:
+                    self.__set_booking(row.booking_id, row.room_id, row.checkin, row.checkout)
+                for apply, args in writes:
+                    apply(*args)
+                self.__loaded_at = time.monotonic()
+        finally:
+            with self.__lock:
+                self.__build_writes.remove(writes)
+
+    def __ensure_loaded(self, db: Session) -> None:
+        loaded_at: float|None = self.__loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.max_age:
+            self.load(db)
+
+    def invalidate(self) -> None:
+        '''Drops the index. It is rebuilt on the next lookup.'''
+        with self.__lock:
+            self.__loaded_at = None
+
+    # Lookups
+    def get_room_id(self, db: Session, room_number: int) -> int|None:
+        '''Returns the room_id of the room number, or None if the room doesn't exist.'''
+        self.__ensure_loaded(db)
+        with self.__lock:
+            return self.__room_ids.get(room_number)
+
+    def is_available(self, db: Session, room_id: int, checkin: date, checkout: date, exclude_booking_id: str|None = None) -> bool:
+        '''
+        Returns True if no active booking of the room overlaps [checkin, checkout).
+
+        Args:
+            * exclude_booking_id: (str) A booking to ignore, such as the booking being updated.
+        '''
+        self.__ensure_loaded(db)
+        with self.__lock:
+            intervals: RoomIntervals|None = self.__intervals.get(room_id)
+            return intervals is None or not intervals.overlaps(checkin, checkout, exclude_booking_id)
+
+    def free_rooms(self, db: Session, checkin: date, checkout: date, state_id: int|None = None) -> list[tuple[int, int, int]]:
+        '''
+        Returns (room_number, r_type_id, state_id) of the rooms without active bookings in [checkin, checkout).
+        If state_id is specified, only the rooms in that state are returned.
+        '''
+        self.__ensure_loaded(db)
+        with self.__lock:
+            return sorted(room for room_id, room in self.__rooms.items()
+                          if (state_id is None or room[2] == state_id)
+                          and (room_id not in self.__intervals or not self.__intervals[room_id].overlaps(checkin, checkout)))
+
+    # Updates. They are ignored while the index isn't loaded, because the next load reads the current state,
+    # but recorded for the builds in progress.
+    def __record(self, apply: Callable, *args) -> None:
+        for writes in self.__build_writes:
+            writes.append((apply, args))
+
+    def __set_room(self, room_id: int, room_number: int, r_type_id: int, state_id: int) -> None:
+        previous: tuple[int, int, int]|None = self.__rooms.get(room_id)
+        if previous is not None:
+            self.__room_ids.pop(previous[0], None)
+        self.__rooms[room_id] = (room_number, r_type_id, state_id)
+        self.__room_ids[room_number] = room_id
+
+    def set_room(self, room_id: int, room_number: int, r_type_id: int, state_id: int) -> None:
+        '''Adds or updates a room.'''
+        with self.__lock:
+            self.__record(self.__set_room, room_id, room_number, r_type_id, state_id)
+            if self.__loaded_at is not None:
+                self.__set_room(room_id, room_number, r_type_id, state_id)
+
+    def __remove_room(self, room_number: int) -> None:
+        room_id: int|None = self.__room_ids.pop(room_number, None)
+        if room_id is not None:
+            self.__rooms.pop(room_id, None)
+
+    def remove_room(self, room_number: int) -> None:
+        '''Removes a room.'''
+        with self.__lock:
+            self.__record(self.__remove_room, room_number)
+            self.__remove_room(room_number)
+
+    def __remove_booking(self, booking_id: str) -> None:
+        booking: tuple[int, date, date]|None = self.__bookings.pop(booking_id, None)
+        if booking is not None:
+            self.__intervals[booking[0]].remove(booking[1], booking_id)
+
+    def __set_booking(self, booking_id: str, room_id: int, checkin: date, checkout: date) -> None:
+        self.__remove_booking(booking_id)
+        self.__bookings[booking_id] = (room_id, checkin, checkout)
+        self.__intervals.setdefault(room_id, RoomIntervals()).add(checkin, checkout, booking_id)
+
+    def set_booking(self, booking_id: str, room_id: int, checkin: date, checkout: date) -> None:
+        '''Adds an active booking, or moves it to its new room and dates.'''
+        with self.__lock:
+            self.__record(self.__set_booking, booking_id, room_id, checkin, checkout)
+            if self.__loaded_at is not None:
+                self.__set_booking(booking_id, room_id, checkin, checkout)
+
+    def remove_booking(self, booking_id: str) -> None:
+        '''Removes a booking that no longer occupies its room, such as a cancelled booking.'''
+        with self.__lock:
+            self.__record(self.__remove_booking, booking_id)
+            self.__remove_booking(booking_id)
+
+availability_index: RoomAvailabilityIndex = RoomAvailabilityIndex(AVAILABILITY_INDEX_MAX_AGE)
@@ -0,0 +1,203 @@
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator
+from dotenv import load_dotenv
+
+# Load environmental variables from .env
+load_dotenv()
+# Storage backend of the government ID images. See BACKENDS.
+BLOB_STORE_BACKEND: str = os.getenv("BLOB_STORE_BACKEND", "local").lower()
+# Root directory of the local backend
+BLOB_STORE_PATH: str = os.getenv("BLOB_STORE_PATH", "blobs")
+# Largest accepted image, in bytes
+BLOB_MAX_SIZE: int = int(os.getenv("BLOB_MAX_SIZE", str(5 * 1024 * 1024)))
+# Bytes read or written at a time
+BLOB_CHUNK_SIZE: int = 64 * 1024
+
+# Leading bytes of the accepted image formats -> media type
+MEDIA_TYPES: tuple[tuple[bytes, str], ...] = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"%PDF-", "application/pdf"),
+)
+# Keys are the SHA-256 digests of the contents
+KEY_PATTERN: re.Pattern = re.compile(r"^[0-9a-f]{64}$")
+
+def media_type(head: bytes) -> str|None:
+    '''Returns the media type of content that starts with head, or None if it isn't an accepted format.'''
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return next((media for magic, media in MEDIA_TYPES if head.startswith(magic)), None)
+
+def validate_key(key: str) -> str:
+    '''Returns the key. Raises ValueError if it isn't a SHA-256 hex digest, so that it can't address anything else.'''
+    if not isinstance(key, str) or not KEY_PATTERN.match(key):
+        raise ValueError("Invalid image key.")
+    return key
+
+@dataclass
+class BlobInfo:
+    key: str
+    size: int
+    media_type: str
+
+class BlobWriter:
+    '''
+    Receives a blob in chunks, hashing it and writing it to a temporary file of the store, then files it under its
+    digest with commit(). Abort the writer if the upload fails.
+    '''
+    def __init__(self, store: "LocalBlobStore", max_size: int):
+        self.__store: LocalBlobStore = store
+        self.__max_size: int = max_size
+        self.__digest = hashlib.sha256()
+        self.__head: bytes = b""
+        self.size: int = 0
+        fd, self.__temp_path = tempfile.mkstemp(dir=store.temp_dir)
+        self.__file: BinaryIO = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        '''Appends a chunk. Raises ValueError once the blob is larger than max_size.'''
+        self.size += len(chunk)
+        if self.size > self.__max_size:
+            raise ValueError(f"The image is larger than {self.__max_size} bytes.")
+        if len(self.__head) < 16:
+            self.__head += chunk[:16 - len(self.__head)]
+        self.__digest.update(chunk)
+        self.__file.write(chunk)
+
+    def commit(self) -> BlobInfo:
+        '''Stores the blob and returns its key. Raises ValueError if it is empty or not an accepted image format.'''
+        self.__file.close()
+        media: str|None = media_type(self.__head)
+        if self.size == 0 or media is None:
+            self.abort()
+            raise ValueError("The image should be a JPEG, PNG, WebP or PDF file.")
+        key: str = self.__digest.hexdigest()
+        self.__store._file(self.__temp_path, key)
+        return BlobInfo(key=key, size=self.size, media_type=media)
+
+    def abort(self) -> None:
+        '''Drops the partial blob.'''
+        self.__file.close()
+        if os.path.exists(self.__temp_path):
+            os.unlink(self.__temp_path)
+
+class LocalBlobStore:
+    '''
+    Content-addressed blob store on the local filesystem. A blob is stored once, under root/ab/cd/<sha-256 digest>,
+    however many bookings reference it, and is never modified, so a key always returns the same content.
+    '''
+    def __init__(self, root: str):
+        self.root: str = os.path.abspath(root)
+        # Temporary files are created on the same filesystem, so that filing them is an atomic rename
+        self.temp_dir: str = os.path.join(self.root, "tmp")
+
+    def __path(self, key: str) -> str:
+        validate_key(key)
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def _file(self, temp_path: str, key: str) -> None:
+        '''Moves a written temporary file under its key. An existing copy of the same content is kept.'''
+        path: str = self.__path(key)
+        if os.path.exists(path):
+            os.unlink(temp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+
+    def writer(self, max_size: int = BLOB_MAX_SIZE) -> BlobWriter:
+        '''Returns a writer for a new blob.'''
+        os.makedirs(self.temp_dir, exist_ok=True)
+        return BlobWriter(self, max_size)
+
+    def put(self, chunks: Iterator[bytes], max_size: int = BLOB_MAX_SIZE) -> BlobInfo:
+        '''Stores the blob made of the chunks and returns its key.'''
+        writer: BlobWriter = self.writer(max_size)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except Exception:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.__path(key))
+
+    def path(self, key: str) -> str|None:
+        '''
+        Returns the file of the blob, which the API sends with FileResponse (with range requests and, where the
+        ASGI server supports it, zero-copy sends). Returns None if the blob doesn't exist.
+        '''
+        path: str = self.__path(key)
+        return path if os.path.isfile(path) else None
+
+    def open(self, key: str) -> Iterator[bytes]:
+        '''Yields the content of the blob in chunks. Raises ValueError if it doesn't exist.'''
+        path: str|None = self.path(key)
+        if path is None:
+            raise ValueError("The image doesn't exist.")
+        with open(path, "rb") as file:
+            while chunk := file.read(BLOB_CHUNK_SIZE):
+                yield chunk
+
+    def media_type(self, key: str) -> str|None:
+        '''Returns the media type of the blob, read from its leading bytes.'''
+        path: str|None = self.path(key)
+        if path is None:
+            return None
+        with open(path, "rb") as file:
+            return media_type(file.read(16))
+
+# Backend name -> class. A backend takes its configuration from the environment and implements the methods of LocalBlobStore.
+BACKENDS: dict[str, type] = {"local": LocalBlobStore}
+
+def create_blob_store() -> LocalBlobStore:
+    '''Returns the store of the configured backend.'''
+    if BLOB_STORE_BACKEND not in BACKENDS:
+        raise ValueError(f"Unsupported blob store backend: {BLOB_STORE_BACKEND}. Specify one of: {', '.join(BACKENDS)}.")
+    return BACKENDS[BLOB_STORE_BACKEND](BLOB_STORE_PATH)
+
+blob_store: LocalBlobStore = create_blob_store()
+
+def main() -> None:
+    '''
+    Moves the images stored in the legacy Bookings.govt_id_img column into the blob store:
+    python -m utils.blob_store. Run it between migrations 002 and 003.
+    '''
+    from sqlalchemy import text
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Moves the government ID images of the Bookings table into the blob store.")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    moved: int = 0
+    after: int = 0
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(text("SELECT id, govt_id_img FROM Bookings WHERE govt_id_img IS NOT NULL AND id > :after ORDER BY id LIMIT :limit"),
+                              {"after": after, "limit": args.batch_size}).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                content: bytes = bytes(row.govt_id_img)
+                try:
+                    info: BlobInfo = blob_store.put(content[i:i + BLOB_CHUNK_SIZE] for i in range(0, len(content), BLOB_CHUNK_SIZE))
+                except ValueError as e:
+                    # The image stays in the row, and migration 003 drops it. Export it first if it is needed.
+                    print(f"Booking row {row.id}: {e}", file=sys.stderr)
+                    continue
+                db.execute(text("UPDATE Bookings SET govt_id_img_key = :key, govt_id_img = NULL WHERE id = :id"), {"key": info.key, "id": row.id})
+                moved += 1
+            db.commit()
+            after = rows[-1].id
+            print(f"{moved} images moved", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
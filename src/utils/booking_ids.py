@@ -0,0 +1,73 @@
+import os
+import threading
+from collections import deque
+from dotenv import load_dotenv
+from sqlalchemy import Engine, select, update
+from . import models, cloudbeds_exceptions
+
+# Load environmental variables from .env
+load_dotenv()
+# Booking numbers reserved per round trip to BookingIDGenerator. Numbers left unused when a worker stops are skipped.
+BOOKING_ID_BLOCK_SIZE: int = int(os.getenv("BOOKING_ID_BLOCK_SIZE", "100"))
+
+class BookingIdAllocator:
+    '''
+    Hi/lo allocator of the B<number> booking IDs.
+    Each worker reserves blocks of numbers by advancing BookingIDGenerator.last_booking_id in a short transaction of its own,
+    then hands the numbers out from memory. Blocks never overlap, so the IDs are unique across workers and restarts,
+    and the generator row is locked once per block instead of once per booking.
+    '''
+    def __init__(self, block_size: int):
+        self.block_size: int = block_size
+        self.__lock = threading.Lock()
+        # Reserved, unused numbers as [start, end) ranges
+        self.__blocks: deque[tuple[int, int]] = deque()
+
+    def __reserve(self, engine: Engine, size: int) -> tuple[int, int]:
+        '''
+        Reserves size numbers and returns them as a [start, end) range.
+        The UPDATE comes first so that it locks the row (or the SQLite database) before the new value is read.
+        '''
+        with engine.begin() as connection:
+            result = connection.execute(update(models.BookingIdGenerator).values(last_booking_id=models.BookingIdGenerator.last_booking_id + size))
+            if result.rowcount != 1:
+                raise cloudbeds_exceptions.DBError("BookingIDGenerator should contain exactly one row.")
+            last: int = connection.execute(select(models.BookingIdGenerator.last_booking_id)).scalar_one()
+        return (last - size + 1, last + 1)
+
+    def __take(self, count: int, ids: list[str]) -> None:
+        '''Moves up to count reserved numbers into ids. The caller must hold the lock.'''
+        while len(ids) < count and self.__blocks:
+            start, end = self.__blocks.popleft()
+            taken: int = min(count - len(ids), end - start)
+            ids.extend(f"B{number}" for number in range(start, start + taken))
+            if start + taken < end:
+                self.__blocks.appendleft((start + taken, end))
+
+    def allocate(self, engine: Engine, count: int = 1) -> list[str]:
+        '''
+        Returns count new booking IDs.
+        Allocate before writing in the caller's transaction: with SQLite, the reservation needs the write lock.
+
+        Args:
+            * engine: (Engine) The engine of the database. Inside AsyncSession.run_sync, pass the session's bind.
+            * count: (int) The number of IDs.
+        '''
+        ids: list[str] = []
+        with self.__lock:
+            self.__take(count, ids)
+        while len(ids) < count:
+            # The lock isn't held during the round trip, so that it never blocks an event loop thread.
+            # Blocks reserved concurrently are all kept for later allocations.
+            block: tuple[int, int] = self.__reserve(engine, max(self.block_size, count - len(ids)))
+            with self.__lock:
+                self.__blocks.append(block)
+                self.__take(count, ids)
+        return ids
+
+    def reset(self) -> None:
+        '''Drops the reserved numbers, such as when switching to another database.'''
+        with self.__lock:
+            self.__blocks.clear()
+
+booking_id_allocator: BookingIdAllocator = BookingIdAllocator(BOOKING_ID_BLOCK_SIZE)
@@ -7,3 +7,8 @@ class InvalidArgument(Exception):
     def __init__(self, message):
         self.message = message
         super().__init__(self.message)
+
+class ServiceBusy(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
@@ -1,15 +1,26 @@
 from sqlalchemy.orm.session import Session
-from . import models, schemas, cloudbeds_exceptions
+from sqlalchemy.orm import joinedload, selectinload
+from . import models, schemas, cloudbeds_exceptions, pagination, lookup_cache, occupancy, customer_import, projections, customer_keys
+from .availability import availability_index, RoomIntervals, ACTIVE_BOOKING_STATUSES
+from .hashing import password_hasher
+from .token_cache import token_cache
+from .booking_ids import booking_id_allocator
+from .room_locks import room_locks
+from .blob_store import blob_store
+from .search_index import customer_search, employee_search
+from . import resource_versions as versions
+from .resource_versions import resource_versions
 from pydantic import EmailStr, SecretStr
-from sqlalchemy import select, Row, or_, update, Delete, Insert, Select, and_, ResultProxy, Update
+from sqlalchemy import select, Row, or_, update, Delete, Insert, Select, and_, ResultProxy, Update, union_all
 from itertools import islice
-from typing import List, Dict, Annotated
+from typing import List, Dict, Annotated, Callable, Iterable, Iterator
 import secrets, string
+import csv, io, json
+import numpy as np
 # from werkzeug.security import generate_password_hash
 import traceback
 from datetime import datetime, date, timedelta, UTC
 from dateutil import tz
-from passlib.context import CryptContext
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -20,6 +31,18 @@ import os
 load_dotenv()
 SECRET_KEY: SecretStr = os.getenv("SECRET_KEY")
 ALGORITHM: str = os.getenv("ALGORITHM")
+# Maximum number of bookings in one bulk booking request
+BULK_BOOKING_MAX_ITEMS: int = int(os.getenv("BULK_BOOKING_MAX_ITEMS", "500"))
+# Number of rooms written per statement and per commit by the bulk room endpoints
+ROOM_BULK_BATCH_SIZE: int = int(os.getenv("ROOM_BULK_BATCH_SIZE", "500"))
+# Largest CSV file accepted by the bulk room import, in bytes. The file is read whole; 1 MiB holds about 40,000 rooms.
+ROOM_CSV_MAX_SIZE: int = int(os.getenv("ROOM_CSV_MAX_SIZE", str(1024 * 1024)))
+# Number of rows fetched from the server-side cursor, and written to the response, at a time by the booking export
+EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# Maximum number of keys in one Customer.get_customers call
+CUSTOMER_BATCH_MAX_KEYS: int = int(os.getenv("CUSTOMER_BATCH_MAX_KEYS", "500"))
+# Room state of the rooms that can be booked. /room/available/ skips the rooms in the other states, such as Maintenance.
+ROOM_STATE_AVAILABLE: str = "Available"
 
 def generate_password(length=10) -> str:
     '''
@@ -29,31 +52,6 @@ def generate_password(length=10) -> str:
     password: SecretStr = ''.join(secrets.choice(characters) for _ in range(length))
     return password
 
-def build_emp_out_payload(result:Row)->schemas.EmployeeOut:
-    '''Builds the EmployeeOut payload'''
-    employee_data: dict[str, str] = result.Employee.__dict__
-    employee_data = dict(islice(employee_data.items(), 1, len(employee_data.items())))
-    emp_id: int = employee_data.pop("emp_id")
-    # We don't want to expose the password hash through this method
-    del employee_data["password_hash"]
-    # EmployeeOut payload doesn't accept the following attributes: current_login_at, current_login_ip, last_login_at, last_login_ip, login_count
-    del employee_data["current_login_at"]
-    del employee_data["current_login_ip"]
-    del employee_data["last_login_at"]
-    del employee_data["last_login_ip"]
-    del employee_data["login_count"]
-
-    # Use the backref to get the employee's address
-    employee_address: dict[str, str] = result.Employee.addresses[0].__dict__
-    employee_address = dict(islice(employee_address.items(), 1, len(employee_address.items())))
-    # Remove unnecessary attributes from the employee address
-    del employee_address["emp_id"]
-    del employee_address["address_id"]
-    
-    # Generate the EmployeeOut payload
-    employee: schemas.EmployeeOut = schemas.EmployeeOut(emp_id=emp_id, emp_details=employee_data, emp_address=employee_address)
-    return employee
-
 def get_employee(query_value: int|EmailStr, db: Session) -> schemas.EmployeeOut|None:
     '''
     Returns the details of an employee. If Employee isn't found in the database, it returns None.
@@ -63,14 +61,14 @@ def get_employee(query_value: int|EmailStr, db: Session) -> schemas.EmployeeOut|
     '''
     try:
         if isinstance(query_value, int):
-            stmt: Select = Select(models.Employee).where(models.Employee.emp_id == query_value)
+            stmt: Select = projections.employee_out.select().where(models.Employee.emp_id == query_value)
         elif EmailStr._validate(query_value):
-            stmt: Select = Select(models.Employee).where(models.Employee.email == query_value)
+            stmt: Select = projections.employee_out.select().where(models.Employee.email == query_value)
         else:
             raise ValueError("Invalid query value. It should be either an integer or an email string.")
         result: Row|None = db.execute(stmt).fetchone()
         if result:
-            employee: schemas.EmployeeOut = build_emp_out_payload(result)
+            employee: schemas.EmployeeOut = projections.employee_out.build(result)
         else:
             employee = None
         return employee
@@ -88,13 +86,13 @@ def list_employees(db: Session, skip: int = 0, limit: int = 10) -> List[schemas.
         * limit: (int) End record number
     '''
     try:
-        stmt: Select = Select(models.Employee).limit(limit).offset(skip)
+        stmt: Select = projections.employee_out.select().limit(limit).offset(skip)
         result: List[Row]|None = db.execute(stmt).fetchall()
         # If there are no employee records in the database, raise an error.
         if result == None:
             raise ValueError("No employee records found in the database.")
         # Build the EmployeeOut payload 
-        employees:List[schemas.EmployeeOut] = [build_emp_out_payload(employee) for employee in result]
+        employees:List[schemas.EmployeeOut] = [projections.employee_out.build(employee) for employee in result]
         return employees
     except Exception as e:
         traceback(traceback.print_exc())
@@ -122,6 +120,8 @@ def create_employee(payload: schemas.EmployeeIn, db: Session) -> schemas.Employe
     address.emp_id = employee.emp_id
     db.add(address)
     db.commit()
+    resource_versions.bump(versions.EMPLOYEES)
+    employee_search.set(employee.emp_id, payload.emp_details.model_dump())
     # Create the return payload
     result: schemas.EmployeePasswordOut = schemas.EmployeePasswordOut(emp_id=employee.emp_id, password=password)
     return result
@@ -155,6 +155,10 @@ def manage_employee(emp_id:int, is_active: bool, db: Session)  -> schemas.Manage
     stmt = update(models.Employee).where(models.Employee.emp_id == emp_id).values(is_active=is_active)
     db.execute(stmt)
     db.commit()
+    resource_versions.bump(versions.EMPLOYEES)
+    # Make the tokens of a deactivated employee go through verification again, which rejects them
+    if not is_active:
+        token_cache.evict_employee(emp_id)
     # Create the return payload
     stmt = select(models.Employee.emp_id,
                   models.Employee.is_active).   \
@@ -167,34 +171,10 @@ def manage_employee(emp_id:int, is_active: bool, db: Session)  -> schemas.Manage
 class Employee():
     def __init__(self, db: Session):
         self.__db: Session = db
-        self.__bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        # Cursor of the page after the last page returned by list_employees. None if there are no more records.
+        self.next_cursor: str|None = None
         
 
-    def __build_emp_out_payload(self, result:Row)->schemas.EmployeeOut:
-        '''Builds the EmployeeOut payload'''
-        employee_data: dict[str, str] = result.Employee.__dict__
-        employee_data = dict(islice(employee_data.items(), 1, len(employee_data.items())))
-        emp_id: int = employee_data.pop("emp_id")
-        # We don't want to expose the password hash through this method
-        del employee_data["password_hash"]
-        # EmployeeOut payload doesn't accept the following attributes: current_login_at, current_login_ip, last_login_at, last_login_ip, login_count
-        del employee_data["current_login_at"]
-        del employee_data["current_login_ip"]
-        del employee_data["last_login_at"]
-        del employee_data["last_login_ip"]
-        del employee_data["login_count"]
-
-        # Use the backref to get the employee's address
-        employee_address: dict[str, str] = result.Employee.addresses[0].__dict__
-        employee_address = dict(islice(employee_address.items(), 1, len(employee_address.items())))
-        # Remove unnecessary attributes from the employee address
-        del employee_address["emp_id"]
-        del employee_address["address_id"]
-        
-        # Generate the EmployeeOut payload
-        employee: schemas.EmployeeOut = schemas.EmployeeOut(emp_id=emp_id, emp_details=employee_data, emp_address=employee_address)
-        return employee
-
     def __generate_password(self, length=10) -> str:
         '''
         Generates secured default password. Default length of the generated password record is 10.
@@ -209,6 +189,7 @@ class Employee():
     def authenticate_employee(self, username: EmailStr, password: str) -> models.Employee | bool:
         '''
         Authenticates an employee based on the username and password provided.
+        If the stored password hash uses an outdated bcrypt cost, it is replaced with a hash that uses the current cost.
         
         Args:
             * username: (EmailStr) The email address of the employee.
@@ -225,10 +206,19 @@ class Employee():
         
         if result == None:
             return False
-        if not self.__bcrypt_context.verify(password, result.Employee.password_hash):
+        verified, new_password_hash = password_hasher.verify_and_update(password, result.Employee.password_hash)
+        if not verified:
             return False
+        if new_password_hash:
+            result.Employee.password_hash = new_password_hash
+            self.__db.commit()
         return result.Employee
 
+    def is_active(self, emp_id: int) -> bool:
+        '''Returns True if the employee exists and is active. Tokens of the other employees are rejected.'''
+        stmt: Select = select(models.Employee.is_active).where(models.Employee.emp_id == emp_id)
+        return bool(self.__db.execute(stmt).scalar())
+
     def create_access_token(self, username: EmailStr, emp_id: int, expires_delta: timedelta, roles: list[str]|None = None) -> str:
         '''
         Creates an access token for the employee.
@@ -255,9 +245,9 @@ class Employee():
         employee: models.Employee = models.Employee(**payload.emp_details.model_dump())
         # Set a secured password
         password:SecretStr = self.__generate_password()
-        # Instead of using the set_password method of the model, let's use the CryptContext to hash the password.
+        # Instead of using the set_password method of the model, let's use the shared password hasher.
         
-        password_hash:SecretStr = self.__bcrypt_context.hash(password)
+        password_hash:SecretStr = password_hasher.hash(password)
         employee.password_hash = password_hash
 
         self.__db.add(employee)
@@ -269,43 +259,54 @@ class Employee():
         address.emp_id = employee.emp_id
         self.__db.add(address)
         self.__db.commit()
+        resource_versions.bump(versions.EMPLOYEES)
+        employee_search.set(employee.emp_id, payload.emp_details.model_dump())
         # Create the return payload
         result: schemas.EmployeePasswordOut = schemas.EmployeePasswordOut(emp_id=employee.emp_id, password=password)
         return result
 
-    def list_employees(self, skip: int = 0, limit: int = 10, query_value: int|EmailStr|str|None = None) -> List[schemas.EmployeeOut]|None:
+    def list_employees(self, skip: int = 0, limit: int = 10, query_value: int|EmailStr|str|None = None, cursor: str|None = None) -> List[schemas.EmployeeOut]|None:
         '''
         Returns the list of all employees from the database. If the database is empty, it returns [None].
         By default, it returns 10 records at a time.
+        The cursor of the next page is stored in self.next_cursor.
         Args:
             * db: SQL Alchemy session object
             * skip: (int) Starting record number
             * limit: (int) End record number
+            * cursor: (str) Cursor returned with the previous page. If specified, skip is ignored.
         '''
         try:
             # If caller has provided a query value, get the employee details based on the query value.
             if query_value:
                 if isinstance(query_value, int):
-                    stmt: Select = Select(models.Employee).where(models.Employee.emp_id == query_value)
+                    stmt: Select = projections.employee_out.select().where(models.Employee.emp_id == query_value)
                 elif EmailStr._validate(query_value):
-                    stmt: Select = Select(models.Employee).where(models.Employee.email == query_value)
+                    stmt: Select = projections.employee_out.select().where(models.Employee.email == query_value)
                 
                 result: Row|None = self.__db.execute(stmt).fetchone()
                 
                 if result == None:
                     return None
                 
-                employee: schemas.EmployeeOut = self.__build_emp_out_payload(result)
+                employee: schemas.EmployeeOut = projections.employee_out.build(result)
                 return [employee]
                 
-            # Return the list of employees per the specified offset
-            stmt: Select = Select(models.Employee).limit(limit).offset(skip)
+            # Return the list of employees per the specified cursor or offset
+            stmt: Select = projections.employee_out.select().order_by(models.Employee.emp_id).limit(limit)
+            if cursor:
+                stmt = stmt.where(pagination.keyset_filter([models.Employee.emp_id], pagination.decode_cursor(cursor, int)))
+            else:
+                stmt = stmt.offset(skip)
             result: List[Row]|None = self.__db.execute(stmt).fetchall()
             # If there are no employee records in the database, raise an error.
             if result == None:
                 raise ValueError("No employee records found in the database.")
+            # A full page means that there might be more records after it
+            if limit and len(result) == limit:
+                self.next_cursor = pagination.encode_cursor(result[-1].emp_id)
             # Build the EmployeeOut payload 
-            employees:List[schemas.EmployeeOut] = [self.__build_emp_out_payload(employee) for employee in result]
+            employees:List[schemas.EmployeeOut] = [projections.employee_out.build(employee) for employee in result]
             return employees
         except Exception as e:
             traceback.print_exc()
@@ -315,6 +316,30 @@ class Employee():
                 case _:
                     raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
 
+    def search_employees(self, query: str, skip: int = 0, limit: int = 20) -> List[schemas.EmployeeOut]:
+        '''
+        Returns the employees whose name, phone or email matches the query, best match first (see search_index.SearchIndex).
+        A word of the query matches the words that it is the beginning of, and words with a typo.
+        Args:
+            * query: (str) Words to look for, such as a partial name or phone number.
+            * skip: (int) Number of matches to skip
+            * limit: (int) Maximum number of matches to return
+        '''
+        try:
+            emp_ids: list[int] = employee_search.search(self.__db, query, skip, limit)
+            if not emp_ids:
+                return []
+            stmt: Select = projections.employee_out.select().where(models.Employee.emp_id.in_(emp_ids))
+            employees: dict[int, schemas.EmployeeOut] = {row.emp_id: projections.employee_out.build(row) for row in self.__db.execute(stmt)}
+            return [employees[emp_id] for emp_id in emp_ids if emp_id in employees]
+        except Exception as e:
+            traceback.print_exc()
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise ValueError(e)
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
     def reset_password(self, emp_id: int) -> schemas.EmployeePasswordOut:
         '''
         Resets the employee's password and returns the new password to the caller.
@@ -327,7 +352,7 @@ class Employee():
         '''
         # Set a secured password
         password:SecretStr = self.__generate_password()
-        password_hash:SecretStr = self.__bcrypt_context.hash(password)
+        password_hash:SecretStr = password_hasher.hash(password)
 
         # Create an update statement
 
@@ -431,27 +456,14 @@ class RoomType():
                     case _:
                         raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}: DB operation failed.")
 
-    def _get_supported_room_types_with_id(self) -> List[Row]:
+    def _get_room_type_id(self, room_type: str) -> int|None:
         '''
-        Returns the supported room types with their IDs.
+        Returns the ID of the supplied room type from the lookup cache.
 
         Returns:
-            list: A list of supported room types with their IDs.
+            int: The room type ID, or None if the room type doesn't exist in the database.
         '''
-        stmt = select(models.RoomType.id, models.RoomType.room_type)
-        result: list[Row] = self.db.execute(stmt).fetchall()
-        return result
-
-    def _get_supported_room_states_with_id(self) -> List[Row]:
-        '''
-        Returns the supported room states with their IDs.
-
-        Returns:
-            list: A list of supported room states with their IDs.
-        '''
-        stmt = select(models.RoomState.id, models.RoomState.room_state)
-        result: list[Row] = self.db.execute(stmt).fetchall()
-        return result
+        return lookup_cache.room_types.get_id(self.db, room_type)
 
     def _verify_room_type(self, room_type: str) -> bool:
         '''
@@ -460,11 +472,7 @@ class RoomType():
         Returns:
             bool: True if the room type exists in the database.
         '''
-        stmt = select(models.RoomType.room_type).where(models.RoomType.room_type == room_type)
-        result: Row = self.db.execute(stmt).fetchone()
-        if result:
-            return True
-        return False
+        return self._get_room_type_id(room_type) is not None
 
     # Public methods
     def get_supported_room_types(self) -> schemas.RoomTypeBase:
@@ -474,9 +482,7 @@ class RoomType():
             Returns:
                 list: A list of supported room types.
             """
-            stmt = select(models.RoomType.id, models.RoomType.room_type)
-            result: list[Row] = self.db.execute(stmt).fetchall()
-            supported_room_types: list[str] = {"room_types":[row.room_type for row in result]}
+            supported_room_types: list[str] = {"room_types":lookup_cache.room_types.names(self.db)}
             return supported_room_types
 
     def manage_room_types(self, action: str, room_type: str, new_room_type: str|None = None) -> schemas.GenericMessage:
@@ -507,6 +513,9 @@ class RoomType():
             result = self.__update_room_type(room_type, new_room_type)
         else:
             raise cloudbeds_exceptions.InvalidArgument("Invalid action. It should be either 'add', 'remove' or 'delete'.")
+        # The room types have changed. Reload them on the next lookup.
+        lookup_cache.room_types.invalidate()
+        resource_versions.bump(versions.ROOM_TYPES)
         if result == 0:
             return {"msg":"Success"}
             
@@ -597,6 +606,15 @@ class RoomState():
                     case _:
                         raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}: DB operation failed.")
 
+    def _get_room_state_id(self, room_state: str) -> int|None:
+        '''
+        Returns the ID of the supplied room state from the lookup cache.
+
+        Returns:
+            int: The room state ID, or None if the room state doesn't exist in the database.
+        '''
+        return lookup_cache.room_states.get_id(self.db, room_state)
+
     def _verify_room_state(self, room_state: str) -> bool:
         '''
         Verifies if the supplied room state exists in the database.
@@ -604,11 +622,7 @@ class RoomState():
         Returns:
             bool: True if the room state exists in the database.
         '''
-        stmt = select(models.RoomState.room_state).where(models.RoomState.room_state == room_state)
-        result: Row = self.db.execute(stmt).fetchone()
-        if result:
-            return True
-        return False
+        return self._get_room_state_id(room_state) is not None
 
     def get_supported_room_states(self) -> schemas.RoomStateBase:
         """
@@ -617,9 +631,7 @@ class RoomState():
         Returns:
             list: A list of room status.
         """
-        stmt = select(models.RoomState.id, models.RoomState.room_state)
-        result: list[Row] = self.db.execute(stmt).fetchall()
-        room_status: list[str] = {"room_states":[row.room_state for row in result]}
+        room_status: list[str] = {"room_states":lookup_cache.room_states.names(self.db)}
         return room_status
 
     def manage_room_states(self, action: str, room_state: str, new_room_state: str|None = None) -> schemas.GenericMessage:
@@ -650,6 +662,9 @@ class RoomState():
             result = self.__update_room_state(room_state, new_room_state)
         else:
             raise cloudbeds_exceptions.InvalidArgument("Invalid action. It should be either 'add', 'remove' or 'delete'.")
+        # The room states have changed. Reload them on the next lookup.
+        lookup_cache.room_states.invalidate()
+        resource_versions.bump(versions.ROOM_STATES)
         if result == 0:
             return {"msg":"Success"}
 
@@ -658,6 +673,8 @@ class Room(RoomType, RoomState):
         self.db = db
         RoomType.__init__(self, db)
         RoomState.__init__(self, db)
+        # Cursor of the page after the last page returned by list_rooms. None if there are no more records.
+        self.next_cursor: str|None = None
 
     def add_room(self, room_number: int, room_type: str, room_state: str) -> schemas.GenericMessage:
         '''
@@ -677,9 +694,12 @@ class Room(RoomType, RoomState):
                 *   If the room number already exists in the database.
             DBError: If the operation fails due to an unknown error.
         '''
-        if not self._verify_room_type(room_type):
+        # Get room_type_id and state_id by using the room_type and room_state
+        r_type_id: int|None = self._get_room_type_id(room_type)
+        if r_type_id is None:
             raise ValueError(f"Invalid room_type: {room_type}")
-        if not self._verify_room_state(room_state):
+        state_id: int|None = self._get_room_state_id(room_state)
+        if state_id is None:
             raise ValueError(f"Invalid room_state: {room_state}")
         try:
             # Check if the supplied room_number is available in DB. If yes, raise ValueError
@@ -687,16 +707,12 @@ class Room(RoomType, RoomState):
             result: Row = self.db.execute(stmt).fetchone()
             if result:
                 raise ValueError
-            # Get room_type_id by using the room_type
-            room_types: list[Row] = self._get_supported_room_types_with_id()
-            r_type_id: int = [row.id for row in room_types if row.room_type == room_type][0]
-            # Get state_id by using the room_state
-            room_states: list[Row] = self._get_supported_room_states_with_id()
-            state_id: int = [row.id for row in room_states if row.room_state == room_state][0]
             # Insert the room record
             stmt = Insert(models.Room).values(room_number=room_number, r_type_id=r_type_id, state_id=state_id)
-            self.db.execute(stmt)
+            room_id: int = self.db.execute(stmt).inserted_primary_key[0]
             self.db.commit()
+            availability_index.set_room(room_id, room_number, r_type_id, state_id)
+            resource_versions.bump(versions.ROOMS)
             return {"msg":"Success"}
         except Exception as e:
             match e.__class__.__name__:
@@ -730,6 +746,8 @@ class Room(RoomType, RoomState):
             stmt = Delete(models.Room).where(models.Room.room_number == room_number)
             self.db.execute(stmt)
             self.db.commit()
+            availability_index.remove_room(room_number)
+            resource_versions.bump(versions.ROOMS)
             return {"msg":"Success"}
         except Exception as e:
             match e.__class__.__name__:
@@ -738,15 +756,17 @@ class Room(RoomType, RoomState):
                 case _:
                     raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
 
-    def list_rooms(self, skip: int, limit: int, room_number: str | None = None, room_type: str|None = None, room_state: str|None = None) -> List[schemas.RoomBase]:
+    def list_rooms(self, skip: int, limit: int, room_number: str | None = None, room_type: str|None = None, room_state: str|None = None, cursor: str|None = None) -> List[schemas.RoomBase]:
         '''
         Returns the list of rooms from the database.
+        The cursor of the next page is stored in self.next_cursor.
 
         Args:
             skip (int): The number of records to skip.
             limit (int): The maximum number of rooms to return.
             room_type (str, optional): The room type to filter by. Defaults to None.
             room_state (str, optional): The room state to filter by. Defaults to None.
+            cursor (str, optional): Cursor returned with the previous page. If specified, skip is ignored.
 
         Returns:
             List[schemas.RoomBase]: A list of rooms.
@@ -788,22 +808,22 @@ class Room(RoomType, RoomState):
             # Check if the supplied room_type or room_state is available in DB. If not, raise ValueError.
             # If room_type and room_state is available in DB, get the room_type_id and state_id.
             if room_type:
-                if self._verify_room_type(room_type):
-                    room_type: (int) = [row.id for row in self._get_supported_room_states_with_id() \
-                                        if row.room_type.lower() == room_type.lower()][0]
-                else:
+                r_type_id: int|None = self._get_room_type_id(room_type)
+                if r_type_id is None:
                     raise ValueError(f"{room_type} doesn't exist in the database.")
+                room_type: (int) = r_type_id
             if room_state:
-                if self._verify_room_state(room_state):
-                    room_state: (int) = [row.id for row in self._get_supported_room_states_with_id() \
-                                        if row.room_state.lower() == room_state.lower()][0]
-                else:
+                state_id: int|None = self._get_room_state_id(room_state)
+                if state_id is None:
                     raise ValueError(f"{room_state} doesn't exist in the database.")
+                room_state: (int) = state_id
+            after: tuple|None = pagination.decode_cursor(cursor, int) if cursor else None
 
             try:
                 if room_type and room_state:
                     # Query to get the list of rooms that match the specified room_type and room_state
-                    stmt = select(models.Room.room_number, \
+                    stmt = select(models.Room.room_id, \
+                                models.Room.room_number, \
                                 models.RoomType.room_type, \
                                 models.RoomState.room_state).\
                         select_from(models.Room,
@@ -816,11 +836,11 @@ class Room(RoomType, RoomState):
                                 models.Room.r_type_id == room_type, \
                                 models.Room.state_id == room_state\
                             )\
-                        ).\
-                        limit(limit).offset(skip)
+                        )
                 elif room_type:
                     # Query to get the list of rooms that match the specified room_type and any room_state
-                    stmt = select(models.Room.room_number, \
+                    stmt = select(models.Room.room_id, \
+                                models.Room.room_number, \
                                 models.RoomType.room_type, \
                                 models.RoomState.room_state).\
                         select_from(models.Room,
@@ -832,11 +852,11 @@ class Room(RoomType, RoomState):
                                 models.Room.state_id ==  models.RoomState.id,\
                                 models.Room.r_type_id == room_type \
                             )\
-                        ).\
-                        limit(limit).offset(skip)
+                        )
                 elif room_state:
                     # Query to get the list of rooms that match any room_type and the specified room_state
-                    stmt = select(models.Room.room_number, \
+                    stmt = select(models.Room.room_id, \
+                                models.Room.room_number, \
                                 models.RoomType.room_type, \
                                 models.RoomState.room_state).\
                         select_from(models.Room,
@@ -848,11 +868,11 @@ class Room(RoomType, RoomState):
                                 models.Room.state_id ==  models.RoomState.id,\
                                 models.Room.state_id == room_state\
                             )\
-                        ).\
-                        limit(limit).offset(skip)
+                        )
                 else:
                     # Query to get the list of all rooms
-                    stmt = select(models.Room.room_number, \
+                    stmt = select(models.Room.room_id, \
+                                models.Room.room_number, \
                                 models.RoomType.room_type, \
                                 models.RoomState.room_state).\
                         select_from(models.Room,
@@ -863,12 +883,20 @@ class Room(RoomType, RoomState):
                                 models.Room.r_type_id == models.RoomType.id, \
                                 models.Room.state_id ==  models.RoomState.id \
                             )\
-                        ).\
-                        limit(limit).offset(skip)
-                    
+                        )
+
+                # Page through the rooms in primary key order
+                stmt = stmt.order_by(models.Room.room_id).limit(limit)
+                if after:
+                    stmt = stmt.where(pagination.keyset_filter([models.Room.room_id], after))
+                else:
+                    stmt = stmt.offset(skip)
                 result: list[Row] = self.db.execute(stmt).fetchall()
                 if result == []:
                     raise ValueError
+                # A full page means that there might be more records after it
+                if limit and len(result) == limit:
+                    self.next_cursor = pagination.encode_cursor(result[-1].room_id)
                 rooms: List[schemas.RoomBase] = [schemas.RoomBase.model_validate(row._asdict()) for row in result]
                 return rooms
             except Exception as e:
@@ -896,26 +924,25 @@ class Room(RoomType, RoomState):
                 *   If the room number doesn't exist in the database.
             DBError: If the operation fails due to an unknown error.
         '''
-        if not self._verify_room_type(room_type):
+        # Get room_type_id and state_id by using the room_type and room_state
+        r_type_id: int|None = self._get_room_type_id(room_type)
+        if r_type_id is None:
             raise ValueError(f"{room_type} doesn't exist in the database.")
-        if not self._verify_room_state(room_state):
+        state_id: int|None = self._get_room_state_id(room_state)
+        if state_id is None:
             raise ValueError(f"{room_state} doesn't exist in the database.")
         try:
             # Check if the supplied room_number is available in DB. If no, raise ValueError
-            stmt = Select(models.Room.room_number).where(models.Room.room_number == room_number)
+            stmt = Select(models.Room.room_id).where(models.Room.room_number == room_number)
             result: Row = self.db.execute(stmt).fetchone()
             if result == None:
                 raise ValueError
-            # Get room_type_id by using the room_type
-            room_types: list[Row] = self._get_supported_room_types_with_id()
-            r_type_id: int = [row.id for row in room_types if row.room_type.lower() == room_type.lower()][0]
-            # Get state_id by using the room_state
-            room_states: list[Row] = self.__get_supported_booking_statuses_with_id()
-            state_id: int = [row.id for row in room_states if row.room_state.lower() == room_state.lower()][0]
             # Update the room record
             stmt = update(models.Room).where(models.Room.room_number == room_number).values(r_type_id=r_type_id, state_id=state_id)
             self.db.execute(stmt)
             self.db.commit()
+            availability_index.set_room(result.room_id, room_number, r_type_id, state_id)
+            resource_versions.bump(versions.ROOMS)
             return {"msg":"Success"}
         except Exception as e:
             match e.__class__.__name__:
@@ -923,28 +950,217 @@ class Room(RoomType, RoomState):
                     raise ValueError(f"{room_number} doesn't exist in the database.")
                 case _:
                     raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
+    @staticmethod
+    def parse_rooms_csv(content: str) -> list[dict]:
+        '''
+        Parses a CSV file of rooms with the header room_number,room_type,room_state.
+
+        Returns:
+            list[dict]: One dict per data row, keyed by the header. Empty values are left out.
+        '''
+        return [{key: value for key, value in row.items() if value not in (None, "")} for row in csv.DictReader(io.StringIO(content))]
+
+    def add_rooms(self, rooms: list[dict], batch_size: int = ROOM_BULK_BATCH_SIZE) -> schemas.BulkRoomResult:
+        '''
+        Adds many rooms to the database. The room types and states are resolved through the lookup cache,
+        and each batch of rooms is checked with one query, added with one multi-row insert and committed.
+        Invalid rows and room numbers that already exist are skipped and reported.
+
+        Args:
+            rooms: (list[dict]) The rooms, as room_number, room_type and room_state. room_state defaults to Available.
+            batch_size: (int) The number of rooms per insert and commit.
+
+        Returns:
+            schemas.BulkRoomResult: The number of rooms added and the errors of the skipped rows.
+
+        Raises:
+            ValueError: If batch_size isn't positive.
+            DBError: If the operation fails due to an unknown error. The batches committed before the failure are kept.
+        '''
+        try:
+            if batch_size < 1:
+                raise ValueError("batch_size should be positive.")
+            errors: list[schemas.BulkRowError] = []
+            # room_number -> (index, insert values) of the valid rows
+            valid: dict[int, tuple[int, dict]] = {}
+            for i, row in enumerate(rooms):
+                try:
+                    room: schemas.RoomBase = schemas.RoomBase.model_validate(row)
+                except Exception as e:
+                    errors.append(schemas.BulkRowError(index=i, error=str(e)))
+                    continue
+                r_type_id: int|None = self._get_room_type_id(room.room_type.value)
+                room_state: str = room.room_state or "Available"
+                state_id: int|None = self._get_room_state_id(room_state)
+                if r_type_id is None:
+                    errors.append(schemas.BulkRowError(index=i, room_number=room.room_number, error=f"Invalid room_type: {room.room_type.value}"))
+                elif state_id is None:
+                    errors.append(schemas.BulkRowError(index=i, room_number=room.room_number, error=f"Invalid room_state: {room_state}"))
+                elif room.room_number in valid:
+                    errors.append(schemas.BulkRowError(index=i, room_number=room.room_number, error=f"{room.room_number} is repeated in the request."))
+                else:
+                    valid[room.room_number] = (i, dict(room_number=room.room_number, r_type_id=r_type_id, state_id=state_id))
+
+            count: int = 0
+            room_numbers: list[int] = list(valid)
+            for start in range(0, len(room_numbers), batch_size):
+                batch: list[int] = room_numbers[start:start + batch_size]
+                stmt: Select = Select(models.Room.room_number).where(models.Room.room_number.in_(batch))
+                existing: set[int] = set(self.db.execute(stmt).scalars())
+                for room_number in existing:
+                    errors.append(schemas.BulkRowError(index=valid[room_number][0], room_number=room_number, error=f"{room_number} exists in the database."))
+                values: list[dict] = [valid[room_number][1] for room_number in batch if room_number not in existing]
+                if values:
+                    self.db.execute(Insert(models.Room), values)
+                    self.db.commit()
+                    count += len(values)
+            if count:
+                # The new room_ids aren't known without a query per room. Rebuild the index on the next lookup instead.
+                availability_index.invalidate()
+                resource_versions.bump(versions.ROOMS)
+            errors.sort(key=lambda error: error.index)
+            return schemas.BulkRoomResult(msg="Success" if errors == [] else "Partial success" if count else "Failed", count=count, errors=errors)
+        except Exception as e:
+            self.db.rollback()
+            # The batches committed before the error are kept
+            resource_versions.bump(versions.ROOMS)
+            traceback.print_exc()
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise ValueError(e)
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
+    def update_rooms(self, payload: schemas.BulkRoomUpdateIn, batch_size: int = ROOM_BULK_BATCH_SIZE) -> schemas.BulkRoomResult:
+        '''
+        Sets the type and/or the state of many rooms with set-based updates,
+        such as putting a whole floor into Maintenance.
+
+        Args:
+            payload: (schemas.BulkRoomUpdateIn) The rooms, as a list or a range of room numbers, and the new values.
+            batch_size: (int) The number of listed rooms per update and commit. A range is updated with a single statement.
+
+        Returns:
+            schemas.BulkRoomResult: The number of rooms updated. Listed room numbers that don't exist are reported as errors,
+            once per index at which they are listed.
+
+        Raises:
+            ValueError: 
+                *   If neither or both of room_numbers and the range are specified, or no new value is specified.
+                *   If the room type or room state doesn't exist in the database.
+                *   If batch_size isn't positive.
+            DBError: If the operation fails due to an unknown error. The batches committed before the failure are kept.
+        '''
+        try:
+            by_range: bool = payload.room_number_from is not None and payload.room_number_to is not None
+            if by_range == (payload.room_numbers is not None):
+                raise ValueError("Specify either room_numbers or both room_number_from and room_number_to.")
+            if batch_size < 1:
+                raise ValueError("batch_size should be positive.")
+            values: dict[str, int] = {}
+            if payload.room_type is not None:
+                values["r_type_id"] = self._get_room_type_id(payload.room_type)
+                if values["r_type_id"] is None:
+                    raise ValueError(f"Invalid room_type: {payload.room_type}")
+            if payload.room_state is not None:
+                values["state_id"] = self._get_room_state_id(payload.room_state)
+                if values["state_id"] is None:
+                    raise ValueError(f"Invalid room_state: {payload.room_state}")
+            if values == {}:
+                raise ValueError("Specify room_type and/or room_state.")
+
+            errors: list[schemas.BulkRowError] = []
+            count: int = 0
+            if by_range:
+                stmt: Update = update(models.Room) \
+                                .where(models.Room.room_number.between(payload.room_number_from, payload.room_number_to)) \
+                                .values(**values)
+                count = self.db.execute(stmt).rowcount
+                self.db.commit()
+            else:
+                # room_number -> indexes of the room number in the request
+                indexes: dict[int, list[int]] = {}
+                for i, room_number in enumerate(payload.room_numbers):
+                    indexes.setdefault(room_number, []).append(i)
+                room_numbers: list[int] = list(indexes)
+                for start in range(0, len(room_numbers), batch_size):
+                    batch: list[int] = room_numbers[start:start + batch_size]
+                    stmt: Select = Select(models.Room.room_number).where(models.Room.room_number.in_(batch))
+                    existing: set[int] = set(self.db.execute(stmt).scalars())
+                    errors.extend(schemas.BulkRowError(index=i, room_number=room_number, error=f"{room_number} doesn't exist in the database.")
+                                  for room_number in batch if room_number not in existing for i in indexes[room_number])
+                    if existing:
+                        stmt: Update = update(models.Room).where(models.Room.room_number.in_(existing)).values(**values)
+                        count += self.db.execute(stmt).rowcount
+                        self.db.commit()
+            if count:
+                availability_index.invalidate()
+                resource_versions.bump(versions.ROOMS)
+            errors.sort(key=lambda error: error.index)
+            return schemas.BulkRoomResult(msg="Success" if errors == [] else "Partial success" if count else "Failed", count=count, errors=errors)
+        except Exception as e:
+            self.db.rollback()
+            # The batches committed before the error are kept
+            resource_versions.bump(versions.ROOMS)
+            traceback.print_exc()
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise ValueError(e)
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
+    def list_available_rooms(self, checkin: date, checkout: date) -> List[schemas.RoomBase]:
+        '''
+        Returns the rooms in the Available state that have no Booked or Ongoing booking between the checkin and checkout dates.
+        Rooms in another state, such as Maintenance, can't be sold. The rooms are looked up in the availability index, ordered by room number.
+
+        Args:
+            checkin: (date) The first night of the stay.
+            checkout: (date) The checkout date. The room is free for a booking that checks in on this date.
+
+        Returns:
+            List[schemas.RoomBase]: The available rooms.
+
+        Raises:
+            ValueError: 
+                *   If the checkout date isn't after the checkin date.
+                *   If no room is available.
+            DBError: If the operation fails due to an unknown error.
+        '''
+        try:
+            if checkin >= checkout:
+                raise ValueError("The checkout date should be after the checkin date.")
+            available_state_id: int|None = self._get_room_state_id(ROOM_STATE_AVAILABLE)
+            rooms: List[schemas.RoomBase] = [] if available_state_id is None else [
+                schemas.RoomBase(room_number=room_number,
+                                 room_type=lookup_cache.room_types.get_name(self.db, r_type_id),
+                                 room_state=lookup_cache.room_states.get_name(self.db, state_id))
+                for room_number, r_type_id, state_id in availability_index.free_rooms(self.db, checkin, checkout, available_state_id)
+            ]
+            if rooms == []:
+                raise ValueError("No rooms are available for the specified dates.")
+            return rooms
+        except Exception as e:
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise ValueError(e)
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
                         
 class Customer:
     def __init__(self, db: Session):
         self.db = db
-
-    def __build_customer_out_payload(self, result:Row)->schemas.CustomerOut:
-        '''Builds the CustomerOut payload'''
-        # The result object is a rwo that contains an instance of the customer table with just on record.
-        customer_data: dict[str, str] = result.Customer.__dict__
-        # Remove unnecessary attributes from the customer data
-        customer_data = dict(islice(customer_data.items(), 1, len(customer_data.items())))
-        customer_id: int = customer_data.pop("customer_id")
-
-        # Use the backref to get the customer's address
-        customer_address: dict[str, str] = result.Customer.addresses[0].__dict__
-        # Remove unnecessary attributes from the customer address
-        customer_address = dict(islice(customer_address.items(), 1, len(customer_address.items())))
-        del customer_address["customer_id"]
-
-        # Build the CustomerOut payload
-        result: schemas.CustomerOut = schemas.CustomerOut(customer_id=customer_id, customer_details=customer_data, customer_address=customer_address)
-        return result
+        # Cursor of the page after the last page returned by list_customers. None if there are no more records.
+        self.next_cursor: str|None = None
+
+    def _insert_customer(self, customer: schemas.CustomerIn) -> int:
+            '''Inserts the customer and the address without committing, so that callers can add them in their own transaction. Returns the customer_id.'''
+            stmt: Insert = Insert(models.Customer).values(**customer.customer_details.model_dump())
+            customer_id: int = self.db.execute(stmt).inserted_primary_key[0]
+            stmt: Insert = Insert(models.CustomerAddress).values(**customer.customer_address.model_dump(), customer_id=customer_id)
+            self.db.execute(stmt)
+            return customer_id
 
     # Add customer
     def add_customer(self, customer: schemas.CustomerIn) -> schemas.CreateCustomerResult:
@@ -974,17 +1190,13 @@ class Customer:
                 if result:
                     raise ValueError()
                 
-                # Add the customer to the database
-                stmt: Insert = Insert(models.Customer).values(**customer.customer_details.model_dump())
-                customer_result: ResultProxy = self.db.execute(stmt)
-                customer_id: int = customer_result.inserted_primary_key[0]
-
-                # Add the customer Address to teh DB
-                stmt:Insert = Insert(models.CustomerAddress).values(**customer.customer_address.model_dump(), customer_id=customer_id)
-                customer_address_result: ResultProxy = self.db.execute(stmt)
+                # Add the customer and the address to the database
+                customer_id: int = self._insert_customer(customer)
 
                 # Commit the transaction
                 self.db.commit()
+                resource_versions.bump(versions.CUSTOMERS)
+                customer_search.set(customer_id, customer.customer_details.model_dump())
 
                 # Form the output payload
                 result: schemas.CreateCustomerResult = schemas.CreateCustomerResult(msg="success", customer_id=customer_id)
@@ -998,38 +1210,145 @@ class Customer:
                     case _:
                         raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
 
+    def import_customers(self, rows: Iterable[dict], chunk_size: int = customer_import.CUSTOMER_IMPORT_CHUNK_SIZE,
+                         progress: Callable[[int, int], None]|None = None) -> schemas.CustomerImportResult:
+            """
+            Imports customers from an iterable of rows, such as utils.customer_import.read_rows, chunk_size rows at a time.
+            Only one chunk is held in memory. Each chunk is validated with schemas.CustomerIn, de-duplicated on phone and email
+            within itself and against the database with one query, added with multi-row inserts and committed.
+            Invalid rows and duplicates are skipped and reported.
+
+            Args:
+                rows (Iterable[dict]): Flat rows (see customer_import.to_customer_in) or rows in the CustomerIn shape.
+                chunk_size (int): The number of rows per chunk.
+                progress (Callable, optional): Called after each chunk with the rows read and the customers imported so far.
+
+            Returns:
+                schemas.CustomerImportResult: The counters and the first CUSTOMER_IMPORT_MAX_ERRORS row errors.
+
+            Raises:
+                ValueError: If chunk_size isn't positive.
+                cloudbeds_exceptions.DBError: If the database operation fails. The chunks committed before the failure are kept.
+            """
+            result: schemas.CustomerImportResult = schemas.CustomerImportResult(msg="Success", rows=0, imported=0, duplicates=0, failed=0, errors=[])
+
+            def report(index: int, error: str) -> None:
+                if len(result.errors) < customer_import.CUSTOMER_IMPORT_MAX_ERRORS:
+                    result.errors.append(schemas.ImportRowError(index=index, error=error))
+
+            try:
+                if chunk_size < 1:
+                    raise ValueError("chunk_size should be positive.")
+                numbered_rows: Iterable[tuple[int, dict]] = enumerate(rows)
+                while chunk := list(islice(numbered_rows, chunk_size)):
+                    # Validate the rows
+                    customers: dict[int, schemas.CustomerIn] = {}
+                    for index, row in chunk:
+                        try:
+                            if "error" in row:
+                                raise ValueError(row["error"])
+                            customers[index] = schemas.CustomerIn.model_validate(customer_import.to_customer_in(row))
+                        except ValueError as e:
+                            result.failed += 1
+                            report(index, str(e))
+
+                    # Skip the customers that exist in the database or repeat an earlier row of the chunk.
+                    # Emails are stored lowercased (see schemas.CustomerBase), so case variants are duplicates on every backend.
+                    stmt: Select = Select(models.Customer.phone, models.Customer.email) \
+                                    .where(or_(models.Customer.phone.in_({customer.customer_details.phone for customer in customers.values()}),
+                                               models.Customer.email.in_({customer.customer_details.email for customer in customers.values()})))
+                    existing: list[Row] = self.db.execute(stmt).fetchall() if customers else []
+                    phones: set[str] = {row.phone for row in existing}
+                    emails: set[str] = {row.email for row in existing}
+                    new_customers: dict[str, schemas.CustomerIn] = {}
+                    for index, customer in customers.items():
+                        details: schemas.CustomerBase = customer.customer_details
+                        if details.phone in phones or details.email in emails:
+                            result.duplicates += 1
+                            report(index, f"{details.email} or {details.phone} exists in the database or in an earlier row.")
+                            continue
+                        phones.add(details.phone)
+                        emails.add(details.email)
+                        new_customers[details.phone] = customer
+
+                    if new_customers:
+                        self.db.execute(Insert(models.Customer), [customer.customer_details.model_dump() for customer in new_customers.values()])
+                        stmt: Select = Select(models.Customer.customer_id, models.Customer.phone).where(models.Customer.phone.in_(new_customers))
+                        customer_ids: dict[str, int] = {row.phone: row.customer_id for row in self.db.execute(stmt)}
+                        self.db.execute(Insert(models.CustomerAddress),
+                                        [{**customer.customer_address.model_dump(), "customer_id": customer_ids[phone]} for phone, customer in new_customers.items()])
+                        self.db.commit()
+                        resource_versions.bump(versions.CUSTOMERS)
+                        for phone, customer in new_customers.items():
+                            customer_search.set(customer_ids[phone], customer.customer_details.model_dump())
+                        result.imported += len(new_customers)
+                    result.rows += len(chunk)
+                    if progress:
+                        progress(result.rows, result.imported)
+                result.errors.sort(key=lambda error: error.index)
+                if result.failed or result.duplicates:
+                    result.msg = "Partial success" if result.imported else "Failed"
+                return result
+            except Exception as e:
+                self.db.rollback()
+                traceback.print_exc()
+                match e.__class__.__name__:
+                    case "ValueError" | "UnicodeDecodeError":
+                        raise ValueError(e)
+                    case _:
+                        raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed after importing {result.imported} customers.")
+
+    # Columns that the kinds of customer keys are looked up by. Each one has a unique index.
+    KEY_COLUMNS: dict = {
+        customer_keys.CUSTOMER_ID: models.Customer.customer_id,
+        customer_keys.PHONE: models.Customer.phone,
+        customer_keys.EMAIL: models.Customer.email,
+    }
+
+    @staticmethod
+    def __customer_keys(customer: schemas.CustomerOut) -> dict[tuple[str, int|str], schemas.CustomerOut]:
+        '''Returns the customer under each of its keys, as (kind, value) in the form of customer_keys.classify.'''
+        return {
+            (customer_keys.CUSTOMER_ID, customer.customer_id): customer,
+            (customer_keys.PHONE, customer.customer_details.phone): customer,
+            (customer_keys.EMAIL, customer.customer_details.email): customer,
+        }
+
     # Get customer
     def get_customer(self, query_string: str) -> schemas.CustomerOut | None:
         """
         Retrieves a customer from the database based on the provided query string.
+        The query string is classified as a customer ID, a phone number or an email (see customer_keys.classify),
+        and looked up through the unique index of that column only. A number that can be both a customer ID and
+        a phone number is looked up on both indexes with a UNION ALL of the two seeks, and the customer ID wins.
 
         Args:
             query_string (str): The query string to search for a customer. It can be either the customer_id, customer's phone number or customer's email.
 
         Returns:
-            schemas.CustomerOut: The customer information as a `CustomerOut` object.
+            schemas.CustomerOut: The customer information as a `CustomerOut` object, or None if no customer matches.
 
         Raises:
-            ValueError: If the customer doesn't exist in the database.
+            ValueError: If the database operation fails.
 
         """
         try:
-            # Check if the customer exists in the DB.
-            stmt: Select = Select(models.Customer).where(
-                or_(
-                    models.Customer.customer_id == query_string,
-                    models.Customer.phone == query_string,
-                    models.Customer.email == query_string
-                )
-            )
-            result: Row|None = self.db.execute(stmt).fetchone()
+            candidates: list[tuple[str, int|str]] = customer_keys.classify(query_string)
+        except ValueError:
+            return None
+        try:
+            stmts: list[Select] = [projections.customer_out.select().where(self.KEY_COLUMNS[kind] == value) for kind, value in candidates]
+            stmt = stmts[0] if len(stmts) == 1 else union_all(*stmts)
+            result: List[Row] = self.db.execute(stmt).fetchall()
 
-            if result == None:
+            if not result:
                 return None
 
-            # Build return payload
-            result: schemas.CustomerOut = self.__build_customer_out_payload(result)
-            return result
+            # Build return payload, from the row of the first kind that matched
+            customers: dict[tuple[str, int|str], schemas.CustomerOut] = {}
+            for row in result:
+                customers.update(self.__customer_keys(projections.customer_out.build(row)))
+            return next(customers[candidate] for candidate in candidates if candidate in customers)
 
         except Exception as e:
             traceback.print_exc()
@@ -1037,32 +1356,121 @@ class Customer:
                 case _:
                     raise ValueError("Customer doesn't exist in the database.")
 
+    # Get customers
+    def get_customers(self, keys: Iterable[str]) -> dict[str, schemas.CustomerOut|None]:
+        """
+        Retrieves the customers of many keys, each a customer ID, a phone number or an email, with one query.
+        The keys are grouped by kind and each group is looked up with an IN list on the unique index of its column.
+        A number that can be both a customer ID and a phone number is put in both IN lists, and the customer ID wins.
+
+        Args:
+            keys (Iterable[str]): Up to CUSTOMER_BATCH_MAX_KEYS keys.
+
+        Returns:
+            dict[str, schemas.CustomerOut|None]: The customer of each key, in the order of the keys.
+            None for the keys that match no customer or aren't a customer ID, a phone number or an email.
+
+        Raises:
+            ValueError: If there are more than CUSTOMER_BATCH_MAX_KEYS keys.
+            cloudbeds_exceptions.DBError: If the database operation fails.
+        """
+        keys: list[str] = list(dict.fromkeys(keys))
+        if len(keys) > CUSTOMER_BATCH_MAX_KEYS:
+            raise ValueError(f"Specify at most {CUSTOMER_BATCH_MAX_KEYS} keys.")
+        classified: dict[str, list[tuple[str, int|str]]] = {}
+        for key in keys:
+            try:
+                classified[key] = customer_keys.classify(key)
+            except ValueError:
+                continue
+        try:
+            found: dict[tuple[str, int|str], schemas.CustomerOut] = {}
+            kinds: dict[str, set] = {}
+            for candidates in classified.values():
+                for kind, value in candidates:
+                    kinds.setdefault(kind, set()).add(value)
+            if kinds:
+                stmts: list[Select] = [projections.customer_out.select().where(self.KEY_COLUMNS[kind].in_(values)) for kind, values in kinds.items()]
+                stmt = stmts[0] if len(stmts) == 1 else union_all(*stmts)
+                for row in self.db.execute(stmt):
+                    found.update(self.__customer_keys(projections.customer_out.build(row)))
+            return {key: next((found[candidate] for candidate in classified.get(key, []) if candidate in found), None) for key in keys}
+        except Exception as e:
+            traceback.print_exc()
+            match e.__class__.__name__:
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
     # List customers
-    def list_customers(self, skip: int, limit: int) -> List[schemas.CustomerOut]:
+    def list_customers(self, skip: int, limit: int, cursor: str|None = None) -> List[schemas.CustomerOut]:
         """
         Retrieves a list of customers from the database.
+        The cursor of the next page is stored in self.next_cursor.
 
         Args:
             skip (int): The number of records to skip.
             limit (int): The maximum number of records to return.
+            cursor (str, optional): Cursor returned with the previous page. If specified, skip is ignored.
 
         Returns:
             List[schemas.CustomerOut]: A list of customers.
 
         """
+        # Decode the cursor outside the try block so that an invalid cursor is reported as a ValueError
+        after: tuple|None = pagination.decode_cursor(cursor, int) if cursor else None
         try:
             # Get the list of customers
-            stmt: Select = Select(models.Customer).limit(limit).offset(skip)
+            stmt: Select = projections.customer_out.select().order_by(models.Customer.customer_id).limit(limit)
+            if after:
+                stmt = stmt.where(pagination.keyset_filter([models.Customer.customer_id], after))
+            else:
+                stmt = stmt.offset(skip)
             result: List[Row] = self.db.execute(stmt).fetchall()
+            # A full page means that there might be more records after it
+            if limit and len(result) == limit:
+                self.next_cursor = pagination.encode_cursor(result[-1].customer_id)
 
             # Build the return payload
-            customers: List[schemas.CustomerOut] = [self.__build_customer_out_payload(row) for row in result]
+            customers: List[schemas.CustomerOut] = [projections.customer_out.build(row) for row in result]
             return customers
 
         except Exception as e:
             traceback.print_exc()
             raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
     
+    # Search customers
+    def search_customers(self, query: str, skip: int = 0, limit: int = 20) -> List[schemas.CustomerOut]:
+        """
+        Searches the customers by name, phone number and email, and returns the matches best first (see search_index.SearchIndex).
+        A word of the query matches the words that it is the beginning of, and words with a typo.
+
+        Args:
+            query (str): Words to look for, such as a partial name or phone number.
+            skip (int): The number of matches to skip.
+            limit (int): The maximum number of matches to return.
+
+        Returns:
+            List[schemas.CustomerOut]: The matching customers. An empty list if nothing matches.
+
+        Raises:
+            ValueError: If the query is too short or too long.
+            cloudbeds_exceptions.DBError: If the database operation fails.
+        """
+        try:
+            customer_ids: list[int] = customer_search.search(self.db, query, skip, limit)
+            if not customer_ids:
+                return []
+            stmt: Select = projections.customer_out.select().where(models.Customer.customer_id.in_(customer_ids))
+            customers: dict[int, schemas.CustomerOut] = {row.customer_id: projections.customer_out.build(row) for row in self.db.execute(stmt)}
+            return [customers[customer_id] for customer_id in customer_ids if customer_id in customers]
+        except Exception as e:
+            traceback.print_exc()
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise ValueError(e)
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
     # Update customer
     def update_customer(self, payload: schemas.CustomerOut) -> schemas.GenericMessage:
         """
@@ -1099,6 +1507,8 @@ class Customer:
 
             # Commit the transaction
             self.db.commit()
+            resource_versions.bump(versions.CUSTOMERS)
+            customer_search.set(payload.customer_id, payload.customer_details.model_dump())
 
             return {"msg":"Success"}
 
@@ -1126,7 +1536,7 @@ class Booking:
             government_id_type = booking.govt_id_type.name,
             government_id_number = booking.govt_id_num,
             exp_date = booking.exp_date,
-            govt_id_image = None,
+            govt_id_image = booking.govt_id_img_key,
             room_num = booking.room.room_number,
             comments = booking.comments,
             emp_id = booking.emp_id,
@@ -1134,24 +1544,23 @@ class Booking:
 
         return booking_data
 
-    def __build_customer_out_payload(self, booking: Row)->schemas.CustomerOut:
+    def __build_customer_out_payload(self, customer: models.Customer)->schemas.CustomerOut:
         '''
         Builds the CustomerOut payload
         
         Args:
-            booking: (models.Booking) The booking object containing the customer details.
+            customer: (models.Customer) The eager-loaded customer of the booking, including its addresses.
 
         '''
-        # Get the customer_id from the booking
-        customer_id: int = booking._mapping["Booking"].customer_id
-        # Use the get_customer method to get the customer details
-        customer: Customer = Customer(self.db)
-        result: schemas.CustomerOut = customer.get_customer(customer_id)
-
+        customer_details: schemas.CustomerBase = schemas.CustomerBase.model_validate(customer, from_attributes=True)
+        customer_address: schemas.CustomerAddressBase = schemas.CustomerAddressBase.model_validate(customer.addresses[0], from_attributes=True)
+        result: schemas.CustomerOut = schemas.CustomerOut(customer_id=customer.customer_id, customer_details=customer_details, customer_address=customer_address)
         return result
 
     def __init__(self, db: Session):
         self.db = db
+        # Cursor of the page after the last page returned by list_bookings. None if there are no more records.
+        self.next_cursor: str|None = None
 
     def __get_customer_id(self, phone: string, email: EmailStr) -> int | None:
             '''
@@ -1164,64 +1573,57 @@ class Booking:
             Returns:
                 int | None: The customer ID if the customer exists in the database, None otherwise.
             '''
-            customer: Customer = Customer(self.db)
-            # Try to locate the customer with phone number
-            result: schemas.CustomerOut|None = customer.get_customer(phone)
-            if result:
-                return result.customer_id
-            cust_id: schemas.CustomerOut|None = customer.get_customer(email)
+            # Look up both keys with one query. The customer with the phone number takes precedence.
+            customers: dict[str, schemas.CustomerOut|None] = Customer(self.db).get_customers([phone, email])
+            result: schemas.CustomerOut|None = customers[phone] or customers[email]
             if result:
                 return result.customer_id
-
-    def __get_supported_booking_statuses_with_id(self) -> List[Row]:
-        '''
-        Returns the supported room states with their IDs.
-
-        Returns:
-            list: A list of supported room states with their IDs.
-        '''
-        stmt = select(models.BookingStatus)
-        result: list[Row] = self.db.execute(stmt).fetchall()
-        return result
-
-
-    def __check_room_availability(self, Payload: schemas.BookingIn) -> int | None:
+            return None
+
+
+    def __room_conflicts(self, room_id: int, checkin: date, checkout: date, exclude_booking_id: str|None = None) -> Select:
+        '''Returns the query of the active bookings of the room that overlap [checkin, checkout).'''
+        active_status_ids: list[int] = [lookup_cache.booking_statuses.get_id(self.db, name) for name in ACTIVE_BOOKING_STATUSES]
+        stmt: Select = Select(models.Booking.id)  \
+                        .where(models.Booking.room_id == room_id)  \
+                        .where(models.Booking.checkin < checkout)  \
+                        .where(models.Booking.checkout > checkin) \
+                        .where(models.Booking.booking_status_id.in_(active_status_ids))
+        if exclude_booking_id is not None:
+            stmt = stmt.where(models.Booking.booking_id != exclude_booking_id)
+        return stmt
+
+    def __check_room_availability(self, Payload: schemas.BookingIn, exclude_booking_id: str|None = None) -> int | None:
         """
         Check if the room is available for booking.
+        A booking occupies its room from the checkin date up to, but not including, the checkout date.
 
         Args:
             Payload (schemas.BookingIn): The booking payload containing room information.
+            exclude_booking_id (str, optional): A booking to ignore, such as the booking being updated.
 
         Returns:
-            None
+            int: The room_id of the room.
 
         Raises:
-            valueError: If the room is not available for booking.
+            valueError: If the room doesn't exist or is not available for booking.
             cloudbeds_exceptions.DBError: If the database operation fails.
         """
         try:
             # Check if the room is availabel for booking.
-            # The room availability information is calculated based on the Bookings table.
-            # If the room is already booked for the specified dates, it is not available for booking.
-            
-            # Get the room_id from the rooms table
-            stmt: Select = Select(models.Room)  \
-                            .where(models.Room.room_number == Payload.booking.room_num)
-            result: list[models.Room] = self.db.execute(stmt).fetchone()
-            room_id: int = result[0].room_id
+            # The availability index answers from memory and rejects conflicting bookings without a query.
+            room_id: int|None = availability_index.get_room_id(self.db, Payload.booking.room_num)
+            if room_id == None:
+                raise ValueError(f"Room {Payload.booking.room_num} doesn't exist in the database.")
+            if not availability_index.is_available(self.db, room_id, Payload.booking.checkin, Payload.booking.checkout, exclude_booking_id):
+                raise ValueError("The room is not available for booking.")
 
-            # Check if the room is available for booking
-            stmt: Select = Select(models.Booking)  \
-                            .where(models.Booking.room_id == room_id)  \
-                            .where(models.Booking.checkin <= Payload.booking.checkout)  \
-                            .where(models.Booking.checkout >= Payload.booking.checkin) \
-                            .where(
-                                or_(models.Booking.booking_status_id == 2, 
-                                    models.Booking.booking_status_id == 3
-                                    )
-                            )
-            result: list[models.Booking] = self.db.execute(stmt).fetchone()
+            # The Bookings table stays the final arbiter, because other worker processes may have booked the room
+            stmt: Select = self.__room_conflicts(room_id, Payload.booking.checkin, Payload.booking.checkout, exclude_booking_id).limit(1)
+            result: Row|None = self.db.execute(stmt).fetchone()
             if result:
+                # The index missed a booking written elsewhere. Rebuild it on the next lookup.
+                availability_index.invalidate()
                 raise ValueError("The room is not available for booking.")
             return room_id
         except Exception as e:
@@ -1254,7 +1656,8 @@ class Booking:
             # Get system's local timezone
             local_timezone = tz.tzlocal()
             raise ValueError(f"The booking dates should be ahead of the booked on date ({booked_on.replace(tzinfo=local_timezone)}).")
-        if checkin > checkout:
+        # A booking occupies [checkin, checkout), so it must last at least one night
+        if checkin >= checkout:
             raise ValueError("The booking start date should be ahead of the booking end date.")
 
     def __validate_govt_id(self, payload: schemas.BookingIn) -> int:
@@ -1268,22 +1671,25 @@ class Booking:
             int: The government ID type ID.
 
         Raises:
-            ValueError: If the supplied government ID type is not valid or if the government ID expiry date is not ahead of the booking start date.
+            ValueError: If the supplied government ID type is not valid, if the government ID expiry date is not ahead of the booking start date,
+                or if the government ID image isn't in the blob store.
         """
         # Check if the supplied govt_id_type is valid
         try:
-            stmt: Select = Select(models.GovtIdType).where(models.GovtIdType.name == payload.booking.government_id_type)
-            result: list[models.GovtIdType]|None = self.db.execute(stmt).fetchone()
-            if result == None:
+            govt_id_type_id: int|None = lookup_cache.govt_id_types.get_id(self.db, payload.booking.government_id_type)
+            if govt_id_type_id == None:
                 raise ValueError(f"{payload.booking.government_id_type} is not a valid government ID type.")
+            # The image is uploaded first, and the booking references it by its key
+            if payload.booking.govt_id_image is not None and not blob_store.exists(payload.booking.govt_id_image):
+                raise ValueError("The government ID image doesn't exist. Upload it before the booking.")
             # Check if the govt_id_expiry_date is ahead of the booking_start date
             govt_id_expiry_date: date | None = payload.booking.exp_date
             # The government ID should have at least 6 months validity on checkout date
             if govt_id_expiry_date == None:
-                return result[0].id
+                return govt_id_type_id
             if govt_id_expiry_date < payload.booking.checkout + timedelta(days=180):
                 raise ValueError("The government ID should have at least 6 months validity on checkout date.")
-            return result[0].id
+            return govt_id_type_id
         except Exception as e:
             traceback.print_exc()
             match e.__class__.__name__:
@@ -1308,13 +1714,14 @@ class Booking:
         '''
         try:
             # Check if the supplied govt_id_type is available in DB. If yes, raise ValueError
-            stmt: Select = Select(models.GovtIdType).where(models.GovtIdType.name == payload.name)
-            result: Row|None = self.db.execute(stmt).fetchone()
-            if result:
+            if lookup_cache.govt_id_types.get_id(self.db, payload.name) is not None:
                 raise ValueError(f"GovtIdType: {payload.name} exists in the database.")
             stmt: Insert =  Insert(models.GovtIdType).values(name=payload.name)
             self.db.execute(stmt)
             self.db.commit()
+            # The government ID types have changed. Reload them on the next lookup.
+            lookup_cache.govt_id_types.invalidate()
+            resource_versions.bump(versions.GOVT_ID_TYPES)
             return {"msg":"Success"}
         except Exception as e:
             traceback.print_exc()
@@ -1342,11 +1749,14 @@ class Booking:
                 raise ValueError("The checkin date is in the future.")
             if result.Booking.checkin < datetime.now().date():
                 raise ValueError("The checkin date is in the past.")
+            ongoing_status_id: int = lookup_cache.booking_statuses.get_id(self.db, "Ongoing")
             stmt: Update = Update(models.Booking) \
                             .where(models.Booking.booking_id == booking_id) \
-                            .values(booking_status_id=3)
+                            .values(booking_status_id=ongoing_status_id)
             self.db.execute(stmt)
             self.db.commit()
+            availability_index.set_booking(booking_id, result.Booking.room_id, result.Booking.checkin, result.Booking.checkout)
+            resource_versions.bump(versions.BOOKINGS)
             return {"msg":"Success"}
         except Exception as e:
             traceback.print_exc()
@@ -1368,12 +1778,11 @@ class Booking:
             cloudbeds_exceptions.DBError: If a database operation fails.
         """
         try:
-            stmt: Select = Select(models.GovtIdType.name)
-            result: List[Row]|None = self.db.execute(stmt).fetchall()
-            if result == None:
+            result: list[str] = lookup_cache.govt_id_types.names(self.db)
+            if result == []:
                 raise ValueError("No supported government ID types found in the database.")
             
-            supported_ID_types: list[schemas.GovtIdTypeBase] = [schemas.GovtIdTypeBase(name=row.name) for row in result]
+            supported_ID_types: list[schemas.GovtIdTypeBase] = [schemas.GovtIdTypeBase(name=name) for name in result]
             return supported_ID_types
         except Exception as e:
             traceback.print_exc()
@@ -1384,92 +1793,269 @@ class Booking:
                     raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
 
     def add_booking(self, payload: schemas.BookingIn) -> schemas.BookingResult:
-        
+        """
+        Creates a booking, and its customer if the customer doesn't exist, in one transaction with one commit.
+        The government ID type, the room and the booking statuses come from the in-memory caches, and the employee,
+        the customer and the conflicting bookings are checked together in one query.
+
+        Args:
+            payload (schemas.BookingIn): The booking and its customer.
+
+        Returns:
+            schemas.BookingResult: The booking ID.
+
+        Raises:
+            ValueError: If the booking is invalid, the room isn't available, or the employee is invalid or inactive.
+            cloudbeds_exceptions.DBError: If the database operation fails.
+        """
         try:
             # Validate the booking dates
             self.__validate_booking_dates(payload)
             # Validate the government ID
             govt_id_type: int = self.__validate_govt_id(payload)
             # Check if the room is available for booking
-            room_id: int = self.__check_room_availability(payload)
-            
-            # If customer exists in DB, get the customer_ID, else create customer
-            cust_id: int|None = self.__get_customer_id(payload.customer.customer_details.phone, payload.customer.customer_details.email)
-
-            if cust_id:
-                # Check if the provided customer address available in DB. If not, add it.
+            room_id: int|None = availability_index.get_room_id(self.db, payload.booking.room_num)
+            if room_id == None:
+                raise ValueError(f"Room {payload.booking.room_num} doesn't exist in the database.")
+            # Lock the room until the booking is committed, so that another booking of the room can't pass the checks in between
+            with room_locks.hold(self.db, [room_id]):
+                if not availability_index.is_available(self.db, room_id, payload.booking.checkin, payload.booking.checkout):
+                    raise ValueError("The room is not available for booking.")
+
+                # Verify the employee, find the customer by phone or email and check the room against the Bookings table in one query
+                details: schemas.CustomerBase = payload.customer.customer_details
+                stmt: Select = Select(
+                    Select(models.Employee.is_active).where(models.Employee.emp_id == payload.booking.emp_id).scalar_subquery().label("is_active"),
+                    Select(models.Customer.customer_id).where(models.Customer.phone == details.phone).scalar_subquery().label("customer_by_phone"),
+                    Select(models.Customer.customer_id).where(models.Customer.email == details.email).scalar_subquery().label("customer_by_email"),
+                    self.__room_conflicts(room_id, payload.booking.checkin, payload.booking.checkout).exists().label("conflict"),
+                )
+                checks: Row = self.db.execute(stmt).one()
+                if checks.is_active == None:
+                    raise ValueError("Invalid employee ID.")
+                # Check is the employee is active
+                if checks.is_active == False:
+                    raise ValueError("The employee is not active.")
+                if checks.conflict:
+                    # The index missed a booking written elsewhere. Rebuild it on the next lookup.
+                    availability_index.invalidate()
+                    raise ValueError("The room is not available for booking.")
+
+                # Allocate the booking ID before writing. It is usually handed out from memory.
+                booking_id: str = booking_id_allocator.allocate(self.db.get_bind())[0]
+
+                # If customer exists in DB, use the customer_ID, else add the customer in this transaction
                 # [FIXME]: Implement support for multiple customer addresses
-                pass
-
-            if cust_id == None:
-                # Customer doesn't exist in DB. Let's add the customer to DB.
-                customer: Customer = Customer(self.db)
-                result: schemas.CreateCustomerResult = customer.add_customer(payload.customer)
-                cust_id = result.customer_id  
-
-            # Verify employee_id
-            employee: schemas.EmployeeOut|None = get_employee(payload.booking.emp_id,db=self.db)
-            if employee == None:
-                raise ValueError("Invalid employee ID.")
-            
-            # Check is the employee is active
-            if employee.emp_details.is_active == False:
-                raise ValueError("The employee is not active.")
-            
-            # Create booking in DB
-            # booking_id is added through a trigger
-            # If the booking was created successfully, set the booking_status == 2 (Confirmed)
-            stmt: Insert = Insert(models.Booking) \
-                            .values(customer_id= cust_id,   
-                                    booked_on = payload.booking.booked_on,   
-                                    checkin = payload.booking.checkin,
-                                    checkout = payload.booking.checkout,
-                                    govt_id_type_id = govt_id_type,
-                                    govt_id_num = payload.booking.government_id_number,
-                                    exp_date = payload.booking.exp_date,
-                                    govt_id_img = payload.booking.govt_id_image,
-                                    room_id = room_id,
-                                    comments = payload.booking.comments,
-                                    emp_id = payload.booking.emp_id
-                                    )
-            
-            booking_result: ResultProxy = self.db.execute(stmt)
-            # Retrieve the booking_id by refreshing the booking object
-            id: int = booking_result.inserted_primary_key[0]
-            self.db.commit()
-
-            # Update the status of the Booking to Booked    
-            booking_statuses: list[Row] = self.__get_supported_booking_statuses_with_id()
-            booked_status_id: int = [row.BookingStatus.id for row in booking_statuses if row.BookingStatus.name.lower() == "booked"][0]
-            
-            stmt: Update = Update(models.Booking) \
-                            .where(models.Booking.id == id) \
-                            .values(booking_status_id=booked_status_id)
-            self.db.execute(stmt)
-            self.db.commit()
+                cust_id: int|None = checks.customer_by_phone or checks.customer_by_email
+                new_customer: bool = cust_id == None
+                if new_customer:
+                    cust_id = Customer(self.db)._insert_customer(payload.customer)
+
+                # Create booking in DB with its final status
+                booked_status_id: int = lookup_cache.booking_statuses.get_id(self.db, "Booked")
+                stmt: Insert = Insert(models.Booking) \
+                                .values(booking_id = booking_id,
+                                        customer_id= cust_id,   
+                                        booked_on = payload.booking.booked_on,   
+                                        checkin = payload.booking.checkin,
+                                        checkout = payload.booking.checkout,
+                                        booking_status_id = booked_status_id,
+                                        govt_id_type_id = govt_id_type,
+                                        govt_id_num = payload.booking.government_id_number,
+                                        exp_date = payload.booking.exp_date,
+                                        govt_id_img_key = payload.booking.govt_id_image,
+                                        room_id = room_id,
+                                        comments = payload.booking.comments,
+                                        emp_id = payload.booking.emp_id
+                                        )
+                self.db.execute(stmt)
+                self.db.commit()
 
-            # Use the id (primary key) to fetch the booking_id
-            stmt: Select = Select(models.Booking).where(models.Booking.id == id)
-            result: list[models.Booking] = self.db.execute(stmt).fetchone()
-            booking_id: int = result[0].booking_id
+                availability_index.set_booking(booking_id, room_id, payload.booking.checkin, payload.booking.checkout)
+                if new_customer:
+                    customer_search.set(cust_id, payload.customer.customer_details.model_dump())
+            # The booking may have added its customer
+            resource_versions.bump(versions.BOOKINGS, versions.CUSTOMERS)
             booking_result: schemas.BookingResult = schemas.BookingResult(booking_id=booking_id, msg="Success")  
             return booking_result
         except Exception as e:
+            self.db.rollback()
+            traceback.print_exc()
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise ValueError(e)
+                case "ServiceBusy":
+                    raise
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
+    def add_bookings(self, payload: schemas.BulkBookingIn) -> schemas.BulkBookingResult:
+        """
+        Creates many bookings, for one customer or many, in a single transaction.
+        The employees, the existing customers and the bookings that may conflict are each fetched with one query,
+        and the new customers, their addresses and the bookings are added with multi-row inserts.
+
+        Args:
+            payload (schemas.BulkBookingIn): The bookings and the commit mode.
+
+        Returns:
+            schemas.BulkBookingResult: The booking ID or the error of each booking, in the order of the payload.
+
+        Raises:
+            ValueError: 
+                *   If there are no bookings or more than BULK_BOOKING_MAX_ITEMS.
+                *   If a booking is invalid and payload.partial is False. Nothing is written in that case.
+            cloudbeds_exceptions.DBError: If the database operation fails.
+        """
+        try:
+            items: list[schemas.BookingIn] = payload.bookings
+            if items == [] or len(items) > BULK_BOOKING_MAX_ITEMS:
+                raise ValueError(f"Specify between 1 and {BULK_BOOKING_MAX_ITEMS} bookings.")
+            # Index of the booking -> error message
+            errors: dict[int, str] = {}
+            room_ids: dict[int, int] = {}
+            govt_id_type_ids: dict[int, int] = {}
+
+            # Validate the dates, the government IDs and the rooms. These only use the in-memory lookups.
+            for i, item in enumerate(items):
+                try:
+                    self.__validate_booking_dates(item)
+                    govt_id_type_ids[i] = self.__validate_govt_id(item)
+                    room_id: int|None = availability_index.get_room_id(self.db, item.booking.room_num)
+                    if room_id == None:
+                        raise ValueError(f"Room {item.booking.room_num} doesn't exist in the database.")
+                    room_ids[i] = room_id
+                except ValueError as e:
+                    errors[i] = str(e)
+
+            # Lock the rooms of the batch until the bookings are committed
+            with room_locks.hold(self.db, room_ids.values()):
+                # Verify the employees
+                stmt: Select = Select(models.Employee.emp_id, models.Employee.is_active) \
+                                .where(models.Employee.emp_id.in_({item.booking.emp_id for item in items}))
+                employees: dict[int, bool] = {row.emp_id: row.is_active for row in self.db.execute(stmt)}
+                for i, item in enumerate(items):
+                    if i in errors:
+                        continue
+                    if item.booking.emp_id not in employees:
+                        errors[i] = "Invalid employee ID."
+                    elif employees[item.booking.emp_id] == False:
+                        errors[i] = "The employee is not active."
+
+                # Check the availability of all rooms against the active bookings in the window of the batch.
+                # Accepted bookings are added to the intervals, so that the bookings of the batch can't overlap each other either.
+                valid: list[int] = [i for i in range(len(items)) if i not in errors]
+                booked: dict[int, RoomIntervals] = {}
+                if valid:
+                    active_status_ids: list[int] = [lookup_cache.booking_statuses.get_id(self.db, name) for name in ACTIVE_BOOKING_STATUSES]
+                    stmt: Select = Select(models.Booking.booking_id, models.Booking.room_id, models.Booking.checkin, models.Booking.checkout) \
+                                    .where(models.Booking.room_id.in_({room_ids[i] for i in valid})) \
+                                    .where(models.Booking.checkin < max(items[i].booking.checkout for i in valid)) \
+                                    .where(models.Booking.checkout > min(items[i].booking.checkin for i in valid)) \
+                                    .where(models.Booking.booking_status_id.in_(active_status_ids))
+                    for row in self.db.execute(stmt):
+                        booked.setdefault(row.room_id, RoomIntervals()).add(row.checkin, row.checkout, row.booking_id)
+                for i in valid:
+                    intervals: RoomIntervals = booked.setdefault(room_ids[i], RoomIntervals())
+                    if intervals.overlaps(items[i].booking.checkin, items[i].booking.checkout):
+                        errors[i] = "The room is not available for booking."
+                    else:
+                        intervals.add(items[i].booking.checkin, items[i].booking.checkout, f"#{i}")
+
+                if errors and payload.partial == False:
+                    raise ValueError("; ".join(f"Booking {i}: {error}" for i, error in sorted(errors.items())))
+                valid = [i for i in valid if i not in errors]
+
+                booking_ids: dict[int, str] = {}
+                if valid:
+                    # Allocate the booking IDs before writing
+                    booking_ids = dict(zip(valid, booking_id_allocator.allocate(self.db.get_bind(), len(valid))))
+
+                    # Resolve the customers by phone, then by email. A customer new to the database is added once per batch.
+                    stmt: Select = Select(models.Customer.customer_id, models.Customer.phone, models.Customer.email) \
+                                    .where(or_(models.Customer.phone.in_({items[i].customer.customer_details.phone for i in valid}),
+                                               models.Customer.email.in_({items[i].customer.customer_details.email for i in valid})))
+                    customers_by_phone: dict[str, int] = {}
+                    customers_by_email: dict[str, int] = {}
+                    for row in self.db.execute(stmt):
+                        customers_by_phone[row.phone] = row.customer_id
+                        customers_by_email[row.email] = row.customer_id
+                    # phone -> customer, and email -> phone of the customers to add
+                    new_customers: dict[str, schemas.CustomerIn] = {}
+                    new_customer_phones: dict[str, str] = {}
+                    for i in valid:
+                        details: schemas.CustomerBase = items[i].customer.customer_details
+                        if details.phone in customers_by_phone or details.email in customers_by_email:
+                            continue
+                        if details.phone not in new_customers and details.email not in new_customer_phones:
+                            new_customers[details.phone] = items[i].customer
+                            new_customer_phones[details.email] = details.phone
+                    if new_customers:
+                        self.db.execute(Insert(models.Customer), [customer.customer_details.model_dump() for customer in new_customers.values()])
+                        stmt: Select = Select(models.Customer.customer_id, models.Customer.phone, models.Customer.email) \
+                                        .where(models.Customer.phone.in_(new_customers))
+                        for row in self.db.execute(stmt):
+                            customers_by_phone[row.phone] = row.customer_id
+                            customers_by_email[row.email] = row.customer_id
+                        self.db.execute(Insert(models.CustomerAddress),
+                                        [{**customer.customer_address.model_dump(), "customer_id": customers_by_phone[phone]} for phone, customer in new_customers.items()])
+
+                    # Create the bookings with their final status
+                    booked_status_id: int = lookup_cache.booking_statuses.get_id(self.db, "Booked")
+                    rows: list[dict] = []
+                    for i in valid:
+                        booking: schemas.BookingBase = items[i].booking
+                        details: schemas.CustomerBase = items[i].customer.customer_details
+                        rows.append(dict(booking_id = booking_ids[i],
+                                         customer_id = customers_by_phone.get(details.phone, customers_by_email.get(details.email)),
+                                         booked_on = booking.booked_on,
+                                         checkin = booking.checkin,
+                                         checkout = booking.checkout,
+                                         booking_status_id = booked_status_id,
+                                         govt_id_type_id = govt_id_type_ids[i],
+                                         govt_id_num = booking.government_id_number,
+                                         exp_date = booking.exp_date,
+                                         govt_id_img_key = booking.govt_id_image,
+                                         room_id = room_ids[i],
+                                         comments = booking.comments,
+                                         emp_id = booking.emp_id))
+                    self.db.execute(Insert(models.Booking), rows)
+                    self.db.commit()
+                    for i in valid:
+                        availability_index.set_booking(booking_ids[i], room_ids[i], items[i].booking.checkin, items[i].booking.checkout)
+                    for phone, customer in new_customers.items():
+                        customer_search.set(customers_by_phone[phone], customer.customer_details.model_dump())
+                    resource_versions.bump(versions.BOOKINGS, versions.CUSTOMERS)
+                else:
+                    # Nothing to write. End the transaction, which releases the row locks.
+                    self.db.rollback()
+
+            results: list[schemas.BulkBookingItemResult] = [
+                schemas.BulkBookingItemResult(index=i, booking_id=booking_ids.get(i), error=errors.get(i)) for i in range(len(items))
+            ]
+            msg: str = "Success" if errors == {} else "Partial success" if valid else "Failed"
+            return schemas.BulkBookingResult(msg=msg, results=results)
+        except Exception as e:
+            self.db.rollback()
             traceback.print_exc()
             match e.__class__.__name__:
                 case "ValueError":
                     raise ValueError(e)
+                case "ServiceBusy":
+                    raise
                 case _:
                     raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
 
-    def list_bookings(self, skip: int, limit: int, booking_id: int|None = None) -> List[schemas.BookingOut]:
+    def list_bookings(self, skip: int, limit: int, booking_id: int|None = None, cursor: str|None = None) -> List[schemas.BookingOut]:
         """
-        Retrieves a list of bookings from the database.
+        Retrieves a list of bookings from the database, ordered by the checkin date.
+        The cursor of the next page is stored in self.next_cursor.
 
         Args:
             skip (int): The number of records to skip.
             limit (int): The maximum number of records to return.
             booking_id (int, optional): The booking ID to filter by. Defaults to None.
+            cursor (str, optional): Cursor returned with the previous page. If specified, skip is ignored.
 
         Returns:
             List[schemas.BookingOut]: A list of bookings.
@@ -1478,26 +2064,46 @@ class Booking:
             ValueError: If the booking ID doesn't exist in the database.
             cloudbeds_exceptions.DBError: If the database operation fails.
         """
+        # Decode the cursor outside the try block so that an invalid cursor is reported as a ValueError
+        after: tuple|None = pagination.decode_cursor(cursor, date, int) if cursor else None
         try:
-            # Get the list of bookings
+            # Get the list of bookings.
+            # The related rows are eager-loaded so that a page of any size costs two queries:
+            # one for the bookings joined with their customer, status, ID type and room,
+            # and one for the addresses of the customers on the page.
+            stmt: Select = Select(models.Booking).options(
+                joinedload(models.Booking.customer).selectinload(models.Customer.addresses),
+                joinedload(models.Booking.booking_status),
+                joinedload(models.Booking.govt_id_type),
+                joinedload(models.Booking.room)
+            )
             if booking_id:
-                stmt: Select = Select(models.Booking).where(models.Booking.booking_id == booking_id)
+                stmt = stmt.where(models.Booking.booking_id == booking_id)
             else:
-                stmt: Select = Select(models.Booking).limit(limit).offset(skip)
+                # Page through the bookings by (checkin, id) so that a page can resume from a cursor
+                sort_key: list = [models.Booking.checkin, models.Booking.id]
+                stmt = stmt.order_by(*sort_key).limit(limit)
+                if after:
+                    stmt = stmt.where(pagination.keyset_filter(sort_key, after))
+                else:
+                    stmt = stmt.offset(skip)
             
-            result: List[Row] = self.db.execute(stmt).fetchall()
+            result: List[models.Booking] = self.db.execute(stmt).unique().scalars().all()
             
             if result == None:
                 raise ValueError("No bookings found in the database.")
 
+            # A full page means that there might be more records after it
+            if not booking_id and limit and len(result) == limit:
+                self.next_cursor = pagination.encode_cursor(result[-1].checkin, result[-1].id)
+
             # Build the BookingOut payload
-            cb_booking: Row
+            cb_booking: models.Booking
             bookings: list[schemas.BookingOut] = []
             for cb_booking in result:
-                customer: schemas.CustomerOut = self.__build_customer_out_payload(cb_booking)
-                booking_data: schemas.BookingBase = self.__build_booking_base_payload(cb_booking.Booking)
-                booking_id = cb_booking.Booking.booking_id
-                bookings.append(schemas.BookingOut(booking_id=booking_id, customer=customer, booking=booking_data))
+                customer: schemas.CustomerOut = self.__build_customer_out_payload(cb_booking.customer)
+                booking_data: schemas.BookingBase = self.__build_booking_base_payload(cb_booking)
+                bookings.append(schemas.BookingOut(booking_id=cb_booking.booking_id, customer=customer, booking=booking_data))
 
             return bookings
 
@@ -1509,6 +2115,152 @@ class Booking:
                 case _:
                     raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")            
 
+    def get_occupancy(self, start: date, days: int) -> schemas.Occupancy:
+        """
+        Returns the booking status of every room for each night of the window, computed with NumPy over the booking intervals.
+        Cancelled bookings are left out. If bookings of a room overlap, the most recently created one is shown.
+
+        Args:
+            start (date): The first night of the window.
+            days (int): The number of nights in the window.
+
+        Returns:
+            schemas.Occupancy: One run-length encoded row of status ids per room, ordered by room number.
+
+        Raises:
+            ValueError: If days is out of range.
+            cloudbeds_exceptions.DBError: If the database operation fails.
+        """
+        try:
+            if days < 1 or days > occupancy.OCCUPANCY_MAX_DAYS:
+                raise ValueError(f"days should be between 1 and {occupancy.OCCUPANCY_MAX_DAYS}.")
+            end: date = start + timedelta(days=days)
+            stmt: Select = Select(models.Room.room_id, models.Room.room_number).order_by(models.Room.room_id)
+            rooms: list[Row] = self.db.execute(stmt).fetchall()
+            cancelled_status_id: int = lookup_cache.booking_statuses.get_id(self.db, "Cancelled")
+            stmt: Select = Select(models.Booking.id, models.Booking.room_id, models.Booking.checkin, models.Booking.checkout, models.Booking.booking_status_id) \
+                            .where(models.Booking.checkin < end) \
+                            .where(models.Booking.checkout > start) \
+                            .where(models.Booking.booking_status_id != cancelled_status_id)
+            # Later bookings win in the grid. The window holds few rows, so they are sorted here rather than with ORDER BY id,
+            # which would make the database scan the table in id order instead of reading the window from idx_bk_checkout.
+            bookings: list[Row] = sorted(self.db.execute(stmt).fetchall(), key=lambda row: row.id)
+
+            # Load the columns into arrays; the grid is then built without looping over the bookings
+            room_ids: np.ndarray = np.array([row.room_id for row in rooms], dtype=np.int64)
+            room_numbers: np.ndarray = np.array([row.room_number for row in rooms], dtype=np.int64)
+            grid: np.ndarray = occupancy.build_grid(room_ids,
+                                                    np.array([row.room_id for row in bookings], dtype=np.int64),
+                                                    np.array([row.checkin for row in bookings], dtype="datetime64[D]"),
+                                                    np.array([row.checkout for row in bookings], dtype="datetime64[D]"),
+                                                    np.array([row.booking_status_id for row in bookings], dtype=np.int16),
+                                                    start, days)
+            order: np.ndarray = np.argsort(room_numbers, kind="stable")
+            runs: list[list[int]] = occupancy.run_length_encode(grid[order])
+            status_names: dict[int, str] = {int(status_id): lookup_cache.booking_statuses.get_name(self.db, int(status_id)) for status_id in np.unique(grid)}
+            status_names.pop(occupancy.FREE, None)
+            return schemas.Occupancy(start=start, days=days,
+                                     statuses={occupancy.FREE: "Free", **status_names},
+                                     rooms=[schemas.RoomOccupancy(room_number=room_number, runs=room_runs)
+                                            for room_number, room_runs in zip(room_numbers[order].tolist(), runs)])
+        except Exception as e:
+            traceback.print_exc()
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise ValueError(e)
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
+    # Columns of the booking export, in CSV column order. The government ID image is never exported.
+    EXPORT_COLUMNS: tuple = (
+        models.Booking.booking_id,
+        models.Booking.booked_on,
+        models.Booking.checkin,
+        models.Booking.checkout,
+        models.BookingStatus.name.label("status"),
+        models.Room.room_number,
+        models.RoomType.room_type,
+        models.Booking.customer_id,
+        models.Customer.first_name,
+        models.Customer.middle_name,
+        models.Customer.last_name,
+        models.Customer.email,
+        models.Customer.phone,
+        models.GovtIdType.name.label("government_id_type"),
+        models.Booking.govt_id_num.label("government_id_number"),
+        models.Booking.exp_date,
+        models.Booking.comments,
+        models.Booking.emp_id,
+    )
+    EXPORT_FORMATS: dict[str, str] = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+    def export_bookings(self, format: str = "ndjson", checkin_from: date|None = None, checkin_to: date|None = None, status: str|None = None) -> Iterator[str]:
+        """
+        Returns the bookings, ordered by the checkin date, as an iterator of NDJSON or CSV text chunks.
+        The filters are checked before the iterator is returned. The rows are then read from a server-side cursor,
+        EXPORT_BATCH_SIZE at a time, and only the current batch is held in memory.
+
+        Args:
+            format (str): ndjson (one JSON object per line) or csv (with a header row).
+            checkin_from (date, optional): Only export the bookings that check in on or after this date.
+            checkin_to (date, optional): Only export the bookings that check in on or before this date.
+            status (str, optional): Only export the bookings with this status.
+
+        Returns:
+            Iterator[str]: The text chunks. Keep the session open until the iterator is exhausted.
+
+        Raises:
+            ValueError: If the format or the status is invalid.
+            cloudbeds_exceptions.DBError: If the database operation fails.
+        """
+        try:
+            if format not in self.EXPORT_FORMATS:
+                raise ValueError(f"Invalid format: {format}. Specify one of: {', '.join(self.EXPORT_FORMATS)}.")
+            stmt: Select = Select(*self.EXPORT_COLUMNS) \
+                            .join(models.Customer, models.Booking.customer_id == models.Customer.customer_id) \
+                            .join(models.BookingStatus, models.Booking.booking_status_id == models.BookingStatus.id) \
+                            .join(models.GovtIdType, models.Booking.govt_id_type_id == models.GovtIdType.id) \
+                            .outerjoin(models.Room, models.Booking.room_id == models.Room.room_id) \
+                            .outerjoin(models.RoomType, models.Room.r_type_id == models.RoomType.id) \
+                            .order_by(models.Booking.checkin, models.Booking.id) \
+                            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            if checkin_from:
+                stmt = stmt.where(models.Booking.checkin >= checkin_from)
+            if checkin_to:
+                stmt = stmt.where(models.Booking.checkin <= checkin_to)
+            if status:
+                status_id: int|None = lookup_cache.booking_statuses.get_id(self.db, status)
+                if status_id == None:
+                    raise ValueError(f"Invalid status: {status}")
+                stmt = stmt.where(models.Booking.booking_status_id == status_id)
+            return self.__stream_export(stmt, format)
+        except Exception as e:
+            traceback.print_exc()
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise ValueError(e)
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
+    def __stream_export(self, stmt: Select, format: str) -> Iterator[str]:
+        '''Executes the export statement and yields one text chunk per batch of rows.'''
+        columns: list[str] = [column.name for column in self.EXPORT_COLUMNS]
+        buffer: io.StringIO = io.StringIO()
+        writer = csv.writer(buffer)
+        if format == "csv":
+            writer.writerow(columns)
+            yield buffer.getvalue()
+        for rows in self.db.execute(stmt).partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            if format == "csv":
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(dict(zip(columns, row)), default=lambda value: value.isoformat()))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+
     def update_booking(self, booking_id: str, payload: schemas.BookingIn) -> schemas.GenericMessage:
         """
         Updates a booking in the database.
@@ -1527,52 +2279,85 @@ class Booking:
             cloudbeds_exceptions.DBError: If the database operation fails.
         """
         try:
-            # Check if the booking exists in the DB.
-            stmt: Select = Select(models.Booking).where(models.Booking.booking_id == booking_id)
-            result: Row|None = self.db.execute(stmt).fetchone()
-            if result == None:
-                raise ValueError("Booking doesn't exist in the database.")
-
             # Validate the booking dates
             self.__validate_booking_dates(payload)
             # Validate the government ID
             govt_id_type: int = self.__validate_govt_id(payload)
-            # Check if the room is available for booking
-            room_id: int = self.__check_room_availability(payload)
+            room_id: int|None = availability_index.get_room_id(self.db, payload.booking.room_num)
+            if room_id == None:
+                raise ValueError(f"Room {payload.booking.room_num} doesn't exist in the database.")
+
+            # Lock the room until the booking is committed, so that another booking of the room can't pass the checks in between
+            with room_locks.hold(self.db, [room_id]):
+                # Check if the booking exists in the DB.
+                stmt: Select = Select(models.Booking).where(models.Booking.booking_id == booking_id)
+                result: Row|None = self.db.execute(stmt).fetchone()
+                if result == None:
+                    raise ValueError("Booking doesn't exist in the database.")
+
+                # Check if the room is available for booking. The booking doesn't conflict with itself.
+                room_id = self.__check_room_availability(payload, exclude_booking_id=booking_id)
             
-            # If customer exists in DB, get the customer_ID, else create customer
-            cust_id: int|None = self.__get_customer_id(payload.customer.customer_details.phone, payload.customer.customer_details.email)
+                # If customer exists in DB, get the customer_ID, else create customer
+                cust_id: int|None = self.__get_customer_id(payload.customer.customer_details.phone, payload.customer.customer_details.email)
 
-            # Verify employee_id
-            employee: schemas.EmployeeOut|None = get_employee(payload.booking.emp_id,db=self.db)
-            if employee == None:
-                raise ValueError("Invalid employee ID.")
+                # Verify employee_id
+                employee: schemas.EmployeeOut|None = get_employee(payload.booking.emp_id,db=self.db)
+                if employee == None:
+                    raise ValueError("Invalid employee ID.")
             
-            # Check is the employee is active
-            if employee.emp_details.is_active == False:
-                raise ValueError("The employee is not active.")
+                # Check is the employee is active
+                if employee.emp_details.is_active == False:
+                    raise ValueError("The employee is not active.")
             
-            # Update booking in DB
-            stmt: Update = Update(models.Booking) \
-                            .where(models.Booking.booking_id == booking_id) \
-                            .values(customer_id= cust_id,
-                                    booked_on = payload.booking.booked_on,   
-                                    checkin = payload.booking.checkin,
-                                    checkout = payload.booking.checkout,
-                                    govt_id_type_id = govt_id_type,
-                                    govt_id_num = payload.booking.government_id_number,
-                                    exp_date = payload.booking.exp_date,
-                                    govt_id_img = payload.booking.govt_id_image,
-                                    room_id = room_id,
-                                    comments = payload.booking.comments,
-                                    emp_id = payload.booking.emp_id
-                                    )
+                # Update booking in DB
+                stmt: Update = Update(models.Booking) \
+                                .where(models.Booking.booking_id == booking_id) \
+                                .values(customer_id= cust_id,
+                                        booked_on = payload.booking.booked_on,   
+                                        checkin = payload.booking.checkin,
+                                        checkout = payload.booking.checkout,
+                                        govt_id_type_id = govt_id_type,
+                                        govt_id_num = payload.booking.government_id_number,
+                                        exp_date = payload.booking.exp_date,
+                                        govt_id_img_key = payload.booking.govt_id_image,
+                                        room_id = room_id,
+                                        comments = payload.booking.comments,
+                                        emp_id = payload.booking.emp_id
+                                        )
                         
-            booking_result: ResultProxy = self.db.execute(stmt)
-            self.db.commit()
+                booking_result: ResultProxy = self.db.execute(stmt)
+                self.db.commit()
+                if lookup_cache.booking_statuses.get_name(self.db, result.Booking.booking_status_id) in ACTIVE_BOOKING_STATUSES:
+                    availability_index.set_booking(booking_id, room_id, payload.booking.checkin, payload.booking.checkout)
+            resource_versions.bump(versions.BOOKINGS)
             return {"msg":"Success"}
         except Exception as e:
+            self.db.rollback()
             traceback.print_exc()
+            match e.__class__.__name__:
+                case "ValueError":
+                    raise ValueError(e)
+                case "ServiceBusy":
+                    raise
+                case _:
+                    raise cloudbeds_exceptions.DBError(f"{e.__class__.__name__}:DB operation failed.")
+
+    def get_govt_id_image_key(self, booking_id: str) -> str|None:
+        """
+        Returns the blob store key of the government ID image of the booking, or None if the booking has no image.
+
+        Raises:
+            ValueError: If the booking doesn't exist in the database.
+            cloudbeds_exceptions.DBError: If the database operation fails.
+        """
+        try:
+            stmt: Select = Select(models.Booking.govt_id_img_key).where(models.Booking.booking_id == booking_id)
+            result: Row|None = self.db.execute(stmt).fetchone()
+            if result == None:
+                raise ValueError("Booking doesn't exist in the database.")
+            return result.govt_id_img_key
+        except Exception as e:
             match e.__class__.__name__:
                 case "ValueError":
                     raise ValueError(e)
@@ -1601,11 +2386,14 @@ class Booking:
                 raise ValueError("Booking doesn't exist in the database.") 
             
             # Update the booking status to cancelled
+            cancelled_status_id: int = lookup_cache.booking_statuses.get_id(self.db, "Cancelled")
             stmt: Update = Update(models.Booking) \
                             .where(models.Booking.booking_id == booking_id) \
-                            .values(booking_status_id = 5)             
+                            .values(booking_status_id = cancelled_status_id)             
             self.db.execute(stmt)
             self.db.commit()
+            availability_index.remove_booking(booking_id)
+            resource_versions.bump(versions.BOOKINGS)
             return {"msg":"Success"}
         except Exception as e:
             traceback.print_exc()
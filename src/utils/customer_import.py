@@ -0,0 +1,88 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import IO, Iterator
+from dotenv import load_dotenv
+
+# Load environmental variables from .env
+load_dotenv()
+# Number of rows validated, de-duplicated, inserted and committed together
+CUSTOMER_IMPORT_CHUNK_SIZE: int = int(os.getenv("CUSTOMER_IMPORT_CHUNK_SIZE", "1000"))
+# Maximum number of row errors listed in the import result. All of them are counted.
+CUSTOMER_IMPORT_MAX_ERRORS: int = int(os.getenv("CUSTOMER_IMPORT_MAX_ERRORS", "1000"))
+
+FORMATS: tuple[str, ...] = ("csv", "jsonl")
+# Columns of a CSV row, and of a flat JSONL row
+DETAIL_FIELDS: tuple[str, ...] = ("first_name", "middle_name", "last_name", "email", "phone")
+ADDRESS_FIELDS: tuple[str, ...] = ("first_line", "second_line", "landmark", "district", "state", "pin", "address_type")
+
+def detect_format(filename: str|None) -> str:
+    '''Returns the import format from the file extension: .csv is csv, .jsonl and .ndjson are jsonl.'''
+    extension: str = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Can't tell the format of {filename}. Specify one of: {', '.join(FORMATS)}.")
+
+def read_rows(stream: IO[str], format: str) -> Iterator[dict]:
+    '''
+    Yields the rows of the stream one at a time, so that memory doesn't grow with the size of the file.
+    A row that can't be parsed is yielded as {"error": message}, so that it is reported with its position.
+
+    Args:
+        * stream: (IO[str]) The text stream.
+        * format: (str) csv, with the DETAIL_FIELDS and ADDRESS_FIELDS columns, or jsonl, with one CustomerIn
+          or one flat object per line. Blank JSONL lines are skipped.
+    '''
+    if format == "csv":
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if key is not None}
+    elif format == "jsonl":
+        for line in stream:
+            if line.strip() == "":
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                row = {"error": f"Invalid JSON: {e}"}
+            yield row if isinstance(row, dict) else {"error": "Each line should be a JSON object."}
+    else:
+        raise ValueError(f"Unsupported format: {format}. Specify one of: {', '.join(FORMATS)}.")
+
+def to_customer_in(row: dict) -> dict:
+    '''Returns the CustomerIn fields of a flat row. Rows that are already in the CustomerIn shape are returned as they are.'''
+    if "customer_details" in row:
+        return row
+    # Empty CSV cells are missing values
+    values: dict = {key: (None if value == "" else value) for key, value in row.items()}
+    return {
+        "customer_details": {field: values.get(field) for field in DETAIL_FIELDS},
+        "customer_address": {field: values.get(field) for field in ADDRESS_FIELDS},
+    }
+
+def main() -> None:
+    '''Imports customers from a CSV or JSONL file: python -m utils.customer_import customers.csv'''
+    from .database import SessionLocal
+    from .crud import Customer
+
+    parser = argparse.ArgumentParser(description="Imports customers from a CSV or JSONL file.")
+    parser.add_argument("file", help="The file to import. Use - to read standard input.")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the format of the file extension.")
+    parser.add_argument("--chunk-size", type=int, default=CUSTOMER_IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    format: str = args.format or detect_format(args.file)
+    stream: IO[str] = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8-sig", newline="")
+    with stream, SessionLocal() as db:
+        result = Customer(db).import_customers(
+            read_rows(stream, format), args.chunk_size,
+            progress=lambda rows, imported: print(f"{rows} rows read, {imported} customers imported", file=sys.stderr))
+    for error in result.errors:
+        print(f"Row {error.index}: {error.error}", file=sys.stderr)
+    print(result.model_dump_json())
+
+if __name__ == "__main__":
+    main()
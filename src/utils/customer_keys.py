@@ -0,0 +1,45 @@
+import re
+
+# Kinds of customer keys. Each one is looked up through its own unique index.
+CUSTOMER_ID: str = "customer_id"
+PHONE: str = "phone"
+EMAIL: str = "email"
+
+# Characters that people type inside phone numbers. They are dropped, so that a phone is stored and looked up in one form.
+PHONE_SEPARATORS: re.Pattern = re.compile(r"[\s().-]")
+PHONE_PATTERN: re.Pattern = re.compile(r"^\+?\d+$")
+# Numbers with fewer digits are customer IDs. Longer ones can be a customer ID or a phone number, and are looked up as both.
+# A phone number with a + prefix is always a phone.
+PHONE_MIN_DIGITS: int = 7
+# Largest value of the customer_id column (a signed INT). Longer numbers can only be phone numbers.
+CUSTOMER_ID_MAX: int = 2**31 - 1
+
+def normalize_phone(phone: str) -> str:
+    '''Returns the phone number without separators, e.g. +91 (80) 1234-5678 -> +918012345678.'''
+    return PHONE_SEPARATORS.sub("", phone.strip())
+
+def classify(key: str|int) -> list[tuple[str, int|str]]:
+    '''
+    Returns the kinds that a customer key can be, each with its value in the stored form:
+    (CUSTOMER_ID, int), (PHONE, normalized phone number) or (EMAIL, lowercased email).
+    A number such as 1000000 can be both a customer ID and a phone number. The customer ID comes first,
+    so that it wins when the two match different customers.
+
+    Raises:
+        ValueError: If the key is none of them.
+    '''
+    if isinstance(key, int):
+        return [(CUSTOMER_ID, key)]
+    key = key.strip()
+    if "@" in key:
+        return [(EMAIL, key.lower())]
+    phone: str = normalize_phone(key)
+    if not PHONE_PATTERN.match(phone):
+        raise ValueError(f"{key} isn't a customer ID, a phone number or an email.")
+    if phone.startswith("+"):
+        return [(PHONE, phone)]
+    if len(phone) < PHONE_MIN_DIGITS:
+        return [(CUSTOMER_ID, int(phone))]
+    if int(phone) > CUSTOMER_ID_MAX:
+        return [(PHONE, phone)]
+    return [(CUSTOMER_ID, int(phone)), (PHONE, phone)]
@@ -1,19 +1,168 @@
 from dotenv import load_dotenv
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url, Engine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from .pool_metrics import PoolStats, instrumented_pool_class
+from .query_metrics import query_metrics
 
 # Load environmental variables from .env
 load_dotenv()
 
 #SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(os.getenv("DATABASE_URL"))
+# Set DB_BACKEND=sqlite to use the embedded SQLite database in SQLITE_PATH instead of a DATABASE_URL
+DB_BACKEND: str = os.getenv("DB_BACKEND", "").lower()
+# Database file of the embedded SQLite backend
+SQLITE_PATH: str = os.getenv("SQLITE_PATH", "cloudbeds.db")
+
+def database_url(url: str|None, backend: str, sqlite_path: str) -> str:
+    '''
+    Returns the URL of the database: url, which is required unless backend is "sqlite".
+    SQLite is only used when it is configured explicitly, through a sqlite:/// url or backend "sqlite".
+
+    Raises:
+        ValueError: url isn't set and backend isn't "sqlite", or url and backend name different backends.
+    '''
+    if backend not in ("", "mysql", "sqlite"):
+        raise ValueError(f"Invalid DB_BACKEND {backend}. Expected mysql or sqlite.")
+    if not url:
+        if backend == "sqlite":
+            return f"sqlite:///{sqlite_path}"
+        raise ValueError("DATABASE_URL isn't set. Set it to the MySQL URL, or set DB_BACKEND=sqlite to use the embedded SQLite database.")
+    if backend and make_url(url).get_backend_name() != backend:
+        raise ValueError(f"DATABASE_URL doesn't match DB_BACKEND={backend}.")
+    return url
+
+# mysql+pymysql://... for MySQL, or sqlite:///<path> for an embedded SQLite database
+DATABASE_URL: str = database_url(os.getenv("DATABASE_URL"), DB_BACKEND, SQLITE_PATH)
+
+# DB_MODE selects how the API endpoints talk to the database:
+# * sync (default): the crud classes use a Session and run in a worker thread.
+# * async: the crud classes use an AsyncSession on an asyncio driver, such as mysql+aiomysql.
+DB_MODE: str = os.getenv("DB_MODE", "sync").lower()
+
+# Connection pool settings. They apply to the MySQL engines; SQLite keeps the pool SQLAlchemy picks for it.
+# Connections per pool (and per worker process) that are kept open
+DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+# Connections that may be opened on top of DB_POOL_SIZE under load
+DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds a request waits for a connection before the checkout fails
+DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Test connections on checkout, so that connections closed by MySQL during idle periods are replaced
+DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Seconds after which a connection is replaced. Keep it below the MySQL wait_timeout.
+DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+
+# SQLite settings, applied to every connection of a SQLite engine.
+# WAL lets readers run alongside the single writer, and with synchronous=NORMAL a commit doesn't wait for an fsync
+# (a power loss can drop the last commits, but never corrupts the database). Set SQLITE_SYNCHRONOUS=FULL to keep them.
+SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+# Milliseconds a connection waits for the write lock held by another connection before the statement fails
+SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Page cache per connection, in KiB
+SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+# Bytes of the database file that are memory-mapped, so that reads don't copy pages through the page cache
+SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Pool statistics per engine, exposed on /admin/db_pool/stats/
+pool_stats: dict[str, PoolStats] = {}
+
+def is_sqlite_file(url: str) -> bool:
+    '''Returns True for the URL of a SQLite database file, False for MySQL and in-memory SQLite databases.'''
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+def sqlite_pragmas() -> list[str]:
+    '''Returns the PRAGMA statements that configure a SQLite connection.'''
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        "PRAGMA temp_store=MEMORY",
+        # Enforce the foreign keys, like MySQL does
+        "PRAGMA foreign_keys=ON",
+    ]
+
+def configure_sqlite(engine: Engine) -> None:
+    '''Applies sqlite_pragmas() to each new connection of the engine. Does nothing for the other backends.'''
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+        cursor.close()
+
+def engine_options(url: str, pool_class: type[QueuePool], stats: PoolStats) -> dict:
+    '''Returns the create_engine keyword arguments that configure and instrument the connection pool.'''
+    if is_sqlite_file(url):
+        # SQLite connections are cheap and local: no pre-ping or recycling. The API threads share the pooled connections.
+        return {
+            "poolclass": instrumented_pool_class(pool_class, stats),
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        }
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "poolclass": instrumented_pool_class(pool_class, stats),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+pool_stats["sync"] = PoolStats()
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, QueuePool, pool_stats["sync"]))
+pool_stats["sync"].listen(engine)
+query_metrics.listen(engine)
+configure_sqlite(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+if DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    # Defaults to DATABASE_URL with the PyMySQL driver replaced by aiomysql, or the SQLite driver by aiosqlite
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL.replace("+pymysql", "+aiomysql") if make_url(DATABASE_URL).get_backend_name() != "sqlite"
+                                        else make_url(DATABASE_URL).set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False))
+    pool_stats["async"] = PoolStats()
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, AsyncAdaptedQueuePool, pool_stats["async"]))
+    pool_stats["async"].listen(async_engine.sync_engine)
+    query_metrics.listen(async_engine.sync_engine)
+    configure_sqlite(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(autoflush=False, bind=async_engine)
+
+# Dependencies
+def get_sync_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+get_db = get_async_db if DB_MODE == "async" else get_sync_db
+
+def get_pool_stats() -> dict[str, dict]:
+    '''Returns the connection pool statistics of each engine.'''
+    engines: dict = {"sync": engine}
+    if DB_MODE == "async":
+        engines["async"] = async_engine.sync_engine
+    return {name: pool_stats[name].snapshot(db_engine.pool) for name, db_engine in engines.items()}
 
 # Authenticate user from the given email and password
-# Create a connection with the DB and try ro retrieve a user 
\ No newline at end of file
+# Create a connection with the DB and try ro retrieve a user
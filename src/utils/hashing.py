@@ -0,0 +1,66 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from . import cloudbeds_exceptions
+
+# Load environmental variables from .env
+load_dotenv()
+# bcrypt cost factor. Existing hashes with a different cost are rehashed on the next successful login.
+BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Number of threads that run bcrypt. bcrypt releases the GIL, so the threads hash in parallel.
+PASSWORD_HASHING_WORKERS: int = int(os.getenv("PASSWORD_HASHING_WORKERS", "4"))
+# Number of hashing requests that may wait for a thread. Requests beyond it are rejected with ServiceBusy.
+PASSWORD_HASHING_QUEUE_SIZE: int = int(os.getenv("PASSWORD_HASHING_QUEUE_SIZE", "32"))
+
+class PasswordHasher:
+    '''
+    Shared bcrypt service. Hashing and verification run in a bounded thread pool so that they never hold the event loop.
+    When the pool and its queue are full, the request fails fast with ServiceBusy instead of queueing indefinitely.
+    '''
+    def __init__(self, rounds: int, workers: int, queue_size: int):
+        # Pinning min_rounds and max_rounds to the configured cost makes passlib flag hashes with any other cost for an update
+        self.__context = CryptContext(schemes=["bcrypt"], deprecated="auto",
+                                      bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.__slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def __submit(self, fn: Callable, *args) -> Future:
+        '''Submits fn to the pool. Raises ServiceBusy if there is no free slot.'''
+        if not self.__slots.acquire(blocking=False):
+            raise cloudbeds_exceptions.ServiceBusy("The server is busy. Try again later.")
+        try:
+            future: Future = self.__executor.submit(fn, *args)
+        except Exception:
+            self.__slots.release()
+            raise
+        future.add_done_callback(lambda _: self.__slots.release())
+        return future
+
+    def __wait(self, future: Future):
+        '''
+        Waits for the result of a pool task from synchronous code.
+        Inside AsyncSession.run_sync, the wait is handed back to the event loop instead of blocking it.
+        '''
+        if in_greenlet():
+            return await_only(asyncio.wrap_future(future))
+        return future.result()
+
+    def hash(self, password: str) -> str:
+        '''Returns the bcrypt hash of the password.'''
+        return self.__wait(self.__submit(self.__context.hash, password))
+
+    def verify_and_update(self, password: str, password_hash: str) -> tuple[bool, str|None]:
+        '''
+        Verifies the password against the hash.
+
+        Returns:
+            tuple: (True if the password matches, the new hash if the stored hash uses an outdated cost or None)
+        '''
+        return self.__wait(self.__submit(self.__context.verify_and_update, password, password_hash))
+
+password_hasher: PasswordHasher = PasswordHasher(BCRYPT_ROUNDS, PASSWORD_HASHING_WORKERS, PASSWORD_HASHING_QUEUE_SIZE)
@@ -0,0 +1,68 @@
+import threading
+from sqlalchemy import select, Row
+from sqlalchemy.orm.session import Session
+from . import models
+
+class LookupTable:
+    '''
+    Process-wide name <-> ID cache of a small reference table, such as RoomTypes.
+    The table is read on first use and read again after the cache is invalidated.
+    Names are matched case-insensitively.
+    '''
+    def __init__(self, id_column, name_column):
+        self.__id_column = id_column
+        self.__name_column = name_column
+        self.__lock = threading.Lock()
+        # (lowercase name -> id, id -> name). None until the table is loaded.
+        self.__entries: tuple[dict[str, int], dict[int, str]]|None = None
+
+    def __load(self, db: Session) -> tuple[dict[str, int], dict[int, str]]:
+        '''Returns the cached entries. Reads the table if the cache is empty.'''
+        entries = self.__entries
+        if entries is not None:
+            return entries
+        with self.__lock:
+            if self.__entries is None:
+                stmt = select(self.__id_column, self.__name_column).order_by(self.__id_column)
+                result: list[Row] = db.execute(stmt).fetchall()
+                self.__entries = ({row[1].lower(): row[0] for row in result}, {row[0]: row[1] for row in result})
+            return self.__entries
+
+    def get_id(self, db: Session, name: str) -> int|None:
+        '''
+        Returns the ID of the specified name. If the name doesn't exist, it returns None.
+
+        Args:
+            * db: (Session) SQL alchemy session, used only if the table isn't cached.
+            * name: (str) The name to resolve.
+        '''
+        return self.__load(db)[0].get(name.lower())
+
+    def get_name(self, db: Session, id: int) -> str|None:
+        '''
+        Returns the name of the specified ID. If the ID doesn't exist, it returns None.
+
+        Args:
+            * db: (Session) SQL alchemy session, used only if the table isn't cached.
+            * id: (int) The ID to resolve.
+        '''
+        return self.__load(db)[1].get(id)
+
+    def names(self, db: Session) -> list[str]:
+        '''Returns all names in ID order.'''
+        return list(self.__load(db)[1].values())
+
+    def invalidate(self) -> None:
+        '''Empties the cache. The table is read again on the next lookup.'''
+        with self.__lock:
+            self.__entries = None
+
+room_types: LookupTable = LookupTable(models.RoomType.id, models.RoomType.room_type)
+room_states: LookupTable = LookupTable(models.RoomState.id, models.RoomState.room_state)
+booking_statuses: LookupTable = LookupTable(models.BookingStatus.id, models.BookingStatus.name)
+govt_id_types: LookupTable = LookupTable(models.GovtIdType.id, models.GovtIdType.name)
+
+def invalidate_all() -> None:
+    '''Empties the caches of all lookup tables.'''
+    for table in (room_types, room_states, booking_statuses, govt_id_types):
+        table.invalidate()
@@ -0,0 +1,271 @@
+import argparse
+import os
+import re
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable
+from dotenv import load_dotenv
+from sqlalchemy import insert, inspect, select, Engine
+from sqlalchemy.orm.session import Session
+from . import models
+
+# Load environmental variables from .env
+load_dotenv()
+# Directory of the migration files
+MIGRATIONS_PATH: str = os.getenv("MIGRATIONS_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "migrations"))
+
+# Migration files are named <version>_<name>.sql, e.g. 004_add_performance_indexes.sql
+FILE_PATTERN: re.Pattern = re.compile(r"^(\d+)_(\w+)\.sql$")
+# Tables that grow with the business. A full scan of one of them fails the check; the reference tables are small.
+LARGE_TABLES: set[str] = {"Bookings", "Customers", "CustomerAddresses", "Employees", "EmployeeAddresses"}
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    path: str
+
+    def statements(self) -> list[str]:
+        '''
+        Returns the statements of the file. Statements end with a semicolon at the end of a line,
+        and lines that start with -- are comments.
+        '''
+        with open(self.path) as file:
+            lines: list[str] = [line for line in file if not line.lstrip().startswith("--")]
+        statements: list[str] = re.split(r";[ \t]*(?:\n|$)", "".join(lines))
+        return [statement.strip() for statement in statements if statement.strip()]
+
+def load_migrations(path: str = MIGRATIONS_PATH) -> list[Migration]:
+    '''Returns the migrations of the directory, ordered by version. Raises ValueError if two files have the same version.'''
+    migrations: dict[int, Migration] = {}
+    for file_name in sorted(os.listdir(path)):
+        match: re.Match|None = FILE_PATTERN.match(file_name)
+        if match is None:
+            continue
+        version: int = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Migrations {migrations[version].name} and {file_name} have the same version.")
+        migrations[version] = Migration(version=version, name=file_name.removesuffix(".sql"), path=os.path.join(path, file_name))
+    return [migrations[version] for version in sorted(migrations)]
+
+def applied_versions(engine: Engine) -> set[int]:
+    '''Returns the versions recorded in SchemaVersion. Creates the table if it doesn't exist.'''
+    models.SchemaVersion.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as connection:
+        return set(connection.execute(select(models.SchemaVersion.version)).scalars())
+
+def pending_migrations(engine: Engine, migrations: list[Migration]) -> list[Migration]:
+    '''Returns the migrations that haven't been applied to the database.'''
+    applied: set[int] = applied_versions(engine)
+    return [migration for migration in migrations if migration.version not in applied]
+
+def record(engine: Engine, migrations: list[Migration]) -> None:
+    '''Records the migrations as applied.'''
+    with engine.begin() as connection:
+        connection.execute(models.SchemaVersion.__table__.insert(), [
+            {"version": migration.version, "name": migration.name, "applied_at": datetime.now()} for migration in migrations])
+
+def upgrade(engine: Engine, migrations: list[Migration], target: int|None = None, log: Callable[[str], None] = print) -> list[Migration]:
+    '''
+    Applies the pending migrations up to the target version, in order, and records each one once its statements succeed.
+    MySQL commits DDL statements as they run, so a migration that fails halfway isn't rolled back. Its version isn't recorded:
+    complete or revert the statements that ran, then upgrade again.
+
+    Args:
+        * engine: (Engine) The database to migrate.
+        * migrations: (list[Migration]) All the migrations, as returned by load_migrations().
+        * target: (int, optional) The last version to apply. Defaults to the latest.
+        * log: (Callable) Receives a line per migration applied.
+
+    Returns:
+        list[Migration]: The migrations applied.
+    '''
+    applied: list[Migration] = []
+    for migration in pending_migrations(engine, migrations):
+        if target is not None and migration.version > target:
+            break
+        with engine.begin() as connection:
+            for statement in migration.statements():
+                connection.exec_driver_sql(statement)
+        record(engine, [migration])
+        log(f"Applied {migration.name}")
+        applied.append(migration)
+    return applied
+
+def stamp(engine: Engine, migrations: list[Migration], target: int) -> list[Migration]:
+    '''
+    Records the pending migrations up to the target version as applied, without running them.
+    Use it for databases whose schema already includes them, such as databases created by models.Base.metadata.create_all.
+    '''
+    stamped: list[Migration] = [migration for migration in pending_migrations(engine, migrations) if migration.version <= target]
+    if stamped:
+        record(engine, stamped)
+    return stamped
+
+# Reference data of create-tables-1.sql, by model. The ids follow the order of the rows.
+SEED_DATA: list[tuple[type, list[dict]]] = [
+    (models.Role, [{"name": name, "permissions": "{}"} for name in ["Admin", "Front-desk", "Shift-manager"]]),
+    (models.BookingStatus, [{"name": name} for name in ["Unconfirmed", "Booked", "Ongoing", "Complete", "Cancelled"]]),
+    (models.GovtIdType, [{"name": name} for name in ["AADHAR", "PAN", "Voter ID", "Driving License", "Passport"]]),
+    (models.RoomType, [{"room_type": name} for name in ["Standard", "Delux", "Club", "Suite"]]),
+    (models.RoomState, [{"room_state": name} for name in ["Booked", "Available", "Maintenance"]]),
+    # The starting value of the booking IDs
+    (models.BookingIdGenerator, [{"last_booking_id": 1001}]),
+]
+
+def bootstrap(engine: Engine, migrations: list[Migration]|None = None, log: Callable[[str], None] = print) -> bool:
+    '''
+    Prepares the database for the API. An empty database gets the tables of models.py, the reference data of
+    create-tables-1.sql, and all the migrations recorded as applied, since the tables already have the latest schema.
+    A database that has tables only gets the missing ones, like models.Base.metadata.create_all.
+    With SQLite, it all runs in one write transaction, so that workers starting together bootstrap the database once.
+
+    Returns:
+        bool: True if the database was empty.
+    '''
+    with engine.connect() as connection:
+        if connection.dialect.name == "sqlite":
+            # pysqlite doesn't start transactions for DDL; take the write lock up front
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        empty: bool = not inspect(connection).has_table(models.Booking.__tablename__)
+        models.Base.metadata.create_all(bind=connection)
+        if empty:
+            for model, rows in SEED_DATA:
+                connection.execute(insert(model), rows)
+            connection.execute(insert(models.SchemaVersion), [
+                {"version": migration.version, "name": migration.name, "applied_at": datetime.now()}
+                for migration in (migrations if migrations is not None else load_migrations())])
+        connection.commit()
+    if empty:
+        log(f"Created the tables and the reference data of an empty {engine.dialect.name} database")
+    return empty
+
+@dataclass
+class QueryPlan:
+    name: str
+    statement: str
+    plan: list[str]
+    # Large tables read with a full table or index scan
+    full_scans: list[str]
+
+def hot_queries() -> list[tuple[str, Callable[[Session], object]]]:
+    '''
+    Returns the hot read paths of crud.py, by name. Each one runs the crud method with a key that matches no row:
+    the statements are the ones the API sends, and the check reads nothing else.
+    '''
+    from . import crud
+    missing_date: date = date(2000, 1, 1)
+    return [
+        ("booking by booking ID", lambda db: crud.Booking(db).get_govt_id_image_key("B0")),
+        ("booking page by booking ID", lambda db: crud.Booking(db).list_bookings(0, 1, booking_id="B0")),
+        # The overlap check of add_booking and update_booking
+        ("room overlap check", lambda db: db.execute(crud.Booking(db)._Booking__room_conflicts(0, missing_date, missing_date)).fetchall()),
+        ("customer by phone", lambda db: crud.Customer(db).get_customer("0000000000")),
+        ("customer by email", lambda db: crud.Customer(db).get_customer("nobody@example.com")),
+        ("customers by keys", lambda db: crud.Customer(db).get_customers(["0", "0000000000", "nobody@example.com"])),
+        ("employee by email", lambda db: crud.get_employee("nobody@example.com", db)),
+        ("occupancy window", lambda db: crud.Booking(db).get_occupancy(missing_date, 1)),
+    ]
+
+def explain(db: Session, statement: str, parameters) -> list[tuple[str, str, str]]:
+    '''Returns the plan of the statement as (table, access, description) steps, where access is ALL or index for a full scan.'''
+    connection = db.connection()
+    if connection.dialect.name == "sqlite":
+        plan: list[tuple[str, str, str]] = []
+        for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+            # e.g. "SCAN Bookings", "SCAN Bookings USING INDEX idx_bk_checkin_id" or "SEARCH Bookings USING INDEX ..."
+            match: re.Match|None = re.match(r"^(SCAN|SEARCH) (\w+)", row.detail)
+            if match is None:
+                plan.append(("", "", row.detail))
+            elif match.group(1) == "SEARCH":
+                plan.append((match.group(2), "search", row.detail))
+            else:
+                plan.append((match.group(2), "index" if "INDEX" in row.detail else "ALL", row.detail))
+        return plan
+    rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings().fetchall()
+    return [(row["table"] or "", row["type"] or "", f"{row['table']}: {row['type']} key={row['key']} rows={row['rows']}") for row in rows]
+
+def check(db: Session, queries: list[tuple[str, Callable[[Session], object]]]|None = None) -> list[QueryPlan]:
+    '''
+    Runs the hot queries, explains the statements they send and returns their plans.
+    A plan that reads one of LARGE_TABLES with a full table or index scan lists the table in full_scans.
+    '''
+    from sqlalchemy import event
+    plans: list[QueryPlan] = []
+    for name, run in queries if queries is not None else hot_queries():
+        statements: list[tuple[str, object]] = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((statement, parameters))
+
+        bind = db.get_bind()
+        event.listen(bind, "before_cursor_execute", before_cursor_execute)
+        try:
+            try:
+                run(db)
+            except ValueError:
+                # Raised for the keys that match no row
+                pass
+        finally:
+            event.remove(bind, "before_cursor_execute", before_cursor_execute)
+        for statement, parameters in statements:
+            plan: list[tuple[str, str, str]] = explain(db, statement, parameters)
+            # SQLAlchemy aliases joined tables as <table>_<n>
+            full_scans: list[str] = [table for table, access, _ in plan
+                                     if access in ("ALL", "index") and re.sub(r"_\d+$", "", table) in LARGE_TABLES]
+            plans.append(QueryPlan(name=name, statement=" ".join(statement.split()), plan=[step for _, _, step in plan], full_scans=full_scans))
+    db.rollback()
+    return plans
+
+def main() -> None:
+    '''
+    Applies and checks the migrations of migrations/: python -m utils.migrations <command>
+    * status: Lists the migrations and whether they are applied.
+    * upgrade [--to VERSION]: Applies the pending migrations.
+    * stamp VERSION: Records the migrations up to VERSION as applied without running them.
+    * bootstrap: Creates the tables and the reference data of an empty database, such as a new SQLite file.
+    * check: Explains the hot queries of crud.py and exits with status 1 if one of them scans a large table.
+    '''
+    from .database import engine, SessionLocal
+
+    parser = argparse.ArgumentParser(description="Applies the schema migrations and checks the plans of the hot queries.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status")
+    upgrade_parser = commands.add_parser("upgrade")
+    upgrade_parser.add_argument("--to", type=int, default=None)
+    stamp_parser = commands.add_parser("stamp")
+    stamp_parser.add_argument("version", type=int)
+    commands.add_parser("check")
+    commands.add_parser("bootstrap")
+    args = parser.parse_args()
+
+    match args.command:
+        case "status":
+            applied: set[int] = applied_versions(engine)
+            for migration in load_migrations():
+                print(f"{'applied' if migration.version in applied else 'pending'}  {migration.name}")
+        case "upgrade":
+            applied_now: list[Migration] = upgrade(engine, load_migrations(), args.to)
+            print(f"{len(applied_now)} migrations applied")
+        case "stamp":
+            stamped: list[Migration] = stamp(engine, load_migrations(), args.version)
+            print(f"{len(stamped)} migrations recorded")
+        case "bootstrap":
+            if not bootstrap(engine):
+                print("The database already has tables; created the missing ones")
+        case "check":
+            with SessionLocal() as db:
+                plans: list[QueryPlan] = check(db)
+            for plan in plans:
+                print(f"{'FULL SCAN' if plan.full_scans else 'ok':9}  {plan.name}: {plan.statement}")
+                for line in plan.plan:
+                    print(f"           {line}")
+            failed: list[QueryPlan] = [plan for plan in plans if plan.full_scans]
+            if failed:
+                print(f"{len(failed)} statements scan a large table: {', '.join(sorted({plan.name for plan in failed}))}", file=sys.stderr)
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
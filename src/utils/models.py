@@ -1,5 +1,5 @@
 # Cloudbeds creation DDL:../../create-tables-1.sql
-from sqlalchemy import Boolean, ForeignKey, Integer, String, DateTime, CheckConstraint, Date, BLOB
+from sqlalchemy import Boolean, ForeignKey, Integer, String, DateTime, CheckConstraint, Date, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from .database import Base
 from typing import Optional
@@ -46,6 +46,8 @@ class CustomerAddress(Base):
             address_type.in_(['Correspondence', 'Permanent']),
             name='chk_address_type'
         ),
+        # Index that MySQL creates for the foreign key, used to find the first address of a customer
+        Index("fk_customer_id", "customer_id"),
     )    
 
 class Employee(Base):
@@ -105,6 +107,8 @@ class EmployeeAddress(Base):
             address_type.in_(['Correspondence', 'Permanent']),
             name='chk_address_type'
         ),
+        # Index that MySQL creates for the foreign key, used to find the first address of an employee
+        Index("fk_employee_id", "emp_id"),
     )
 
 
@@ -176,6 +180,11 @@ class BookingStatus(Base):
     # Define the relationship to the Booking model
     booking: Mapped[list["Booking"]] = relationship("Booking", back_populates="booking_status")
 
+class BookingIdGenerator(Base):
+    __tablename__ = "BookingIDGenerator"
+    # The table holds a single row and has no key in create-tables-1.sql. The ORM needs a primary key to map it.
+    last_booking_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+
 class Booking(Base):
     __tablename__ = "Bookings"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -185,7 +194,8 @@ class Booking(Base):
     checkout: Mapped[Date] = mapped_column(Date, nullable=False)
     govt_id_num: Mapped[str] = mapped_column(String(20), nullable=False)
     exp_date: Mapped[Optional[Date]] = mapped_column(Date, nullable=True)
-    govt_id_img: Mapped[Optional[BLOB]] = mapped_column(BLOB, nullable=True)
+    # SHA-256 key of the government ID image in the blob store (utils/blob_store.py)
+    govt_id_img_key: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     comments: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
 
     # Foreign keys
@@ -209,3 +219,21 @@ class Booking(Base):
 
     # Define the back-reference to the Employee model
     employee: Mapped[Employee] = relationship('Employee', back_populates='booking')
+
+    __table_args__ = (
+        # Index used to page through the bookings by (checkin, id)
+        Index("idx_bk_checkin_id", "checkin", "id"),
+        # Lookups by booking ID
+        Index("idx_bk_booking_id", "booking_id", unique=True),
+        # Overlap checks of the bookings of a room
+        Index("idx_bk_room_dates", "room_id", "checkin", "checkout", "booking_status_id"),
+        # Bookings that overlap a date window. checkin < end matches most of the history; checkout > start doesn't.
+        Index("idx_bk_checkout", "checkout"),
+    )
+
+class SchemaVersion(Base):
+    __tablename__ = "SchemaVersion"
+    # Migrations of migrations/ applied to the database, by the number that prefixes their file name (utils/migrations.py)
+    version: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    applied_at: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
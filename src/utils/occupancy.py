@@ -0,0 +1,55 @@
+import os
+import numpy as np
+from datetime import date
+from dotenv import load_dotenv
+
+# Load environmental variables from .env
+load_dotenv()
+# Longest window, in nights, of an occupancy grid
+OCCUPANCY_MAX_DAYS: int = int(os.getenv("OCCUPANCY_MAX_DAYS", "366"))
+# Cell value of a night without a booking. Booking status ids start at 1.
+FREE: int = 0
+
+def build_grid(room_ids: np.ndarray, booking_room_ids: np.ndarray, checkins: np.ndarray, checkouts: np.ndarray,
+               statuses: np.ndarray, start: date, days: int) -> np.ndarray:
+    '''
+    Returns the rooms x days grid of booking status ids. Cell [r, d] holds the status of the booking of room r
+    on the night of start + d, or FREE. A booking occupies the nights from its checkin up to, but not including, its checkout.
+    When bookings overlap, the one that comes last in the input wins.
+
+    Args:
+        * room_ids: (np.ndarray) Sorted room_ids, one per row of the grid.
+        * booking_room_ids, checkins, checkouts, statuses: (np.ndarray) One entry per booking. The dates are datetime64[D].
+        * start: (date) The first night of the grid.
+        * days: (int) The number of nights in the grid.
+    '''
+    grid: np.ndarray = np.full((len(room_ids), days), FREE, dtype=np.int16)
+    # Clip the stays to the window, as column offsets
+    first: np.ndarray = np.clip((checkins - np.datetime64(start, "D")).astype(np.int64), 0, days)
+    last: np.ndarray = np.clip((checkouts - np.datetime64(start, "D")).astype(np.int64), 0, days)
+    rows: np.ndarray = np.searchsorted(room_ids, booking_room_ids)
+    # Bookings of rooms outside the grid are dropped
+    in_grid: np.ndarray = (last > first) & (rows < len(room_ids))
+    in_grid[in_grid] &= room_ids[rows[in_grid]] == booking_room_ids[in_grid]
+    first, last, rows, statuses = first[in_grid], last[in_grid], rows[in_grid], statuses[in_grid]
+    # Expand each stay into its cells without a Python loop:
+    # the column of a cell is the first night of its stay plus its position within the stay
+    nights: np.ndarray = last - first
+    offsets: np.ndarray = np.arange(nights.sum()) - np.repeat(np.cumsum(nights) - nights, nights)
+    grid[np.repeat(rows, nights), np.repeat(first, nights) + offsets] = np.repeat(statuses, nights)
+    return grid
+
+def run_length_encode(grid: np.ndarray) -> list[list[int]]:
+    '''
+    Returns the run-length encoding of each row of the grid as a flat list [value, length, value, length, ...].
+    Every row starts a new run, so runs never span two rooms.
+    '''
+    if grid.size == 0:
+        return [[] for _ in range(grid.shape[0])]
+    starts: np.ndarray = np.ones(grid.shape, dtype=bool)
+    starts[:, 1:] = grid[:, 1:] != grid[:, :-1]
+    positions: np.ndarray = np.flatnonzero(starts)
+    lengths: np.ndarray = np.diff(positions, append=grid.size)
+    runs: np.ndarray = np.column_stack((grid.ravel()[positions], lengths)).ravel()
+    runs_per_row: np.ndarray = np.bincount(positions // grid.shape[1], minlength=grid.shape[0])
+    return [row.tolist() for row in np.split(runs, np.cumsum(runs_per_row)[:-1] * 2)]
@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import date
+from sqlalchemy import and_, or_
+
+# Response header used by the list endpoints to return the cursor of the next page
+NEXT_CURSOR_HEADER: str = "X-Next-Cursor"
+
+def encode_cursor(*values: int|str|date) -> str:
+    '''
+    Encodes the sort key of the last record of a page into an opaque cursor string.
+
+    Args:
+        * values: The values of the sort key columns, in the sort order.
+    '''
+    payload: str = json.dumps([value.isoformat() if isinstance(value, date) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types: type) -> tuple:
+    '''
+    Decodes a cursor created by encode_cursor.
+
+    Args:
+        * cursor: (str) The cursor supplied by the client.
+        * types: The types of the sort key columns, in the sort order.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    '''
+    try:
+        values: list = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(values) != len(types):
+            raise ValueError
+        return tuple(date.fromisoformat(value) if value_type is date else value_type(value) for value_type, value in zip(types, values))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+def keyset_filter(columns: list, values: tuple):
+    '''
+    Returns the WHERE clause that selects the records after the given sort key.
+    For the columns (a, b) and the values (x, y), the clause is: a > x OR (a = x AND b > y).
+
+    Args:
+        * columns: The sort key columns, in the sort order.
+        * values: The sort key of the last record of the previous page.
+    '''
+    clauses: list = []
+    for i, column in enumerate(columns):
+        equal_prefix: list = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal_prefix, column > values[i]))
+    return or_(*clauses)
@@ -0,0 +1,90 @@
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, QueuePool
+
+# Upper bounds of the checkout wait time histogram buckets, in milliseconds. The last bucket is unbounded.
+WAIT_TIME_BUCKETS_MS: tuple[float, ...] = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+class PoolStats:
+    '''
+    Connection pool statistics of an engine.
+    Checkouts, checkins, new connections and invalidations are counted through the SQLAlchemy pool events.
+    The checkout wait time and the checkout timeouts are recorded by the pool class returned by instrumented_pool_class.
+    '''
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.checkouts: int = 0
+        self.checkins: int = 0
+        self.connects: int = 0
+        self.invalidations: int = 0
+        self.checkout_timeouts: int = 0
+        self.wait_time_ms_total: float = 0.0
+        self.wait_time_buckets: list[int] = [0] * (len(WAIT_TIME_BUCKETS_MS) + 1)
+
+    def __increment(self, counter: str) -> None:
+        with self.__lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, seconds: float) -> None:
+        '''Records the time a checkout waited for a connection.'''
+        wait_ms: float = seconds * 1000
+        bucket: int = next((i for i, bound in enumerate(WAIT_TIME_BUCKETS_MS) if wait_ms <= bound), len(WAIT_TIME_BUCKETS_MS))
+        with self.__lock:
+            self.wait_time_ms_total += wait_ms
+            self.wait_time_buckets[bucket] += 1
+
+    def record_timeout(self) -> None:
+        '''Records a checkout that timed out waiting for a connection.'''
+        self.__increment("checkout_timeouts")
+
+    def listen(self, target) -> None:
+        '''
+        Registers the pool event listeners.
+
+        Args:
+            * target: The Engine (or Pool) to instrument. Listeners registered on an Engine survive Engine.dispose().
+        '''
+        event.listen(target, "checkout", lambda *args: self.__increment("checkouts"))
+        event.listen(target, "checkin", lambda *args: self.__increment("checkins"))
+        event.listen(target, "connect", lambda *args: self.__increment("connects"))
+        event.listen(target, "invalidate", lambda *args: self.__increment("invalidations"))
+
+    def snapshot(self, pool: Pool) -> dict:
+        '''Returns the statistics together with the current state of the pool.'''
+        is_queue_pool: bool = isinstance(pool, QueuePool)
+        labels: list[str] = [f"<={bound:g}ms" for bound in WAIT_TIME_BUCKETS_MS] + [f">{WAIT_TIME_BUCKETS_MS[-1]:g}ms"]
+        with self.__lock:
+            return {
+                "pool_class": pool.__class__.__name__,
+                "size": pool.size() if is_queue_pool else None,
+                "checked_out": pool.checkedout() if is_queue_pool else None,
+                "overflow": pool.overflow() if is_queue_pool else None,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "checkout_timeouts": self.checkout_timeouts,
+                "wait_time_ms_total": round(self.wait_time_ms_total, 3),
+                "wait_time_histogram": dict(zip(labels, self.wait_time_buckets)),
+            }
+
+def instrumented_pool_class(base: type[QueuePool], stats: PoolStats) -> type[QueuePool]:
+    '''
+    Returns a subclass of the QueuePool class that records the checkout wait time and timeouts in stats.
+    The pool events fire only after a connection is checked out, so the wait is measured around QueuePool._do_get.
+    '''
+    class InstrumentedPool(base):
+        def _do_get(self):
+            start: float = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except PoolTimeoutError:
+                stats.record_timeout()
+                raise
+            stats.record_wait(time.perf_counter() - start)
+            return connection
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
@@ -0,0 +1,68 @@
+from typing import Any
+from pydantic import BaseModel, create_model
+from sqlalchemy import select, func, Select, Row
+from sqlalchemy.orm import InstrumentedAttribute
+from . import models, schemas
+
+def columns(model: type[models.Base], schema: type[BaseModel]) -> tuple[InstrumentedAttribute, ...]:
+    '''Returns the columns of the model that hold the fields of the schema, in the order of the schema fields.'''
+    return tuple(getattr(model, field) for field in schema.model_fields)
+
+# Columns selected for the EmployeeOut and CustomerOut payloads. Login columns and password hashes are never read.
+EMPLOYEE_DETAILS: tuple[InstrumentedAttribute, ...] = columns(models.Employee, schemas.EmployeeBase)
+EMPLOYEE_ADDRESS: tuple[InstrumentedAttribute, ...] = columns(models.EmployeeAddress, schemas.EmployeeAddressBase)
+CUSTOMER_DETAILS: tuple[InstrumentedAttribute, ...] = columns(models.Customer, schemas.CustomerBase)
+CUSTOMER_ADDRESS: tuple[InstrumentedAttribute, ...] = columns(models.CustomerAddress, schemas.CustomerAddressBase)
+
+def stored(schema: type[BaseModel]) -> type[BaseModel]:
+    '''
+    Returns a subclass of the schema for values read back from the database. Emails were validated when they were written,
+    and EmailStr validation costs more than the rest of the row, so the subclass types email as str.
+    Its instances are instances of the schema, which FastAPI returns without validating them again.
+    '''
+    if "email" not in schema.model_fields:
+        return schema
+    return create_model(schema.__name__, __base__=schema, email=(str, ...))
+
+class Projection:
+    '''
+    Selects the columns of an XOut payload, the owner's details and its first address, in one joined query
+    and builds the payloads directly from the rows, without loading ORM entities into the session.
+    '''
+    def __init__(self, out_schema: type[BaseModel], key: InstrumentedAttribute, address_key: InstrumentedAttribute,
+                 details: tuple[InstrumentedAttribute, ...], address: tuple[InstrumentedAttribute, ...]):
+        self.out_schema: type[BaseModel] = out_schema
+        self.key: InstrumentedAttribute = key
+        self.address_key: InstrumentedAttribute = address_key
+        self.details: tuple[InstrumentedAttribute, ...] = details
+        self.address: tuple[InstrumentedAttribute, ...] = address
+        # Names of the key, details and address fields of the payload, e.g. emp_id, emp_details and emp_address
+        self.key_field, self.details_field, self.address_field = out_schema.model_fields
+        self.__detail_names: tuple[str, ...] = tuple(column.key for column in details)
+        self.__address_names: tuple[str, ...] = tuple(column.key for column in address)
+        self.__details_schema: type[BaseModel] = stored(out_schema.model_fields[self.details_field].annotation)
+        self.__address_schema: type[BaseModel] = stored(out_schema.model_fields[self.address_field].annotation)
+
+    def select(self) -> Select:
+        '''
+        Returns the statement that selects the payload columns. Add the filters, the ordering and the limits to it.
+        Like addresses[0] in the ORM payload builders, the first address (lowest address_id) is the one returned.
+        '''
+        address_model: type[models.Base] = self.address_key.class_
+        first_address = (select(func.min(address_model.address_id)).where(self.address_key == self.key)
+                         .correlate(self.key.class_).scalar_subquery())
+        return (select(self.key, *self.details, *self.address)
+                .join(address_model, address_model.address_id == first_address))
+
+    def build(self, row: Row) -> BaseModel:
+        '''Builds the payload from a row of select().'''
+        values: tuple[Any, ...] = tuple(row)
+        end: int = 1 + len(self.__detail_names)
+        return self.out_schema(**{
+            self.key_field: values[0],
+            self.details_field: self.__details_schema(**dict(zip(self.__detail_names, values[1:end]))),
+            self.address_field: self.__address_schema(**dict(zip(self.__address_names, values[end:]))),
+        })
+
+employee_out: Projection = Projection(schemas.EmployeeOut, models.Employee.emp_id, models.EmployeeAddress.emp_id, EMPLOYEE_DETAILS, EMPLOYEE_ADDRESS)
+customer_out: Projection = Projection(schemas.CustomerOut, models.Customer.customer_id, models.CustomerAddress.customer_id, CUSTOMER_DETAILS, CUSTOMER_ADDRESS)
@@ -0,0 +1,184 @@
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+# Load environmental variables from .env
+load_dotenv()
+# Statements per request above which a route is over its query budget. 0 disables the budget.
+QUERY_BUDGET: int = int(os.getenv("QUERY_BUDGET", "20"))
+# Budgets of specific routes, as "<METHOD> <path>=<statements>" separated by commas,
+# e.g. "POST /booking/bulk_add/=200,GET /booking/export/=0"
+QUERY_BUDGETS: str = os.getenv("QUERY_BUDGETS", "")
+# Strict mode: log a warning for every request over its budget. Otherwise, they are only counted on /admin/query_metrics/stats/.
+QUERY_BUDGET_STRICT: bool = os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+# Add a Server-Timing header with the statement count and the database time to every response
+SERVER_TIMING: bool = os.getenv("SERVER_TIMING", "true").lower() == "true"
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+def parse_budgets(budgets: str) -> dict[str, int]:
+    '''Parses QUERY_BUDGETS. Raises ValueError if an entry isn't "<METHOD> <path>=<statements>".'''
+    parsed: dict[str, int] = {}
+    for entry in filter(None, (entry.strip() for entry in budgets.split(","))):
+        route, separator, statements = entry.rpartition("=")
+        if not separator or len(route.split()) != 2:
+            raise ValueError(f"Invalid query budget {entry}. Expected <METHOD> <path>=<statements>.")
+        parsed[" ".join(route.split())] = int(statements)
+    return parsed
+
+class RequestQueries:
+    '''
+    The statements sent to the database for one request. The crud methods of a request may run in a worker thread,
+    so the counters are updated under a lock.
+    '''
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.statements: int = 0
+        self.db_time_ms: float = 0.0
+        # Rows written, plus rows returned on drivers that report them: PyMySQL and aiomysql do, SQLite doesn't
+        self.rows: int = 0
+
+    def add(self, db_time_ms: float, rows: int) -> None:
+        with self.__lock:
+            self.statements += 1
+            self.db_time_ms += db_time_ms
+            self.rows += max(rows, 0)
+
+    def server_timing(self, total_ms: float) -> str:
+        '''Returns the Server-Timing header value, e.g. db;dur=1.25;desc="3 statements, 20 rows", app;dur=4.5'''
+        with self.__lock:
+            return f'db;dur={self.db_time_ms:.2f};desc="{self.statements} statements, {self.rows} rows", app;dur={total_ms:.2f}'
+
+# The statements of the request being handled. Worker threads started with run_in_threadpool and the greenlets
+# of AsyncSession.run_sync see the same value.
+current_queries: ContextVar[RequestQueries|None] = ContextVar("current_queries", default=None)
+
+class QueryMetrics:
+    '''
+    Statement counts, database time and rows per request, attributed through the SQLAlchemy cursor events
+    to the request in current_queries, and aggregated per route. The statements sent outside of a request,
+    such as when an index is built at startup, aren't counted.
+    '''
+    def __init__(self, budget: int, budgets: dict[str, int], strict: bool):
+        self.budget: int = budget
+        self.budgets: dict[str, int] = budgets
+        self.strict: bool = strict
+        self.__lock = threading.Lock()
+        # Route -> counters
+        self.__routes: dict[str, dict] = {}
+
+    def listen(self, engine) -> None:
+        '''Registers the cursor event listeners on the engine, or on the sync_engine of an AsyncEngine.'''
+        event.listen(engine, "before_cursor_execute", self.__before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.__after_cursor_execute)
+
+    @staticmethod
+    def __before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        # A connection runs one statement at a time
+        conn.info["query_started_at"] = time.perf_counter()
+
+    @staticmethod
+    def __after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        queries: RequestQueries|None = current_queries.get()
+        started_at: float|None = conn.info.pop("query_started_at", None)
+        if queries is None or started_at is None:
+            return
+        queries.add((time.perf_counter() - started_at) * 1000, cursor.rowcount)
+
+    def budget_of(self, route: str) -> int:
+        '''Returns the statement budget of the route. 0 means no budget.'''
+        return self.budgets.get(route, self.budget)
+
+    def record(self, route: str, queries: RequestQueries) -> bool:
+        '''
+        Adds the statements of a request to the counters of its route.
+
+        Returns:
+            bool: True if the request exceeded the budget of the route.
+        '''
+        budget: int = self.budget_of(route)
+        over_budget: bool = budget > 0 and queries.statements > budget
+        with self.__lock:
+            stats: dict|None = self.__routes.get(route)
+            if stats is None:
+                stats = self.__routes[route] = {"requests": 0, "statements": 0, "max_statements": 0, "db_time_ms": 0.0,
+                                                "max_db_time_ms": 0.0, "rows": 0, "over_budget": 0}
+            stats["requests"] += 1
+            stats["statements"] += queries.statements
+            stats["max_statements"] = max(stats["max_statements"], queries.statements)
+            stats["db_time_ms"] += queries.db_time_ms
+            stats["max_db_time_ms"] = max(stats["max_db_time_ms"], queries.db_time_ms)
+            stats["rows"] += queries.rows
+            stats["over_budget"] += over_budget
+        if over_budget and self.strict:
+            logger.warning("%s sent %d statements, over its budget of %d (%.1f ms in the database)",
+                           route, queries.statements, budget, queries.db_time_ms)
+        return over_budget
+
+    def stats(self) -> dict[str, dict]:
+        '''Returns the counters per route, the routes with the most statements per request first.'''
+        with self.__lock:
+            routes: dict[str, dict] = {route: dict(stats) for route, stats in self.__routes.items()}
+        result: dict[str, dict] = {}
+        for route, stats in sorted(routes.items(), key=lambda item: item[1]["statements"] / item[1]["requests"], reverse=True):
+            requests: int = stats["requests"]
+            result[route] = {
+                "requests": requests,
+                "statements": stats["statements"],
+                "statements_per_request": round(stats["statements"] / requests, 2),
+                "max_statements": stats["max_statements"],
+                "db_time_ms_total": round(stats["db_time_ms"], 3),
+                "db_time_ms_per_request": round(stats["db_time_ms"] / requests, 3),
+                "max_db_time_ms": round(stats["max_db_time_ms"], 3),
+                "rows": stats["rows"],
+                "budget": self.budget_of(route),
+                "over_budget": stats["over_budget"],
+            }
+        return result
+
+    def reset(self) -> None:
+        '''Clears the counters.'''
+        with self.__lock:
+            self.__routes.clear()
+
+query_metrics: QueryMetrics = QueryMetrics(QUERY_BUDGET, parse_budgets(QUERY_BUDGETS), QUERY_BUDGET_STRICT)
+
+def route_of(scope: dict) -> str:
+    '''Returns the route of a request as "<METHOD> <path template>", e.g. "GET /booking/govt_id_image/{booking_id}".'''
+    route = scope.get("route")
+    # Requests that match no route are grouped, so that scanning for URLs doesn't add a route per path
+    return f"{scope['method']} {getattr(route, 'path', '(unmatched)')}"
+
+class QueryMetricsMiddleware:
+    '''
+    ASGI middleware that collects the statements of each request in current_queries, adds the Server-Timing header
+    and records them with query_metrics once the response is sent. The header only counts the statements sent
+    before the response starts: the rows of a streamed response, such as /booking/export/, are read later.
+    '''
+    def __init__(self, app, metrics: QueryMetrics|None = None):
+        self.app = app
+        self.metrics: QueryMetrics = metrics or query_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries: RequestQueries = RequestQueries()
+        token = current_queries.set(queries)
+        start: float = time.perf_counter()
+
+        async def send_with_server_timing(message) -> None:
+            if message["type"] == "http.response.start" and SERVER_TIMING:
+                MutableHeaders(scope=message).append("Server-Timing", queries.server_timing((time.perf_counter() - start) * 1000))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            current_queries.reset(token)
+            self.metrics.record(route_of(scope), queries)
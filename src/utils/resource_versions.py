@@ -0,0 +1,88 @@
+import hashlib
+import os
+import secrets
+import threading
+import time
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, Response, status
+
+# Load environmental variables from .env
+load_dotenv()
+# Seconds after which every ETag changes, so that writes made by other worker processes show up within that time
+ETAG_MAX_AGE: float = float(os.getenv("ETAG_MAX_AGE", "60"))
+
+# Responses with an ETag may be stored by the browser, but must be revalidated before they are used again
+ETAG_CACHE_CONTROL: str = "private, no-cache"
+
+# Resources whose versions are bumped by the crud write methods
+GOVT_ID_TYPES: str = "govt_id_types"
+ROOM_TYPES: str = "room_types"
+ROOM_STATES: str = "room_states"
+ROOMS: str = "rooms"
+BOOKINGS: str = "bookings"
+CUSTOMERS: str = "customers"
+EMPLOYEES: str = "employees"
+
+class ResourceVersions:
+    '''
+    Process-wide version counters of the resources served by the read endpoints.
+    A write method bumps the versions of the resources it changed after it commits, and a read endpoint derives
+    a strong ETag from the versions of the resources its response is built from.
+
+    The counters are per process. The ETags carry a token of the process, so that an ETag issued by another worker
+    never matches, and change every max_age seconds, which bounds how long a write made by another worker goes unseen.
+    '''
+    def __init__(self, max_age: float):
+        self.max_age: float = max_age
+        self.__lock = threading.Lock()
+        self.__process: str = secrets.token_hex(4)
+        self.__versions: dict[str, int] = {}
+
+    def bump(self, *resources: str) -> None:
+        '''Marks the resources as changed. Call it after the change is committed.'''
+        with self.__lock:
+            for resource in resources:
+                self.__versions[resource] = self.__versions.get(resource, 0) + 1
+
+    def etag(self, resources: tuple[str, ...], *params: str) -> str:
+        '''
+        Returns the strong ETag of a response built from the resources.
+
+        Args:
+            * resources: (tuple[str, ...]) The resources that the response is built from.
+            * params: (str) Whatever else selects the response, such as the path and the query string.
+        '''
+        with self.__lock:
+            versions: str = ".".join(str(self.__versions.get(resource, 0)) for resource in resources)
+        period: int = int(time.monotonic() // self.max_age) if self.max_age > 0 else 0
+        digest: str = hashlib.blake2b("\n".join(params).encode(), digest_size=8).hexdigest()
+        return f'"{self.__process}-{period}-{versions}-{digest}"'
+
+    def reset(self) -> None:
+        '''Sets all the versions back to 0.'''
+        with self.__lock:
+            self.__versions.clear()
+
+def etag_matches(if_none_match: str|None, etag: str) -> bool:
+    '''Returns True if the If-None-Match header lists the ETag. As RFC 9110 specifies for If-None-Match, W/ prefixes are ignored.'''
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+resource_versions: ResourceVersions = ResourceVersions(ETAG_MAX_AGE)
+
+def conditional_get(*resources: str):
+    '''
+    Returns a dependency for a read endpoint whose response is built from the resources.
+    The dependency sets the ETag of the response, or answers HTTP 304 if the request's If-None-Match matches it,
+    before the endpoint runs its query. Declare it after the authentication dependency.
+    '''
+    async def check(request: Request, response: Response) -> None:
+        etag: str = resource_versions.etag(resources, request.url.path, request.url.query)
+        headers: dict[str, str] = {"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+    return check
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.orm.session import Session
+from sqlalchemy.util import await_only
+from sqlalchemy.util.concurrency import in_greenlet
+from . import models, cloudbeds_exceptions
+from .pool_metrics import WAIT_TIME_BUCKETS_MS
+
+# Load environmental variables from .env
+load_dotenv()
+# Number of in-process locks that the rooms are spread over. Rooms that share a lock are written one at a time.
+ROOM_LOCK_SHARDS: int = int(os.getenv("ROOM_LOCK_SHARDS", "64"))
+# Seconds a booking write waits for its rooms before it fails with ServiceBusy
+ROOM_LOCK_TIMEOUT: float = float(os.getenv("ROOM_LOCK_TIMEOUT", "5"))
+# Longest sleep, in seconds, between two attempts of a booking write that waits on the event loop
+ASYNC_POLL_MAX: float = 0.005
+
+class RoomLockManager:
+    '''
+    Serializes the booking writes of a room, so that its overlap check and its insert or update can't interleave
+    with those of another booking of the room. Bookings of other rooms proceed in parallel.
+
+    Within the process, the rooms are spread over a fixed table of locks by room_id. Across worker processes,
+    the Rooms rows are locked with SELECT ... FOR UPDATE until the transaction ends.
+    SQLite ignores FOR UPDATE and serializes writers by locking the whole database, so no row lock is taken there.
+    '''
+    def __init__(self, shards: int, timeout: float):
+        self.timeout: float = timeout
+        self.__shards: list[threading.Lock] = [threading.Lock() for _ in range(shards)]
+        self.__stats_lock = threading.Lock()
+        self.acquisitions: int = 0
+        self.contended: int = 0
+        self.timeouts: int = 0
+        self.wait_time_ms_total: float = 0.0
+        self.wait_time_buckets: list[int] = [0] * (len(WAIT_TIME_BUCKETS_MS) + 1)
+        self.db_lock_time_ms_total: float = 0.0
+
+    def __acquire(self, lock: threading.Lock, deadline: float) -> bool:
+        '''
+        Waits for the lock until the deadline. Inside AsyncSession.run_sync the caller runs on the event loop thread,
+        where blocking would stop the coroutine that holds the lock, so the wait sleeps on the event loop instead.
+        '''
+        if in_greenlet():
+            delay: float = 0.0005
+            while not lock.acquire(blocking=False):
+                remaining: float = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                await_only(asyncio.sleep(min(delay, remaining)))
+                delay = min(delay * 2, ASYNC_POLL_MAX)
+            return True
+        return lock.acquire(timeout=max(deadline - time.monotonic(), 0))
+
+    def __record(self, contended: bool, waited: float, timed_out: bool) -> None:
+        wait_ms: float = waited * 1000
+        bucket: int = next((i for i, bound in enumerate(WAIT_TIME_BUCKETS_MS) if wait_ms <= bound), len(WAIT_TIME_BUCKETS_MS))
+        with self.__stats_lock:
+            self.acquisitions += 1
+            self.contended += contended
+            self.timeouts += timed_out
+            self.wait_time_ms_total += wait_ms
+            self.wait_time_buckets[bucket] += 1
+
+    @contextmanager
+    def hold(self, db: Session, room_ids: Iterable[int]) -> Iterator[None]:
+        '''
+        Locks the rooms for the block. Commit or roll back the session inside the block, which releases the row locks.
+        The session's current transaction is ended first: under MySQL's REPEATABLE READ, reads come from the snapshot
+        taken at the first read of the transaction, and the checks made under the lock must see the bookings
+        committed while waiting. Don't write before calling it.
+
+        Args:
+            * db: (Session) The session that checks and writes the bookings.
+            * room_ids: (Iterable[int]) The rooms that the bookings are written to.
+
+        Raises:
+            cloudbeds_exceptions.ServiceBusy: If the rooms are still locked after self.timeout seconds.
+        '''
+        room_ids: list[int] = sorted(set(room_ids))
+        # Shards are always taken in the same order, so that two writers never wait for each other
+        shards: list[threading.Lock] = [self.__shards[i] for i in sorted({room_id % len(self.__shards) for room_id in room_ids})]
+        start: float = time.monotonic()
+        deadline: float = start + self.timeout
+        held: list[threading.Lock] = []
+        contended: bool = False
+        try:
+            for lock in shards:
+                if lock.acquire(blocking=False):
+                    held.append(lock)
+                    continue
+                contended = True
+                if not self.__acquire(lock, deadline):
+                    self.__record(contended, time.monotonic() - start, True)
+                    raise cloudbeds_exceptions.ServiceBusy("The room is being booked by another request. Try again.")
+                held.append(lock)
+            self.__record(contended, time.monotonic() - start, False)
+
+            if db.in_transaction():
+                db.commit()
+            if db.get_bind().dialect.name != "sqlite":
+                db_start: float = time.monotonic()
+                db.execute(select(models.Room.room_id).where(models.Room.room_id.in_(room_ids)).order_by(models.Room.room_id).with_for_update())
+                with self.__stats_lock:
+                    self.db_lock_time_ms_total += (time.monotonic() - db_start) * 1000
+            yield
+        finally:
+            for lock in reversed(held):
+                lock.release()
+
+    def stats(self) -> dict:
+        '''Returns the lock counters and the wait time histogram.'''
+        labels: list[str] = [f"<={bound:g}ms" for bound in WAIT_TIME_BUCKETS_MS] + [f">{WAIT_TIME_BUCKETS_MS[-1]:g}ms"]
+        with self.__stats_lock:
+            return {
+                "shards": len(self.__shards),
+                "acquisitions": self.acquisitions,
+                "contended": self.contended,
+                "timeouts": self.timeouts,
+                "wait_time_ms_total": round(self.wait_time_ms_total, 3),
+                "wait_time_histogram": dict(zip(labels, self.wait_time_buckets)),
+                "db_lock_time_ms_total": round(self.db_lock_time_ms_total, 3),
+            }
+
+room_locks: RoomLockManager = RoomLockManager(ROOM_LOCK_SHARDS, ROOM_LOCK_TIMEOUT)
@@ -1,14 +1,15 @@
 # Fro more info on string constraint validator, see https://docs.pydantic.dev/latest/concepts/models/
-from fastapi import UploadFile
 from typing import Optional
 from pydantic import (
     BaseModel,
     EmailStr,
-    Field
+    Field,
+    field_validator
 )
 from datetime import datetime, date, timezone
 from dateutil import tz
 from enum import Enum
+from .customer_keys import normalize_phone
 
 class AddressType(str, Enum):
     Permanent = "Permanent"
@@ -34,6 +35,18 @@ class CustomerBase(BaseModel):
     email: EmailStr
     phone: str
 
+    # Phone numbers are stored without separators, the form that Customer.get_customer looks them up in
+    @field_validator("phone")
+    @classmethod
+    def normalize_phone(cls, phone: str) -> str:
+        return normalize_phone(phone)
+
+    # Emails are stored lowercased, so that uq_customer_email treats emails that differ in case as duplicates on every backend
+    @field_validator("email")
+    @classmethod
+    def normalize_email(cls, email: str) -> str:
+        return email.lower()
+
 class CustomerAddressBase(BaseModel):
     first_line: str
     second_line: str|None
@@ -56,6 +69,12 @@ class CustomerOut(BaseModel):
     customer_details: CustomerBase
     customer_address: CustomerAddressBase
 
+class CustomerBatchResult(BaseModel):
+    # Customers by the requested key
+    customers: dict[str, CustomerOut]
+    # Keys that match no customer, or that aren't a customer ID, a phone number or an email
+    missing: list[str]
+
 class EmployeeBase(BaseModel):
     first_name: str 
     middle_name: str | None
@@ -103,11 +122,45 @@ class RoomTypeIn(BaseModel):
 class GenericMessage(BaseModel):
     msg:str
 
+class ImportRowError(BaseModel):
+    # Position of the row in the file (the first data row is 0)
+    index: int
+    error: str
+
+class CustomerImportResult(GenericMessage):
+    # Rows read, customers added, rows skipped as duplicates and rows skipped as invalid
+    rows: int
+    imported: int
+    duplicates: int
+    failed: int
+    # The first CUSTOMER_IMPORT_MAX_ERRORS duplicates and invalid rows
+    errors: list[ImportRowError]
+
 class RoomBase(BaseModel):
     room_number: int
     room_type: RoomType
     room_state: str | None = "Available"
 
+class BulkRowError(BaseModel):
+    # Position of the row in the request (the first data row of a CSV file is 0)
+    index: int
+    room_number: int | None = None
+    error: str
+
+class BulkRoomResult(GenericMessage):
+    # Number of rooms added or updated
+    count: int
+    errors: list[BulkRowError]
+
+class BulkRoomUpdateIn(BaseModel):
+    # The rooms to update: either a list of room numbers, or the range room_number_from..room_number_to (inclusive)
+    room_numbers: list[int] | None = None
+    room_number_from: int | None = None
+    room_number_to: int | None = None
+    # The new values. At least one of them is required.
+    room_type: str | None = None
+    room_state: str | None = None
+
 class ListRooms(BaseModel):
     room_type: str | None = None
     room_state: str | None = None
@@ -120,7 +173,8 @@ class BookingBase(BaseModel):
     government_id_type: GovtIdtype
     government_id_number: str
     exp_date: Optional[date | None] = Field(default=None)
-    govt_id_image: Optional[UploadFile| None] = Field(default=None)
+    # Key returned by POST /booking/govt_id_image/ for the uploaded image
+    govt_id_image: Optional[str| None] = Field(default=None, description="Key returned by POST /booking/govt_id_image/ for the uploaded image.")
     room_num: int | None
     comments: str | None
     emp_id: int
@@ -132,14 +186,87 @@ class BookingIn(BaseModel):
 class BookingResult(GenericMessage):
     booking_id: str
 
+class GovtIdImage(BaseModel):
+    # Pass the key as booking.govt_id_image
+    key: str
+    size: int
+    media_type: str
+
 class BookingOut(BaseModel):
     booking_id: str
     customer: CustomerOut
     booking: BookingBase
 
+class BulkBookingIn(BaseModel):
+    bookings: list[BookingIn]
+    # False: the bookings are created only if all of them are valid. True: the valid bookings are created and the others are reported.
+    partial: bool = False
+
+class BulkBookingItemResult(BaseModel):
+    # Position of the booking in BulkBookingIn.bookings
+    index: int
+    booking_id: str | None = None
+    error: str | None = None
+
+class BulkBookingResult(GenericMessage):
+    results: list[BulkBookingItemResult]
+
 class GovtIdTypeBase(BaseModel):
     name: str
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+
+class PoolStats(BaseModel):
+    pool_class: str
+    size: int | None
+    checked_out: int | None
+    overflow: int | None
+    checkouts: int
+    checkins: int
+    connects: int
+    invalidations: int
+    checkout_timeouts: int
+    wait_time_ms_total: float
+    wait_time_histogram: dict[str, int]
+
+class TokenCacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+
+class RoomLockStats(BaseModel):
+    shards: int
+    acquisitions: int
+    contended: int
+    timeouts: int
+    wait_time_ms_total: float
+    wait_time_histogram: dict[str, int]
+    db_lock_time_ms_total: float
+
+class RouteQueryStats(BaseModel):
+    requests: int
+    statements: int
+    statements_per_request: float
+    max_statements: int
+    db_time_ms_total: float
+    db_time_ms_per_request: float
+    max_db_time_ms: float
+    rows: int
+    # 0: no budget
+    budget: int
+    over_budget: int
+
+class RoomOccupancy(BaseModel):
+    room_number: int
+    # Run-length encoded booking status ids of the nights: [status_id, nights, status_id, nights, ...]. 0 is a free night.
+    runs: list[int]
+
+class Occupancy(BaseModel):
+    start: date
+    days: int
+    # Names of the status ids used in the runs
+    statuses: dict[int, str]
+    rooms: list[RoomOccupancy]
@@ -0,0 +1,280 @@
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from dotenv import load_dotenv
+import numpy as np
+from sqlalchemy import select, Select
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.orm.session import Session
+from . import models
+
+# Load environmental variables from .env
+load_dotenv()
+# Seconds after which the rows added by other worker processes are read into the index
+SEARCH_INDEX_MAX_AGE: float = float(os.getenv("SEARCH_INDEX_MAX_AGE", "60"))
+# Seconds after which the index is rebuilt, which picks up the rows updated by other worker processes
+SEARCH_INDEX_REBUILD_AGE: float = float(os.getenv("SEARCH_INDEX_REBUILD_AGE", "3600"))
+# Share of the trigrams of a query that a match must contain. 0.5 lets a word of six letters or more through with one typo.
+SEARCH_MIN_SCORE: float = float(os.getenv("SEARCH_MIN_SCORE", "0.5"))
+# Length limits of a query, in characters
+SEARCH_QUERY_MIN_LENGTH: int = 2
+SEARCH_QUERY_MAX_LENGTH: int = 100
+# Rows read from the database at a time while the index is built
+SEARCH_LOAD_BATCH_SIZE: int = 10000
+# Trigrams found in more than this share of the rows, such as those of a common email domain, are stored as one byte per row
+# rather than as a list of 4-byte ids: that takes less memory, and they are counted with a vector addition.
+SEARCH_DENSE_SHARE: float = 0.25
+
+WORD_PATTERN: re.Pattern = re.compile(r"\w+")
+# Separators between digits, e.g. in 98-0000 0001, are dropped so that phone numbers are one word
+DIGIT_SEPARATORS: re.Pattern = re.compile(r"(?<=\d)[\s().-]+(?=\d)")
+
+def words(text: str) -> list[str]:
+    '''Returns the lowercase words of the text. An email splits into its parts, and a phone number is one word.'''
+    return WORD_PATTERN.findall(DIGIT_SEPARATORS.sub("", text.lower()))
+
+def trigrams(text: str, prefix: bool = False) -> set[str]:
+    '''
+    Returns the trigrams of the words of the text. Each word is padded with two spaces in front and one after,
+    so that the start and the end of a word are trigrams of their own. With prefix set, the end isn't marked,
+    and a query matches the words that it is the beginning of.
+    '''
+    result: set[str] = set()
+    for word in words(text):
+        padded: str = f"  {word}" if prefix else f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+class TrigramTable:
+    '''
+    The trigrams of the rows of a search index. Each trigram maps to the ids of its rows (4 bytes per id),
+    or, for the most common trigrams, to a byte per row. The text of each row is kept to rank the matches.
+    A row is in the postings of a trigram at most once, so that a count is at most the number of query trigrams.
+    '''
+    def __init__(self):
+        # id -> indexed text
+        self.texts: dict[int, str] = {}
+        # trigram -> ids of the rows that contain it
+        self.postings: dict[str, array] = {}
+        # trigram -> ids in its postings whose row no longer contains it, since it was updated. They aren't counted,
+        # and are dropped from the postings by the next rebuild.
+        self.stale: dict[str, set[int]] = {}
+        # Common trigram -> byte per id, 1 for the rows that contain it
+        self.dense: dict[str, bytearray] = {}
+        self.max_id: int = 0
+
+    def add(self, id: int, text: str) -> None:
+        '''Adds or updates a row. An update only adds the trigrams that the row didn't contain, and marks the ones it lost as stale.'''
+        old: str|None = self.texts.get(id)
+        old_trigrams: set[str] = trigrams(old) if old is not None else set()
+        new_trigrams: set[str] = trigrams(text)
+        self.texts[id] = text
+        for trigram in new_trigrams - old_trigrams:
+            dense: bytearray|None = self.dense.get(trigram)
+            if dense is not None:
+                if id >= len(dense):
+                    dense.extend(bytes(id + 1 - len(dense)))
+                dense[id] = 1
+                continue
+            stale: set[int]|None = self.stale.get(trigram)
+            if stale is not None and id in stale:
+                # The row is still in the postings from before
+                stale.discard(id)
+                continue
+            postings: array|None = self.postings.get(trigram)
+            if postings is None:
+                postings = self.postings[trigram] = array("i")
+            postings.append(id)
+        for trigram in old_trigrams - new_trigrams:
+            dense: bytearray|None = self.dense.get(trigram)
+            if dense is not None:
+                dense[id] = 0
+            else:
+                self.stale.setdefault(trigram, set()).add(id)
+        self.max_id = max(self.max_id, id)
+
+    def compact(self) -> None:
+        '''Stores the trigrams found in more than SEARCH_DENSE_SHARE of the rows as a byte per row.'''
+        for trigram in [trigram for trigram, ids in self.postings.items() if len(ids) > len(self.texts) * SEARCH_DENSE_SHARE]:
+            dense: np.ndarray = np.zeros(self.max_id + 1, dtype=np.uint8)
+            dense[np.frombuffer(self.postings.pop(trigram), dtype=np.int32)] = 1
+            dense[list(self.stale.pop(trigram, ()))] = 0
+            self.dense[trigram] = bytearray(dense.tobytes())
+
+    def counts(self, query_trigrams: set[str]) -> np.ndarray|None:
+        '''Returns the number of the query trigrams that each row contains, by id, or None if no row contains any.'''
+        postings: list[array] = [self.postings[trigram] for trigram in query_trigrams if trigram in self.postings]
+        dense: list[bytearray] = [self.dense[trigram] for trigram in query_trigrams if trigram in self.dense]
+        if not postings and not dense:
+            return None
+        # The arrays are read in place
+        counts: np.ndarray = np.zeros(self.max_id + 1, dtype=np.int64)
+        if postings:
+            counts += np.bincount(np.concatenate([np.frombuffer(ids, dtype=np.int32) for ids in postings]), minlength=self.max_id + 1)
+            for trigram in query_trigrams:
+                stale: set[int]|None = self.stale.get(trigram)
+                if stale:
+                    counts[list(stale)] -= 1
+        if dense:
+            dense_counts: np.ndarray = np.zeros(self.max_id + 1, dtype=np.uint8)
+            for rows in dense:
+                dense_counts[:len(rows)] += np.frombuffer(rows, dtype=np.uint8)
+            counts += dense_counts
+        return counts
+
+class SearchIndex:
+    '''
+    Process-wide in-memory trigram index of the names, phone numbers and emails of a table, such as Customers.
+    Like the room availability index, it is built from the database on first use, kept up to date by the crud write methods
+    and refreshed from the database: the rows added by other worker processes are read every SEARCH_INDEX_MAX_AGE seconds,
+    and the index is rebuilt every SEARCH_INDEX_REBUILD_AGE seconds. A rebuild is made by the search that finds the index old;
+    the other searches keep using the current index meanwhile.
+
+    A query matches the rows that contain at least SEARCH_MIN_SCORE of its trigrams, which finds the rows that
+    a word of the query is the beginning of, as well as words with a typo. The matches are ranked by that share.
+    The lock is never held while the database is read, so that it can't stop the event loop in async mode.
+    '''
+    def __init__(self, key: InstrumentedAttribute, fields: tuple[InstrumentedAttribute, ...], max_age: float, rebuild_age: float):
+        self.key: InstrumentedAttribute = key
+        self.fields: tuple[InstrumentedAttribute, ...] = fields
+        self.max_age: float = max_age
+        self.rebuild_age: float = rebuild_age
+        self.__lock = threading.RLock()
+        self.__table: TrigramTable|None = None
+        self.__loaded_at: float|None = None
+        self.__refreshed_at: float = 0.0
+        self.__rebuilding: bool = False
+        # Rows written while a build reads the table, which the build adds before it replaces the current table
+        self.__build_writes: list[dict[int, str]] = []
+
+    def __select(self, after: int) -> Select:
+        return select(self.key, *self.fields).where(self.key > after).order_by(self.key).execution_options(yield_per=SEARCH_LOAD_BATCH_SIZE)
+
+    def load(self, db: Session) -> None:
+        '''Builds the index from the database and replaces the current one.'''
+        writes: dict[int, str] = {}
+        with self.__lock:
+            self.__build_writes.append(writes)
+        try:
+            table: TrigramTable = TrigramTable()
+            for row in db.execute(self.__select(0)):
+                table.add(row[0], self.text(*row[1:]))
+            table.compact()
+            with self.__lock:
+                for id, text in writes.items():
+                    table.add(id, text)
+                self.__table = table
+                self.__loaded_at = self.__refreshed_at = time.monotonic()
+        finally:
+            with self.__lock:
+                self.__build_writes.remove(writes)
+
+    def __refresh(self, db: Session, table: TrigramTable) -> None:
+        '''Reads the rows added since the index was built or last refreshed.'''
+        self.__refreshed_at = time.monotonic()
+        rows: list = db.execute(self.__select(table.max_id)).fetchall()
+        with self.__lock:
+            for row in rows:
+                if row[0] not in table.texts:
+                    table.add(row[0], self.text(*row[1:]))
+
+    def __ensure_loaded(self, db: Session) -> TrigramTable:
+        '''Returns the current table, after building, rebuilding or refreshing it as needed.'''
+        with self.__lock:
+            table: TrigramTable|None = self.__table if self.__loaded_at is not None else None
+            now: float = time.monotonic()
+            rebuild: bool = table is not None and not self.__rebuilding and now - self.__loaded_at > self.rebuild_age
+            if rebuild:
+                self.__rebuilding = True
+        if table is None:
+            self.load(db)
+            return self.__table
+        if rebuild:
+            try:
+                self.load(db)
+            finally:
+                self.__rebuilding = False
+            return self.__table
+        if now - self.__refreshed_at > self.max_age:
+            self.__refresh(db, table)
+        return table
+
+    def invalidate(self) -> None:
+        '''Drops the index. It is rebuilt on the next search.'''
+        with self.__lock:
+            self.__table = None
+            self.__loaded_at = None
+
+    @staticmethod
+    def text(*values: str|int|None) -> str:
+        '''Returns the indexed text of the field values of a row.'''
+        return " ".join(str(value) for value in values if value is not None)
+
+    def set(self, id: int, values: dict) -> None:
+        '''Adds or updates a row, from the values of its fields by name, such as CustomerBase.model_dump(). Ignored while the index isn't loaded.'''
+        text: str = self.text(*(values.get(field.key) for field in self.fields))
+        with self.__lock:
+            for writes in self.__build_writes:
+                writes[id] = text
+            if self.__table is not None and self.__table.texts.get(id) != text:
+                self.__table.add(id, text)
+
+    def search(self, db: Session, query: str, skip: int, limit: int) -> list[int]:
+        '''
+        Returns the ids of the rows that match the query, best match first, from skip up to limit of them.
+        Rows with the same score are ordered by id.
+
+        Raises:
+            ValueError: If the query is shorter than SEARCH_QUERY_MIN_LENGTH or longer than SEARCH_QUERY_MAX_LENGTH characters.
+        '''
+        query = query.strip()
+        if not SEARCH_QUERY_MIN_LENGTH <= len(query) <= SEARCH_QUERY_MAX_LENGTH:
+            raise ValueError(f"The query should be {SEARCH_QUERY_MIN_LENGTH} to {SEARCH_QUERY_MAX_LENGTH} characters long.")
+        query_trigrams: set[str] = trigrams(query, prefix=True)
+        if not query_trigrams:
+            return []
+        table: TrigramTable = self.__ensure_loaded(db)
+        wanted: int = skip + limit
+        with self.__lock:
+            counts: np.ndarray|None = table.counts(query_trigrams)
+            if counts is None:
+                return []
+            # Rank the wanted rows with the most trigrams (and of the rows tied with the last of them, those with the lowest ids)
+            # on their current text. A count is at most the number of query trigrams, so a histogram of the counts
+            # gives the lowest count that is ranked.
+            minimum: int = math.ceil(len(query_trigrams) * SEARCH_MIN_SCORE)
+            # rows_from_count[c] is the number of rows with c trigrams or more
+            rows_from_count: np.ndarray = np.cumsum(np.bincount(counts)[::-1])[::-1]
+            enough: np.ndarray = np.flatnonzero(rows_from_count >= wanted)
+            threshold: int = max(minimum, int(enough[-1]) if len(enough) else 0)
+            above: np.ndarray = np.flatnonzero(counts > threshold)
+            candidates: np.ndarray = np.concatenate([above, np.flatnonzero(counts == threshold)[:max(wanted - len(above), 0)]])
+            texts: list[tuple[int, str]] = [(int(id), table.texts[int(id)]) for id in candidates if int(id) in table.texts]
+        query_words: list[str] = words(query)
+        ranked: list[tuple[float, bool, int]] = []
+        for id, text in texts:
+            score: float = len(query_trigrams & trigrams(text)) / len(query_trigrams)
+            if score >= SEARCH_MIN_SCORE:
+                text_words: list[str] = words(text)
+                prefix: bool = all(any(word.startswith(query_word) for word in text_words) for query_word in query_words)
+                ranked.append((-score, not prefix, id))
+        ranked.sort()
+        return [id for _, _, id in ranked[skip:wanted]]
+
+    def stats(self) -> dict:
+        '''Returns the size of the index.'''
+        with self.__lock:
+            table: TrigramTable = self.__table or TrigramTable()
+            return {"rows": len(table.texts), "trigrams": len(table.postings) + len(table.dense), "dense_trigrams": len(table.dense),
+                    "postings": sum(len(ids) for ids in table.postings.values()), "stale_postings": sum(len(ids) for ids in table.stale.values())}
+
+SEARCH_FIELDS_CUSTOMER: tuple[InstrumentedAttribute, ...] = (models.Customer.first_name, models.Customer.middle_name, models.Customer.last_name,
+                                                              models.Customer.phone, models.Customer.email)
+SEARCH_FIELDS_EMPLOYEE: tuple[InstrumentedAttribute, ...] = (models.Employee.first_name, models.Employee.middle_name, models.Employee.last_name,
+                                                              models.Employee.phone, models.Employee.email)
+
+customer_search: SearchIndex = SearchIndex(models.Customer.customer_id, SEARCH_FIELDS_CUSTOMER, SEARCH_INDEX_MAX_AGE, SEARCH_INDEX_REBUILD_AGE)
+employee_search: SearchIndex = SearchIndex(models.Employee.emp_id, SEARCH_FIELDS_EMPLOYEE, SEARCH_INDEX_MAX_AGE, SEARCH_INDEX_REBUILD_AGE)
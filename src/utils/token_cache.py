@@ -0,0 +1,85 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environmental variables from .env
+load_dotenv()
+# Maximum number of verified tokens kept in memory
+TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+
+class TokenCache:
+    '''
+    Bounded LRU cache of verified JWT claims, keyed by the SHA-256 digest of the token.
+    An entry is dropped when its token expires, when the cache is full and it is the least recently used entry,
+    or when the entries of its employee are evicted.
+    '''
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self.__lock = threading.Lock()
+        # token digest -> (expiry timestamp, claims)
+        self.__entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        # emp_id -> token digests
+        self.__by_employee: dict[int, set[str]] = {}
+
+    @staticmethod
+    def __key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def __remove(self, key: str) -> None:
+        '''Removes an entry. The caller must hold the lock.'''
+        _, claims = self.__entries.pop(key)
+        keys: set[str]|None = self.__by_employee.get(claims["emp_id"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.__by_employee[claims["emp_id"]]
+
+    def get(self, token: str) -> dict|None:
+        '''Returns the cached claims of the token, or None if the token isn't cached or has expired.'''
+        key: str = self.__key(token)
+        with self.__lock:
+            entry: tuple[float, dict]|None = self.__entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    self.__remove(key)
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, token: str, claims: dict, expires_at: float) -> None:
+        '''
+        Caches the verified claims of the token until expires_at.
+
+        Args:
+            * token: (str) The encoded JWT.
+            * claims: (dict) The claims returned to the endpoints. It must contain emp_id.
+            * expires_at: (float) The exp claim of the token as a UNIX timestamp.
+        '''
+        key: str = self.__key(token)
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            self.__entries[key] = (expires_at, dict(claims))
+            self.__by_employee.setdefault(claims["emp_id"], set()).add(key)
+            while len(self.__entries) > self.max_size:
+                self.__remove(next(iter(self.__entries)))
+
+    def evict_employee(self, emp_id: int) -> None:
+        '''Drops the cached tokens of the employee, so that they are verified again on their next use.'''
+        with self.__lock:
+            for key in list(self.__by_employee.get(emp_id, ())):
+                self.__remove(key)
+
+    def stats(self) -> dict:
+        '''Returns the size and the hit and miss counters of the cache.'''
+        with self.__lock:
+            return {"size": len(self.__entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+token_cache: TokenCache = TokenCache(TOKEN_CACHE_SIZE)
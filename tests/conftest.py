@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+from datetime import date, datetime
+
+import pytest
+
+# The API modules import each other as top-level packages from src/ (e.g. `from utils import crud`)
+# and build their engine from DATABASE_URL at import time, so configure both before importing them.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "cloudbeds-test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+# Keep the government ID images of the tests out of the working tree
+os.environ.setdefault("BLOB_STORE_PATH", os.path.join(tempfile.mkdtemp(), "blobs"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from utils import models, lookup_cache
+from utils.availability import availability_index
+from utils.booking_ids import booking_id_allocator
+from utils.search_index import customer_search, employee_search
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    # Seed the lookup tables the same way create-tables-1.sql does
+    session.add_all([models.BookingStatus(name=name) for name in ["Unconfirmed", "Booked", "Ongoing", "Complete", "Cancelled"]])
+    session.add_all([models.GovtIdType(name=name) for name in ["AADHAR", "PAN", "Voter ID", "Driving License", "Passport"]])
+    session.add_all([models.RoomType(room_type=name) for name in ["Standard", "Delux", "Club", "Suite"]])
+    session.add_all([models.RoomState(room_state=name) for name in ["Booked", "Available", "Maintenance"]])
+    session.add(models.Employee(emp_id=1001, first_name="Front", last_name="Desk", email="desk@example.com",
+                                phone="9000000000", is_active=True, password_hash="x"))
+    session.add(models.EmployeeAddress(emp_id=1001, first_line="1 Main Rd", second_line=None, landmark=None,
+                                       district="Central", state="KA", pin="560001", address_type="Permanent"))
+    session.add(models.BookingIdGenerator(last_booking_id=1001))
+    session.commit()
+    # The lookup cache, the availability and search indexes and the booking ID blocks are process-wide; make sure they don't carry rows over from another test's database
+    lookup_cache.invalidate_all()
+    availability_index.invalidate()
+    booking_id_allocator.reset()
+    customer_search.invalidate()
+    employee_search.invalidate()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def query_counter(engine):
+    '''Counts the statements sent to the database while the returned list is being collected.'''
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def client(db):
+    '''API client on the test database, authenticated as the seeded employee.'''
+    from fastapi.testclient import TestClient
+    import cloudbeds
+    cloudbeds.api.dependency_overrides[cloudbeds.get_db] = lambda: db
+    cloudbeds.api.dependency_overrides[cloudbeds.get_current_employee] = lambda: {"email": "desk@example.com", "emp_id": 1001, "roles": []}
+    yield TestClient(cloudbeds.api)
+    cloudbeds.api.dependency_overrides.clear()
+
+
+def seed_bookings(db, count: int, start: int = 0) -> None:
+    '''Adds `count` customers, rooms and one booking for each of them.'''
+    for i in range(start, start + count):
+        customer = models.Customer(first_name=f"Guest{i}", middle_name=None, last_name="Test",
+                                   email=f"guest{i}@example.com", phone=f"98{i:08d}")
+        customer.addresses.append(models.CustomerAddress(address_type="Permanent", first_line=f"{i} Lake View",
+                                                         second_line="Block A", landmark=None, district="Central",
+                                                         state="KA", pin="560001"))
+        room = models.Room(room_number=100 + i, r_type_id=1, state_id=2)
+        db.add_all([customer, room])
+        db.flush()
+        db.add(models.Booking(booking_id=f"B{1002 + i}", booked_on=datetime(2024, 1, 1), checkin=date(2024, 2, 1),
+                              checkout=date(2024, 2, 3), govt_id_num=f"ID{i}", exp_date=None, comments=None,
+                              booking_status_id=2, customer_id=customer.customer_id, room_id=room.room_id,
+                              govt_id_type_id=1, emp_id=1001))
+    # Keep the booking ID allocator clear of the seeded IDs
+    db.query(models.BookingIdGenerator).update({"last_booking_id": 1001 + start + count})
+    db.commit()
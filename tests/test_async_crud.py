@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from utils import crud, models
+from utils.async_crud import AsyncCrud, run_sync
+from .conftest import seed_bookings
+
+
+def test_async_crud_with_session(db):
+    seed_bookings(db, 3)
+
+    async def list_bookings():
+        booking: AsyncCrud = AsyncCrud(crud.Booking, db)
+        bookings = await booking.list_bookings(0, 2)
+        return bookings, booking.next_cursor
+
+    bookings, next_cursor = asyncio.run(list_bookings())
+    assert [booking.booking_id for booking in bookings] == ["B1002", "B1003"]
+    assert next_cursor is not None
+
+
+def test_async_crud_with_async_session(db, tmp_path):
+    pytest.importorskip("aiosqlite")
+    pytest.importorskip("greenlet")
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    # Seed a file database through a sync session, then read it back through the asyncio driver
+    sync_engine = create_engine(f"sqlite:///{tmp_path}/cloudbeds.db")
+    models.Base.metadata.create_all(bind=sync_engine)
+    with sessionmaker(bind=sync_engine)() as session:
+        session.add_all([models.RoomType(room_type="Standard"), models.RoomState(room_state="Available")])
+        session.commit()
+    sync_engine.dispose()
+
+    async def add_and_list_rooms():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/cloudbeds.db")
+        async with async_sessionmaker(bind=async_engine, autoflush=False)() as async_db:
+            room: AsyncCrud = AsyncCrud(crud.Room, async_db)
+            await room.add_room(room_number=101, room_type="Standard", room_state="Available")
+            rooms = await room.list_rooms(0, 10)
+            count = await run_sync(async_db, lambda session: session.query(models.Room).count())
+        await async_engine.dispose()
+        return rooms, count
+
+    rooms, count = asyncio.run(add_and_list_rooms())
+    assert [r.room_number for r in rooms] == [101]
+    assert count == 1
@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+
+from utils import crud
+from utils.availability import RoomAvailabilityIndex, RoomIntervals
+from .conftest import seed_bookings
+
+
+def test_room_intervals_are_half_open():
+    intervals = RoomIntervals()
+    intervals.add(date(2024, 2, 10), date(2024, 2, 12), "B2")
+    intervals.add(date(2024, 2, 1), date(2024, 2, 3), "B1")
+    # Checking in on the checkout date of the previous booking is allowed
+    assert not intervals.overlaps(date(2024, 2, 3), date(2024, 2, 10))
+    assert intervals.overlaps(date(2024, 2, 2), date(2024, 2, 4))
+    assert intervals.overlaps(date(2024, 1, 1), date(2024, 3, 1))
+    assert not intervals.overlaps(date(2024, 2, 11), date(2024, 2, 13), exclude_booking_id="B2")
+    intervals.remove(date(2024, 2, 10), "B2")
+    assert not intervals.overlaps(date(2024, 2, 11), date(2024, 2, 13))
+
+
+def test_available_rooms_follow_booking_writes(db, query_counter):
+    seed_bookings(db, 3)
+    room = crud.Room(db)
+    room.add_room(room_number=200, room_type="Standard", room_state="Available")
+    assert [r.room_number for r in room.list_available_rooms(date(2024, 2, 2), date(2024, 2, 5))] == [200]
+    # The index answers without querying the database
+    query_counter.clear()
+    assert [r.room_number for r in room.list_available_rooms(date(2024, 2, 3), date(2024, 2, 5))] == [100, 101, 102, 200]
+    assert query_counter == []
+
+    crud.Booking(db).cancel_booking("B1002")
+    assert [r.room_number for r in room.list_available_rooms(date(2024, 2, 1), date(2024, 2, 3))] == [100, 200]
+
+    room.delete_room("200")
+    with pytest.raises(ValueError):
+        room.list_available_rooms(date(2024, 2, 5), date(2024, 2, 5))
+    assert [r.room_number for r in room.list_available_rooms(date(2024, 2, 1), date(2024, 2, 3))] == [100]
+
+
+
+def test_available_rooms_skip_rooms_that_are_not_in_the_available_state(db):
+    seed_bookings(db, 1)
+    room = crud.Room(db)
+    room.add_room(room_number=200, room_type="Standard", room_state="Available")
+    room.add_room(room_number=201, room_type="Standard", room_state="Maintenance")
+    assert [r.room_number for r in room.list_available_rooms(date(2024, 3, 1), date(2024, 3, 3))] == [100, 200]
+    # A room that goes into maintenance stops being offered, and comes back once it is available again
+    room.update_room(room_number=200, room_type="Standard", room_state="Maintenance")
+    room.update_room(room_number=201, room_type="Standard", room_state="Available")
+    rooms = room.list_available_rooms(date(2024, 3, 1), date(2024, 3, 3))
+    assert [(r.room_number, r.room_state) for r in rooms] == [(100, "Available"), (201, "Available")]
+
+
+def test_writes_made_during_a_build_are_kept(db, monkeypatch):
+    seed_bookings(db, 2)
+    index = RoomAvailabilityIndex(max_age=300)
+    index.load(db)
+    execute = db.execute
+
+    def execute_then_write(*args, **kwargs):
+        result = execute(*args, **kwargs)
+        # A cancellation and a new room, written by other requests while the build reads the tables
+        index.remove_booking("B1002")
+        index.set_room(999, 300, 1, 2)
+        return result
+
+    monkeypatch.setattr(db, "execute", execute_then_write)
+    index.load(db)
+    monkeypatch.undo()
+    assert [room[0] for room in index.free_rooms(db, date(2024, 2, 1), date(2024, 2, 3))] == [100, 300]
@@ -0,0 +1,53 @@
+import copy
+import importlib.util
+import os
+
+import pytest
+
+# benchmarks/ isn't a package; load the suite from its path
+spec = importlib.util.spec_from_file_location("benchmark_suite", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "suite.py"))
+suite = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(suite)
+
+
+def results(**overrides) -> dict:
+    result = suite.summarize("api", "/cust/", [10.0] * 90 + [20.0] * 10, 0, 1.0)
+    document = {"sizes": {"customers": 10}, "environment": {"database": "sqlite"}, "results": {"api:/cust/": vars(result)}}
+    document["results"]["api:/cust/"].update(overrides)
+    return document
+
+
+def test_percentile():
+    values = [float(value) for value in range(1, 101)]
+    assert suite.percentile(values, 0.50) == 50.0
+    assert suite.percentile(values, 0.95) == 95.0
+    assert suite.percentile(values, 0.99) == 99.0
+    assert suite.percentile([3.0], 0.99) == 3.0
+
+
+def test_summarize():
+    result = suite.summarize("api", "/cust/", [10.0] * 90 + [20.0] * 10, 1, 2.0)
+    assert (result.requests, result.errors, result.throughput_rps) == (100, 1, 50.0)
+    assert (result.p50_ms, result.p95_ms, result.p99_ms) == (10.0, 20.0, 20.0)
+
+
+def test_compare_flags_slower_latency_and_lower_throughput():
+    baseline = results()
+    current = results(p50_ms=15.0, throughput_rps=60.0)
+    regressions = suite.compare(baseline, current, threshold=0.1, min_delta_ms=1.0)
+    assert {(regression.name, regression.metric) for regression in regressions} == {("api:/cust/", "p50_ms"), ("api:/cust/", "throughput_rps")}
+    assert suite.report(baseline, current, 0.1, 1.0) == 1
+
+
+def test_compare_ignores_noise_and_improvements():
+    baseline = results()
+    # Within the threshold, below the minimum delta, or faster
+    for current in (results(p50_ms=10.5), results(p50_ms=5.0, throughput_rps=200.0), copy.deepcopy(baseline)):
+        assert suite.compare(baseline, current, threshold=0.1, min_delta_ms=1.0) == []
+    assert suite.compare(results(p50_ms=0.2), results(p50_ms=0.5), threshold=0.1, min_delta_ms=1.0) == []
+
+
+def test_compare_skips_results_missing_from_either_run():
+    baseline = results()
+    current = {**results(), "results": {"crud:Customer.get_customer": results()["results"]["api:/cust/"]}}
+    assert suite.compare(baseline, current, threshold=0.1, min_delta_ms=1.0) == []
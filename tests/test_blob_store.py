@@ -0,0 +1,61 @@
+import os
+from datetime import date
+
+import pytest
+from utils import crud
+from utils.blob_store import LocalBlobStore, BLOB_MAX_SIZE
+from .conftest import seed_bookings
+from .test_bulk_booking import booking_in
+
+PNG: bytes = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+def test_store_is_content_addressed(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    info = store.put(iter([PNG[:100], PNG[100:]]))
+    assert (info.size, info.media_type) == (len(PNG), "image/png")
+    assert store.put(iter([PNG])).key == info.key
+    assert b"".join(store.open(info.key)) == PNG
+    assert store.path(info.key) == os.path.join(str(tmp_path), info.key[:2], info.key[2:4], info.key)
+    with pytest.raises(ValueError):
+        store.path("../" + info.key)
+
+
+def test_rejected_uploads_leave_nothing_behind(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    with pytest.raises(ValueError, match="larger"):
+        store.put(iter([PNG, PNG]), max_size=len(PNG) + 1)
+    with pytest.raises(ValueError, match="JPEG, PNG"):
+        store.put(iter([b"MZ not an image"]))
+    assert os.listdir(store.temp_dir) == []
+
+
+def test_upload_book_and_download(db, client):
+    seed_bookings(db, 1)
+    response = client.post("/booking/govt_id_image/", content=PNG, headers={"Content-Type": "image/png"})
+    assert response.status_code == 200
+    key = response.json()["key"]
+
+    payload = booking_in(100, date(2024, 2, 3), date(2024, 2, 5))
+    payload.booking.govt_id_image = key
+    booking_id = crud.Booking(db).add_booking(payload).booking_id
+    assert crud.Booking(db).list_bookings(0, 10, booking_id=booking_id)[0].booking.govt_id_image == key
+
+    response = client.get(f"/booking/govt_id_image/{booking_id}")
+    assert (response.status_code, response.content, response.headers["content-type"]) == (200, PNG, "image/png")
+    assert response.headers["ETag"] == f'"{key}"'
+    response = client.get(f"/booking/govt_id_image/{booking_id}", headers={"Range": "bytes=8-11"})
+    assert (response.status_code, response.content) == (206, PNG[8:12])
+    response = client.get(f"/booking/govt_id_image/{booking_id}", headers={"If-None-Match": f'"{key}"'})
+    assert response.status_code == 304
+    # B1002 has no image
+    assert client.get("/booking/govt_id_image/B1002").status_code == 404
+
+
+def test_upload_limits(db, client):
+    assert client.post("/booking/govt_id_image/", content=b"x" * (BLOB_MAX_SIZE + 1)).status_code == 413
+    assert client.post("/booking/govt_id_image/", content=b"plain text").status_code == 400
+    payload = booking_in(100, date(2024, 2, 3), date(2024, 2, 5))
+    payload.booking.govt_id_image = "0" * 64
+    with pytest.raises(ValueError, match="Upload it"):
+        crud.Booking(db).add_booking(payload)
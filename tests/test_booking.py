@@ -0,0 +1,77 @@
+from datetime import date
+import pytest
+from utils import crud, models
+from utils.availability import availability_index
+from .conftest import seed_bookings
+
+
+def test_list_bookings_payload(db):
+    seed_bookings(db, 2)
+    bookings = crud.Booking(db).list_bookings(skip=0, limit=10)
+    assert [booking.booking_id for booking in bookings] == ["B1002", "B1003"]
+    assert bookings[0].customer.customer_details.email == "guest0@example.com"
+    assert bookings[0].customer.customer_address.first_line == "0 Lake View"
+    assert bookings[0].booking.status == "Booked"
+    assert bookings[0].booking.government_id_type == "AADHAR"
+    assert bookings[0].booking.room_num == 100
+
+
+def test_list_bookings_by_booking_id(db):
+    seed_bookings(db, 3)
+    bookings = crud.Booking(db).list_bookings(skip=0, limit=10, booking_id="B1003")
+    assert len(bookings) == 1
+    assert bookings[0].customer.customer_id == 2
+
+
+def test_list_bookings_query_count_is_constant(db, query_counter):
+    seed_bookings(db, 20)
+    cb_booking = crud.Booking(db)
+
+    query_counter.clear()
+    assert len(cb_booking.list_bookings(skip=0, limit=1)) == 1
+    small_page = len(query_counter)
+
+    db.expunge_all()
+    query_counter.clear()
+    assert len(cb_booking.list_bookings(skip=0, limit=20)) == 20
+    assert len(query_counter) == small_page
+
+
+def test_list_bookings_cursor_walks_all_pages(db):
+    seed_bookings(db, 7)
+    expected = [booking.booking_id for booking in crud.Booking(db).list_bookings(skip=0, limit=100)]
+
+    seen, cursor = [], None
+    while True:
+        cb_booking = crud.Booking(db)
+        page = cb_booking.list_bookings(skip=0, limit=3, cursor=cursor)
+        seen.extend(booking.booking_id for booking in page)
+        cursor = cb_booking.next_cursor
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_list_bookings_invalid_cursor(db):
+    with pytest.raises(ValueError):
+        crud.Booking(db).list_bookings(skip=0, limit=3, cursor="not-a-cursor")
+
+
+def test_add_booking_is_one_transaction(db, query_counter):
+    from .test_bulk_booking import booking_in
+    seed_bookings(db, 1)
+    cb_booking = crud.Booking(db)
+    # Warm the lookup caches and the availability index
+    cb_booking.get_supported_govt_id_types()
+    availability_index.load(db)
+    query_counter.clear()
+    result = cb_booking.add_booking(booking_in(100, date(2024, 2, 3), date(2024, 2, 5)))
+    assert result.booking_id == "B1003"
+    # The validation query, the reservation of a block of booking IDs (UPDATE and SELECT), the customer, the address and the booking
+    assert len(query_counter) == 6
+    query_counter.clear()
+    assert cb_booking.add_booking(booking_in(100, date(2024, 2, 5), date(2024, 2, 6), i=1)).booking_id == "B1004"
+    assert len(query_counter) == 4
+    with pytest.raises(ValueError):
+        cb_booking.add_booking(booking_in(100, date(2024, 2, 4), date(2024, 2, 6), i=2))
+    assert db.query(models.Customer).filter(models.Customer.email == "group2@example.com").count() == 0
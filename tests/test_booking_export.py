@@ -0,0 +1,31 @@
+import csv
+import io
+import json
+from datetime import date
+
+import pytest
+
+from utils import crud
+from .conftest import seed_bookings
+
+
+def test_export_streams_ndjson_in_batches(db, monkeypatch):
+    monkeypatch.setattr(crud, "EXPORT_BATCH_SIZE", 2)
+    seed_bookings(db, 5)
+    chunks = list(crud.Booking(db).export_bookings("ndjson", checkin_from=date(2024, 2, 1), status="booked"))
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [row["booking_id"] for row in rows] == ["B1002", "B1003", "B1004", "B1005", "B1006"]
+    assert rows[0]["status"] == "Booked" and rows[0]["room_type"] == "Standard" and rows[0]["checkin"] == "2024-02-01"
+    assert "govt_id_img" not in rows[0]
+
+
+def test_export_csv_filters(db):
+    seed_bookings(db, 2)
+    cb_booking = crud.Booking(db)
+    cb_booking.cancel_booking("B1002")
+    rows = list(csv.DictReader(io.StringIO("".join(cb_booking.export_bookings("csv", status="Cancelled")))))
+    assert [(row["booking_id"], row["email"]) for row in rows] == [("B1002", "guest0@example.com")]
+    assert "".join(cb_booking.export_bookings("csv", checkin_to=date(2024, 1, 31))).count("\n") == 1
+    with pytest.raises(ValueError):
+        cb_booking.export_bookings("xml")
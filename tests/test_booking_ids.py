@@ -0,0 +1,17 @@
+from utils import models
+from utils.booking_ids import BookingIdAllocator
+
+
+def test_workers_reserve_disjoint_blocks(db, engine, query_counter):
+    worker_a, worker_b = BookingIdAllocator(block_size=3), BookingIdAllocator(block_size=3)
+    query_counter.clear()
+    ids_a = worker_a.allocate(engine, 2)
+    ids_b = worker_b.allocate(engine)
+    ids_a += worker_a.allocate(engine, 2)
+    assert ids_a == ["B1002", "B1003", "B1004", "B1008"]
+    assert ids_b == ["B1005"]
+    # One UPDATE and one SELECT per reserved block, none for the IDs handed out from memory
+    assert len(query_counter) == 6
+    # A batch larger than a block is reserved at once
+    assert worker_b.allocate(engine, 5) == ["B1006", "B1007", "B1011", "B1012", "B1013"]
+    assert db.query(models.BookingIdGenerator.last_booking_id).scalar() == 1013
@@ -0,0 +1,56 @@
+from datetime import date, datetime
+
+import pytest
+
+from utils import crud, models, schemas
+from .conftest import seed_bookings
+
+
+def booking_in(room_num: int, checkin: date, checkout: date, i: int = 0) -> schemas.BookingIn:
+    return schemas.BookingIn(
+        customer=schemas.CustomerIn(
+            customer_details=schemas.CustomerBase(first_name="Group", middle_name=None, last_name=f"Guest{i}",
+                                                  email=f"group{i}@example.com", phone=f"97{i:08d}"),
+            customer_address=schemas.CustomerAddressBase(first_line="1 Hill Rd", second_line="Block B", landmark=None,
+                                                         district="Central", state="KA", pin="560001", address_type="Permanent")),
+        booking=schemas.BookingBase(booked_on=datetime(2024, 1, 1), checkin=checkin, checkout=checkout,
+                                    government_id_type="PAN", government_id_number=f"PAN{i}", room_num=room_num,
+                                    comments=None, emp_id=1001))
+
+
+def test_bulk_booking_is_all_or_nothing(db, query_counter):
+    seed_bookings(db, 2)
+    payload = schemas.BulkBookingIn(bookings=[
+        booking_in(100, date(2024, 2, 2), date(2024, 2, 4)),
+        booking_in(999, date(2024, 2, 2), date(2024, 2, 4)),
+        booking_in(101, date(2024, 2, 3), date(2024, 2, 5)),
+        # Overlaps the previous booking of the batch
+        booking_in(101, date(2024, 2, 4), date(2024, 2, 6)),
+    ])
+    query_counter.clear()
+    with pytest.raises(ValueError) as e:
+        crud.Booking(db).add_bookings(payload)
+    assert "Booking 0: The room is not available" in str(e.value)
+    assert "Booking 1: Room 999 doesn't exist" in str(e.value)
+    assert "Booking 2" not in str(e.value)
+    assert "Booking 3: The room is not available" in str(e.value)
+    assert db.query(models.Booking).count() == 2
+    # The whole batch is validated with a handful of queries, independent of its size
+    assert len([s for s in query_counter if s.lstrip().upper().startswith("SELECT")]) <= 8
+
+
+def test_bulk_booking_partial_mode(db, query_counter):
+    seed_bookings(db, 2)
+    payload = schemas.BulkBookingIn(partial=True, bookings=[
+        booking_in(100, date(2024, 2, 3), date(2024, 2, 5), i=1),
+        booking_in(101, date(2024, 2, 2), date(2024, 2, 5), i=1),
+        booking_in(101, date(2024, 2, 3), date(2024, 2, 5), i=2),
+    ])
+    query_counter.clear()
+    result = crud.Booking(db).add_bookings(payload)
+    assert result.msg == "Partial success"
+    assert [(item.booking_id, item.error) for item in result.results] == [
+        ("B1004", None), (None, "The room is not available for booking."), ("B1005", None)]
+    # Both bookings, and their single new customer, are added with one insert each
+    assert len([s for s in query_counter if s.lstrip().upper().startswith("INSERT")]) == 3
+    assert db.query(models.Customer).filter(models.Customer.email == "group1@example.com").count() == 1
@@ -0,0 +1,46 @@
+from utils import crud, models, schemas
+
+
+def test_add_rooms_reports_conflicts_per_row(db, query_counter):
+    room = crud.Room(db)
+    room.add_room(room_number=101, room_type="Standard", room_state="Available")
+    rooms = crud.Room.parse_rooms_csv(
+        "room_number,room_type,room_state\n"
+        "100,Standard,\n"
+        "101,Suite,Available\n"
+        "102,Penthouse,Available\n"
+        "100,Club,Available\n"
+        "103,Club,Maintenance\n"
+        "104,Suite,Available\n"
+    )
+    query_counter.clear()
+    result = room.add_rooms(rooms, batch_size=2)
+    assert result.count == 3
+    assert [(error.index, error.room_number) for error in result.errors] == [(1, 101), (2, None), (3, 100)]
+    # One existence check and one insert per batch
+    assert len([s for s in query_counter if s.lstrip().upper().startswith("INSERT")]) == 2
+    rooms = room.list_rooms(skip=0, limit=10)
+    assert [(r.room_number, r.room_type, r.room_state) for r in rooms] == [
+        (101, "Standard", "Available"), (100, "Standard", "Available"), (103, "Club", "Maintenance"), (104, "Suite", "Available")]
+
+
+def test_update_rooms_by_range_and_list(db):
+    room = crud.Room(db)
+    room.add_rooms([{"room_number": n, "room_type": "Standard"} for n in range(200, 210)])
+    result = room.update_rooms(schemas.BulkRoomUpdateIn(room_number_from=203, room_number_to=205, room_state="Maintenance"))
+    assert result.count == 3
+    result = room.update_rooms(schemas.BulkRoomUpdateIn(room_numbers=[200, 201, 999, 200, 998, 999], room_type="Suite"), batch_size=2)
+    assert result.count == 2
+    assert [(error.index, error.room_number) for error in result.errors] == [(2, 999), (4, 998), (5, 999)]
+    rooms = {row.room_number: (row.r_type_id, row.state_id) for row in db.query(models.Room)}
+    assert rooms[200] == (4, 2) and rooms[204] == (1, 3) and rooms[206] == (1, 2)
+
+
+def test_csv_upload_size_is_capped(db, client, monkeypatch):
+    content = b"room_number,room_type,room_state\n300,Standard,Available\n"
+    response = client.post("/room/bulk_add/csv/", files={"file": ("rooms.csv", content, "text/csv")})
+    assert response.status_code == 200 and response.json()["count"] == 1
+    monkeypatch.setattr(crud, "ROOM_CSV_MAX_SIZE", len(content) - 1)
+    response = client.post("/room/bulk_add/csv/", files={"file": ("rooms.csv", content, "text/csv")})
+    assert response.status_code == 413
+    assert db.query(models.Room).count() == 1
@@ -0,0 +1,50 @@
+import io
+import json
+
+from utils import crud, models
+from utils.customer_import import read_rows
+from .conftest import seed_bookings
+
+HEADER = "first_name,middle_name,last_name,email,phone,first_line,second_line,landmark,district,state,pin,address_type\n"
+
+
+def csv_row(i: int, email: str|None = None) -> str:
+    return f"New{i},,Guest,{email or f'new{i}@example.com'},96{i:08d},{i} Park St,Block C,,Central,KA,560001,Permanent\n"
+
+
+def test_csv_import_skips_duplicates_and_invalid_rows(db, query_counter):
+    seed_bookings(db, 1)
+    content = HEADER + csv_row(1) + csv_row(2) + csv_row(3, email="guest0@example.com") + csv_row(4, email="not-an-email") + csv_row(1) + csv_row(5)
+    progress = []
+    query_counter.clear()
+    result = crud.Customer(db).import_customers(read_rows(io.StringIO(content), "csv"), chunk_size=2,
+                                                progress=lambda rows, imported: progress.append((rows, imported)))
+    assert (result.rows, result.imported, result.duplicates, result.failed) == (6, 3, 2, 1)
+    assert [error.index for error in result.errors] == [2, 3, 4]
+    assert progress == [(2, 2), (4, 2), (6, 3)]
+    # One duplicate lookup per chunk, and multi-row inserts
+    assert len([s for s in query_counter if s.lstrip().upper().startswith("INSERT")]) == 4
+    assert db.query(models.CustomerAddress).count() == 4
+
+
+def test_jsonl_import_accepts_nested_rows(db):
+    nested = {"customer_details": {"first_name": "Nested", "middle_name": None, "last_name": "Guest", "email": "nested@example.com", "phone": "9500000001"},
+              "customer_address": {"first_line": "2 Park St", "second_line": "Block D", "landmark": None, "district": "Central",
+                                   "state": "KA", "pin": "560001", "address_type": "Permanent"}}
+    content = json.dumps(nested) + "\n\n{not json\n"
+    result = crud.Customer(db).import_customers(read_rows(io.StringIO(content), "jsonl"))
+    assert (result.rows, result.imported, result.failed, result.msg) == (2, 1, 1, "Partial success")
+    assert crud.Customer(db).get_customer("nested@example.com").customer_address.second_line == "Block D"
+
+
+def test_import_treats_emails_that_differ_in_case_as_duplicates(db):
+    content = HEADER + csv_row(1, email="A@x.com") + csv_row(2, email="a@x.com")
+    result = crud.Customer(db).import_customers(read_rows(io.StringIO(content), "csv"))
+    assert (result.rows, result.imported, result.duplicates) == (2, 1, 1)
+    assert [error.index for error in result.errors] == [1]
+    assert db.query(models.Customer).filter(models.Customer.phone == "9600000001").one().email == "a@x.com"
+    # In a later import too: SQLite compares the stored emails case-sensitively
+    result = crud.Customer(db).import_customers(read_rows(io.StringIO(HEADER + csv_row(3, email="A@X.com")), "csv"))
+    assert (result.imported, result.duplicates) == (0, 1)
+    customer = crud.Customer(db)
+    assert customer.get_customer("A@X.COM").customer_id == customer.get_customers(["A@X.COM"])["A@X.COM"].customer_id
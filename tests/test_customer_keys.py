@@ -0,0 +1,79 @@
+import pytest
+from utils import crud, models, schemas, customer_keys
+from .conftest import seed_bookings
+
+
+@pytest.mark.parametrize("key, expected", [
+    ("42", [(customer_keys.CUSTOMER_ID, 42)]),
+    (42, [(customer_keys.CUSTOMER_ID, 42)]),
+    (" 98-0000-0001 ", [(customer_keys.PHONE, "9800000001")]),
+    ("+91 (80) 1234.5678", [(customer_keys.PHONE, "+918012345678")]),
+    ("guest1@example.com", [(customer_keys.EMAIL, "guest1@example.com")]),
+    # Both a customer ID and a phone number
+    ("1000000", [(customer_keys.CUSTOMER_ID, 1000000), (customer_keys.PHONE, "1000000")]),
+])
+def test_classify(key, expected):
+    assert customer_keys.classify(key) == expected
+
+
+def test_classify_rejects_other_keys():
+    with pytest.raises(ValueError):
+        customer_keys.classify("Guest1")
+
+
+def test_phones_are_stored_without_separators():
+    details = schemas.CustomerBase(first_name="A", middle_name=None, last_name="B", email="a@example.com", phone="98 0000-0001")
+    assert details.phone == "9800000001"
+
+
+def test_get_customer_uses_one_column(db, query_counter):
+    seed_bookings(db, 3)
+    query_counter.clear()
+    assert crud.Customer(db).get_customer("98 0000 0001").customer_id == 2
+    assert crud.Customer(db).get_customer("guest2@example.com").customer_id == 3
+    assert crud.Customer(db).get_customer("1").customer_details.email == "guest0@example.com"
+    assert crud.Customer(db).get_customer("not a key") is None
+    assert len(query_counter) == 3
+    assert all(" OR " not in statement for statement in query_counter)
+
+
+def test_get_customers_is_one_query(db, query_counter):
+    seed_bookings(db, 3)
+    query_counter.clear()
+    customers = crud.Customer(db).get_customers(["guest2@example.com", "98-0000-0001", "1", "9899999999", "Guest1", "GUEST0@example.com"])
+    assert len(query_counter) == 1
+    assert list(customers) == ["guest2@example.com", "98-0000-0001", "1", "9899999999", "Guest1", "GUEST0@example.com"]
+    assert [c.customer_id if c else None for c in customers.values()] == [3, 2, 1, None, None, 1]
+    assert crud.Customer(db).get_customers([]) == {}
+    with pytest.raises(ValueError):
+        crud.Customer(db).get_customers([str(i) for i in range(crud.CUSTOMER_BATCH_MAX_KEYS + 1)])
+
+
+def test_customer_endpoints(db, client):
+    seed_bookings(db, 2)
+    response = client.post("/cust/batch/", json=["9800000000", "guest1@example.com", "nobody@example.com"])
+    assert response.status_code == 200
+    assert {key: c["customer_id"] for key, c in response.json()["customers"].items()} == {"9800000000": 1, "guest1@example.com": 2}
+    assert response.json()["missing"] == ["nobody@example.com"]
+    assert client.get("/cust/", params={"query": "nobody@example.com"}).status_code == 404
+    assert client.get("/cust/", params={"query": "2"}).json()["customer_id"] == 2
+
+
+def test_customer_ids_of_seven_digits_are_found(db, client, query_counter):
+    seed_bookings(db, 1)
+    for customer in [models.Customer(customer_id=1000000, first_name="Million", middle_name=None, last_name="Test",
+                                     email="million@example.com", phone="9811111111"),
+                     models.Customer(first_name="Short", middle_name=None, last_name="Phone", email="short@example.com", phone="2000000")]:
+        customer.addresses.append(models.CustomerAddress(address_type="Permanent", first_line="1 Lake View", second_line="Block A",
+                                                         landmark=None, district="Central", state="KA", pin="560001"))
+        db.add(customer)
+    db.commit()
+    query_counter.clear()
+    assert crud.Customer(db).get_customer("1000000").customer_details.email == "million@example.com"
+    assert crud.Customer(db).get_customer("2000000").customer_details.email == "short@example.com"
+    assert len(query_counter) == 2
+    assert all(" OR " not in statement for statement in query_counter)
+    customers = crud.Customer(db).get_customers(["1000000", "2000000", "3000000"])
+    assert [c.customer_details.email if c else None for c in customers.values()] == ["million@example.com", "short@example.com", None]
+    assert client.get("/cust/", params={"query": "1000000"}).json()["customer_id"] == 1000000
+    assert client.post("/cust/batch/", json=["1000000"]).json()["customers"]["1000000"]["customer_id"] == 1000000
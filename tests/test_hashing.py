@@ -0,0 +1,31 @@
+import threading
+
+import pytest
+from utils import cloudbeds_exceptions, crud, models
+from utils.hashing import PasswordHasher
+
+
+def test_login_upgrades_outdated_hash(db, monkeypatch):
+    employee = db.get(models.Employee, 1001)
+    employee.password_hash = PasswordHasher(rounds=4, workers=1, queue_size=0).hash("s3cret")
+    db.commit()
+    monkeypatch.setattr(crud, "password_hasher", PasswordHasher(rounds=5, workers=1, queue_size=0))
+
+    cb_employee = crud.Employee(db)
+    assert cb_employee.authenticate_employee("desk@example.com", "wrong") is False
+    assert cb_employee.authenticate_employee("desk@example.com", "s3cret").emp_id == 1001
+    db.expire_all()
+    assert db.get(models.Employee, 1001).password_hash.startswith("$2b$05$")
+
+
+def test_saturated_hasher_fails_fast():
+    hasher = PasswordHasher(rounds=4, workers=1, queue_size=1)
+    release = threading.Event()
+    # Occupy the only worker and the only queue slot
+    blocked = [hasher._PasswordHasher__submit(release.wait) for _ in range(2)]
+    with pytest.raises(cloudbeds_exceptions.ServiceBusy):
+        hasher.hash("s3cret")
+    release.set()
+    for future in blocked:
+        future.result()
+    assert hasher.verify_and_update("s3cret", hasher.hash("s3cret")) == (True, None)
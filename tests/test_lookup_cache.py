@@ -0,0 +1,33 @@
+from utils import crud, lookup_cache, schemas
+
+
+def test_lookup_is_case_insensitive_and_cached(db, query_counter):
+    assert lookup_cache.room_types.get_id(db, "suite") == 4
+    assert lookup_cache.room_types.get_name(db, 4) == "Suite"
+    query_counter.clear()
+    assert lookup_cache.room_types.get_id(db, "SUITE") == 4
+    assert lookup_cache.room_types.get_id(db, "Penthouse") is None
+    assert query_counter == []
+
+
+def test_manage_room_types_invalidates_cache(db):
+    room = crud.Room(db)
+    assert not room._verify_room_type("Penthouse")
+    room.manage_room_types("add", "Penthouse")
+    assert room._verify_room_type("penthouse")
+    room.manage_room_types("delete", "Penthouse")
+    assert not room._verify_room_type("Penthouse")
+
+
+def test_add_and_update_room_use_cached_ids(db):
+    room = crud.Room(db)
+    room.add_room(room_number=501, room_type="club", room_state="available")
+    room.update_room(room_number=501, room_type="Suite", room_state="Maintenance")
+    rooms = room.list_rooms(skip=0, limit=10, room_type="suite", room_state="maintenance")
+    assert [(r.room_number, r.room_type, r.room_state) for r in rooms] == [(501, "Suite", "Maintenance")]
+
+
+def test_add_supported_govt_id_type_invalidates_cache(db):
+    cb_booking = crud.Booking(db)
+    cb_booking.add_supported_govt_id_type(schemas.GovtIdTypeBase(name="Ration Card"))
+    assert "Ration Card" in [id_type.name for id_type in cb_booking.get_supported_govt_id_types()]
@@ -1,9 +1,10 @@
-from fastapi.testclient import TestClient
-from src.utils import api
-
-client = TestClient(api)
-
-def test_read_main():
+def test_read_main(client):
     response = client.get("/")
     assert response.status_code == 200
-    assert response.json() == {"app": "CloudBeds V1.0"}
\ No newline at end of file
+    assert response.json() == {"employee": {"email": "desk@example.com", "emp_id": 1001, "roles": []}}
+
+def test_read_main_requires_token(db):
+    from fastapi.testclient import TestClient
+    import cloudbeds
+    response = TestClient(cloudbeds.api).get("/")
+    assert response.status_code == 401
@@ -0,0 +1,66 @@
+import os
+import re
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from utils import migrations
+
+
+def write(path, name: str, sql: str) -> None:
+    (path / name).write_text(sql)
+
+
+def test_upgrade_applies_pending_migrations_in_order(tmp_path):
+    write(tmp_path, "001_create_notes.sql", "-- Notes; a comment with a semicolon;\nCREATE TABLE Notes (id INT);\n")
+    write(tmp_path, "002_add_body.sql", "ALTER TABLE Notes ADD COLUMN body TEXT;\nCREATE INDEX idx_notes_id ON Notes (id);\n")
+    write(tmp_path, "README.txt", "not a migration")
+    engine = create_engine("sqlite://")
+    loaded = migrations.load_migrations(str(tmp_path))
+    assert [m.name for m in loaded] == ["001_create_notes", "002_add_body"]
+    assert loaded[1].statements() == ["ALTER TABLE Notes ADD COLUMN body TEXT", "CREATE INDEX idx_notes_id ON Notes (id)"]
+
+    assert [m.version for m in migrations.upgrade(engine, loaded, target=1, log=lambda line: None)] == [1]
+    assert [m.version for m in migrations.upgrade(engine, loaded, log=lambda line: None)] == [2]
+    assert migrations.upgrade(engine, loaded, log=lambda line: None) == []
+    assert migrations.applied_versions(engine) == {1, 2}
+    assert [c["name"] for c in inspect(engine).get_columns("Notes")] == ["id", "body"]
+
+
+def test_failed_migration_is_not_recorded(tmp_path):
+    write(tmp_path, "001_broken.sql", "CREATE TABLE Notes (id INT);\nALTER TABLE Missing ADD COLUMN x INT;\n")
+    engine = create_engine("sqlite://")
+    with pytest.raises(Exception):
+        migrations.upgrade(engine, migrations.load_migrations(str(tmp_path)), log=lambda line: None)
+    assert migrations.applied_versions(engine) == set()
+
+
+def test_stamp_and_duplicate_versions(tmp_path):
+    write(tmp_path, "001_a.sql", "CREATE TABLE A (id INT);")
+    write(tmp_path, "002_b.sql", "CREATE TABLE B (id INT);")
+    engine = create_engine("sqlite://")
+    assert [m.version for m in migrations.stamp(engine, migrations.load_migrations(str(tmp_path)), 1)] == [1]
+    assert [m.version for m in migrations.upgrade(engine, migrations.load_migrations(str(tmp_path)), log=lambda line: None)] == [2]
+    assert not inspect(engine).has_table("A")
+    write(tmp_path, "002_c.sql", "CREATE TABLE C (id INT);")
+    with pytest.raises(ValueError, match="same version"):
+        migrations.load_migrations(str(tmp_path))
+
+
+def test_create_tables_records_every_migration():
+    with open(os.path.join(os.path.dirname(migrations.MIGRATIONS_PATH), "create-tables-1.sql")) as file:
+        ddl: str = file.read()
+    recorded = re.findall(r"\((\d+), '(\w+)', NOW\(\)\)", ddl)
+    assert [(int(version), name) for version, name in recorded] == [(m.version, m.name) for m in migrations.load_migrations()]
+
+
+def test_hot_queries_use_indexes(db):
+    plans = migrations.check(db)
+    assert {plan.name for plan in plans} == {name for name, _ in migrations.hot_queries()}
+    assert [plan for plan in plans if plan.full_scans] == []
+
+
+def test_check_reports_full_scans(db):
+    db.execute(text("DROP INDEX idx_bk_booking_id"))
+    db.commit()
+    failed = {plan.name for plan in migrations.check(db) if plan.full_scans}
+    assert failed == {"booking by booking ID", "booking page by booking ID"}
@@ -0,0 +1,18 @@
+from datetime import date
+
+import pytest
+
+from utils import crud
+from .conftest import seed_bookings
+
+
+def test_occupancy_grid_is_run_length_encoded(db):
+    seed_bookings(db, 2)
+    cb_booking = crud.Booking(db)
+    cb_booking.cancel_booking("B1003")
+    grid = cb_booking.get_occupancy(date(2024, 1, 31), 5)
+    assert grid.statuses == {0: "Free", 2: "Booked"}
+    # Room 100 is booked for the nights of Feb 1 and 2; the booking of room 101 is cancelled
+    assert [(room.room_number, room.runs) for room in grid.rooms] == [(100, [0, 1, 2, 2, 0, 2]), (101, [0, 5])]
+    with pytest.raises(ValueError):
+        cb_booking.get_occupancy(date(2024, 1, 31), 0)
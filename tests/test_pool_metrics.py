@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from utils.pool_metrics import PoolStats, instrumented_pool_class
+
+
+def test_pool_stats_record_checkouts_waits_and_timeouts(tmp_path):
+    stats = PoolStats()
+    engine = create_engine(f"sqlite:///{tmp_path}/pool.db", poolclass=instrumented_pool_class(QueuePool, stats),
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    stats.listen(engine)
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        snapshot = stats.snapshot(engine.pool)
+        assert (snapshot["checked_out"], snapshot["overflow"]) == (1, 0)
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+
+    snapshot = stats.snapshot(engine.pool)
+    assert snapshot["pool_class"] == "InstrumentedQueuePool"
+    assert (snapshot["checkouts"], snapshot["checkins"], snapshot["connects"]) == (1, 1, 1)
+    assert snapshot["checkout_timeouts"] == 1
+    assert sum(snapshot["wait_time_histogram"].values()) == 1
+    engine.dispose()
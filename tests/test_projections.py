@@ -0,0 +1,49 @@
+from utils import crud, models, schemas
+from .conftest import seed_bookings
+
+
+def test_list_customers_is_one_query_without_entities(db, query_counter):
+    seed_bookings(db, 3)
+    # A second address of a customer doesn't duplicate the customer
+    db.add(models.CustomerAddress(customer_id=1, address_type="Correspondence", first_line="9 Hill Rd", second_line="Flat 2",
+                                  landmark=None, district="North", state="KA", pin="560002"))
+    db.commit()
+    db.expunge_all()
+    query_counter.clear()
+    customer = crud.Customer(db)
+    customers = customer.list_customers(skip=0, limit=2)
+    assert len(query_counter) == 1
+    assert len(db.identity_map) == 0
+    assert [c.customer_id for c in customers] == [1, 2]
+    assert customers[0].customer_details.email == "guest0@example.com"
+    assert isinstance(customers[0].customer_details, schemas.CustomerBase)
+    assert customers[0].customer_address.first_line == "0 Lake View"
+    assert customer.next_cursor is not None
+    assert [c.customer_id for c in customer.list_customers(skip=0, limit=2, cursor=customer.next_cursor)] == [3]
+
+
+def test_get_customer_by_phone(db):
+    seed_bookings(db, 2)
+    customer = crud.Customer(db).get_customer("9800000001")
+    assert customer.customer_id == 2
+    assert customer.customer_address.address_type == "Permanent"
+    assert crud.Customer(db).get_customer("0000000000") is None
+
+
+def test_employee_payload_skips_the_login_columns(db, query_counter):
+    db.expunge_all()
+    query_counter.clear()
+    employees = crud.Employee(db).list_employees(skip=0, limit=10)
+    assert len(query_counter) == 1
+    assert "password_hash" not in query_counter[0] and "login" not in query_counter[0]
+    assert employees[0].emp_id == 1001
+    assert employees[0].emp_details.phone == 9000000000
+    assert employees[0].emp_address.pin == "560001"
+    assert crud.get_employee(1001, db) == employees[0]
+    assert crud.Employee(db).list_employees(query_value="desk@example.com") == employees
+
+
+def test_list_employees_invalid_cursor(client):
+    response = client.get("/emp/list/?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert client.get("/emp/list/").status_code == 200
@@ -0,0 +1,78 @@
+import logging
+import re
+
+import pytest
+from utils import crud
+from utils.query_metrics import query_metrics, parse_budgets
+from .conftest import seed_bookings
+
+
+@pytest.fixture
+def metrics(engine, monkeypatch):
+    '''The process-wide query metrics, listening on the test database, with clean counters.'''
+    query_metrics.listen(engine)
+    query_metrics.reset()
+    monkeypatch.setattr(query_metrics, "budgets", {})
+    yield query_metrics
+    query_metrics.reset()
+
+
+def server_timing(response) -> tuple[float, int, int]:
+    '''Returns the database time, statements and rows of the Server-Timing header.'''
+    match = re.match(r'db;dur=([\d.]+);desc="(\d+) statements, (\d+) rows", app;dur=[\d.]+$', response.headers["Server-Timing"])
+    assert match, response.headers["Server-Timing"]
+    return float(match.group(1)), int(match.group(2)), int(match.group(3))
+
+
+def test_server_timing_counts_the_statements_of_the_request(db, client, metrics, query_counter):
+    seed_bookings(db, 3)
+    query_counter.clear()
+    response = client.get("/booking/list/?limit=10")
+    assert response.status_code == 200
+    _, statements, _ = server_timing(response)
+    assert statements == len(query_counter) > 0
+
+
+def test_statements_are_aggregated_per_route(db, client, metrics):
+    seed_bookings(db, 2)
+    for query in ("9800000000", "9800000001", "guest1@example.com"):
+        assert client.get(f"/cust/?query={query}").status_code == 200
+    assert client.get("/booking/govt_id_image/B9999").status_code == 404
+    # Statements sent outside of a request aren't counted
+    crud.Customer(db).get_customer("9800000000")
+
+    stats = client.get("/admin/query_metrics/stats/").json()
+    assert stats["GET /cust/"]["requests"] == 3
+    assert stats["GET /cust/"]["statements"] == 3 * stats["GET /cust/"]["max_statements"]
+    # Routes are named by their path template
+    assert stats["GET /booking/govt_id_image/{booking_id}"]["requests"] == 1
+
+
+def test_rows_written_are_counted(client, metrics):
+    payload = {"customer_details": {"first_name": "Asha", "middle_name": None, "last_name": "Rao", "email": "asha@example.com", "phone": "9811111111"},
+               "customer_address": {"first_line": "1 Lake View", "second_line": "Block A", "landmark": None, "district": "Central",
+                                    "state": "KA", "pin": "560001", "address_type": "Permanent"}}
+    response = client.post("/cust/add/", json=payload)
+    assert response.status_code == 200
+    # The customer and the address
+    assert server_timing(response)[2] >= 2
+
+
+def test_strict_mode_warns_when_a_route_exceeds_its_budget(db, client, metrics, monkeypatch, caplog):
+    seed_bookings(db, 2)
+    monkeypatch.setattr(query_metrics, "strict", True)
+    monkeypatch.setattr(query_metrics, "budgets", {"GET /booking/list/": 1})
+    with caplog.at_level(logging.WARNING, logger="utils.query_metrics"):
+        client.get("/booking/list/?limit=10")
+        client.get("/room/list/?limit=10")
+    assert [record.getMessage().split()[:3] for record in caplog.records] == [["GET", "/booking/list/", "sent"]]
+    stats = query_metrics.stats()
+    assert (stats["GET /booking/list/"]["budget"], stats["GET /booking/list/"]["over_budget"]) == (1, 1)
+    assert stats["GET /room/list/"]["over_budget"] == 0
+
+
+def test_parse_budgets():
+    assert parse_budgets("POST /booking/bulk_add/=200, GET  /booking/export/=0") == {"POST /booking/bulk_add/": 200, "GET /booking/export/": 0}
+    assert parse_budgets("") == {}
+    with pytest.raises(ValueError):
+        parse_budgets("/booking/list/=5")
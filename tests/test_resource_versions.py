@@ -0,0 +1,43 @@
+from utils import crud
+from utils.resource_versions import ResourceVersions, etag_matches
+from .conftest import seed_bookings
+
+
+def test_etag_changes_with_the_versions_and_the_params():
+    versions = ResourceVersions(max_age=60)
+    etag = versions.etag(("rooms", "room_types"), "/room/list/", "limit=2")
+    assert etag == versions.etag(("rooms", "room_types"), "/room/list/", "limit=2")
+    assert etag != versions.etag(("rooms", "room_types"), "/room/list/", "limit=3")
+    versions.bump("room_types")
+    assert etag != versions.etag(("rooms", "room_types"), "/room/list/", "limit=2")
+    # Another process never issues the same ETag
+    assert etag != ResourceVersions(max_age=60).etag(("rooms", "room_types"), "/room/list/", "limit=2")
+
+
+def test_etag_matches():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+def test_not_modified_skips_the_query(db, client, query_counter):
+    seed_bookings(db, 2)
+    response = client.get("/room/list/?limit=10")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    query_counter.clear()
+    response = client.get("/room/list/?limit=10", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    assert query_counter == []
+
+    # A write to a resource that the list is built from changes the ETag
+    crud.Room(db).update_room(100, "Suite", "Available")
+    response = client.get("/room/list/?limit=10", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["room_type"] == "Suite"
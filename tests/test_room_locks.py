@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from datetime import date
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.util import await_only
+
+from utils import crud, cloudbeds_exceptions
+from utils.room_locks import RoomLockManager
+from .conftest import seed_bookings
+from .test_bulk_booking import booking_in
+
+
+def test_only_rooms_of_the_same_shard_wait(engine):
+    locks = RoomLockManager(shards=4, timeout=5)
+    Session = sessionmaker(bind=engine)
+    holding, release = threading.Event(), threading.Event()
+
+    def hold_room_1():
+        with Session() as db, locks.hold(db, [1]):
+            holding.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold_room_1)
+    thread.start()
+    holding.wait()
+    # Room 2 is in another shard
+    with Session() as db, locks.hold(db, [2]):
+        pass
+    assert locks.stats()["contended"] == 0
+    # Room 5 shares the shard of room 1, so it waits until room 1 is released
+    threading.Timer(0.05, release.set).start()
+    start = time.monotonic()
+    with Session() as db, locks.hold(db, [5]):
+        assert time.monotonic() - start >= 0.04
+    thread.join()
+    stats = locks.stats()
+    assert (stats["acquisitions"], stats["contended"], stats["timeouts"]) == (3, 1, 0)
+    assert stats["wait_time_ms_total"] >= 40
+
+
+def test_timeout_raises_service_busy(engine):
+    locks = RoomLockManager(shards=4, timeout=0.01)
+    Session = sessionmaker(bind=engine)
+    with Session() as db, locks.hold(db, [1]):
+        with pytest.raises(cloudbeds_exceptions.ServiceBusy):
+            with Session() as other, locks.hold(other, [1, 2]):
+                pass
+    assert locks.stats()["timeouts"] == 1
+    # The shards taken before the timeout were released
+    with Session() as db, locks.hold(db, [2]):
+        pass
+
+
+def test_waits_on_the_event_loop_inside_run_sync():
+    locks = RoomLockManager(shards=4, timeout=5)
+    order: list[str] = []
+
+    def book(session, name: str):
+        with locks.hold(session, [1]):
+            order.append(f"{name} in")
+            # The holder yields to the event loop, like it does while it waits for the database
+            await_only(asyncio.sleep(0.02))
+            order.append(f"{name} out")
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with AsyncSession(engine) as first, AsyncSession(engine) as second:
+            await asyncio.gather(first.run_sync(book, "a"), second.run_sync(book, "b"))
+        await engine.dispose()
+
+    asyncio.run(main())
+    assert order == ["a in", "a out", "b in", "b out"]
+    assert locks.stats()["contended"] == 1
+
+
+def test_add_booking_holds_the_room_lock(db, monkeypatch):
+    locks = RoomLockManager(shards=4, timeout=5)
+    monkeypatch.setattr(crud, "room_locks", locks)
+    seed_bookings(db, 1)
+    crud.Booking(db).add_booking(booking_in(100, date(2024, 2, 3), date(2024, 2, 5)))
+    with pytest.raises(ValueError):
+        crud.Booking(db).update_booking("B1003", booking_in(100, date(2024, 2, 1), date(2024, 2, 4)))
+    assert locks.stats()["acquisitions"] == 2
@@ -0,0 +1,97 @@
+from datetime import date
+
+import pytest
+from utils import crud, models, schemas
+from utils.search_index import customer_search, trigrams, words
+from .conftest import seed_bookings
+from .test_bulk_booking import booking_in
+
+
+def add_customer(db, first_name: str, last_name: str, phone: str, email: str) -> int:
+    address = schemas.CustomerAddressBase(first_line="1 Main Rd", second_line="Block A", landmark=None, district="Central",
+                                          state="KA", pin="560001", address_type="Permanent")
+    details = schemas.CustomerBase(first_name=first_name, middle_name=None, last_name=last_name, email=email, phone=phone)
+    return crud.Customer(db).add_customer(schemas.CustomerIn(customer_details=details, customer_address=address)).customer_id
+
+
+def search(db, query: str, skip: int = 0, limit: int = 20) -> list[str]:
+    return [c.customer_details.last_name for c in crud.Customer(db).search_customers(query, skip, limit)]
+
+
+def test_words_and_trigrams():
+    assert words("Asha Rao 98-0000 0001 asha.rao@example.com") == ["asha", "rao", "9800000001", "asha", "rao", "example", "com"]
+    assert trigrams("Rao") == {"  r", " ra", "rao", "ao "}
+    assert trigrams("Ra", prefix=True) == {"  r", " ra"}
+
+
+def test_prefix_typo_phone_and_email_matches(db):
+    add_customer(db, "Asha", "Sharma", "9811111111", "asha@example.com")
+    add_customer(db, "Ravi", "Sharman", "9822222222", "ravi@example.com")
+    add_customer(db, "Meera", "Iyer", "9833333333", "meera.iyer@example.com")
+    assert search(db, "sharma") == ["Sharma", "Sharman"]
+    assert search(db, "shar") == ["Sharma", "Sharman"]
+    assert search(db, "shrma") == ["Sharma", "Sharman"]
+    assert search(db, "asha sharma") == ["Sharma", "Sharman"]
+    assert search(db, "ravi sharma") == ["Sharman", "Sharma"]
+    assert search(db, "98-3333") == ["Iyer"]
+    assert search(db, "meera.iyer@") == ["Iyer"]
+    assert search(db, "zzz") == []
+    assert search(db, "sharma", skip=1, limit=1) == ["Sharman"]
+    with pytest.raises(ValueError):
+        search(db, "s")
+
+
+def test_index_follows_the_writes(db):
+    seed_bookings(db, 2)
+    customer_id = add_customer(db, "Asha", "Sharma", "9811111111", "asha@example.com")
+    assert search(db, "sharma") == ["Sharma"]
+    # Customers added by the bookings are searchable without waiting for a refresh
+    crud.Booking(db).add_booking(booking_in(100, date(2024, 2, 3), date(2024, 2, 5), i=7))
+    crud.Booking(db).add_bookings(schemas.BulkBookingIn(bookings=[booking_in(101, date(2024, 2, 3), date(2024, 2, 5), i=8),
+                                                                  booking_in(101, date(2024, 2, 5), date(2024, 2, 7), i=9)]))
+    assert search(db, "group") == ["Guest7", "Guest8", "Guest9"]
+    details = schemas.CustomerBase(first_name="Asha", middle_name=None, last_name="Verma", email="asha@example.com", phone="9811111111")
+    address = schemas.CustomerAddressBase(first_line="1 Main Rd", second_line="Block A", landmark=None, district="Central",
+                                          state="KA", pin="560001", address_type="Permanent")
+    crud.Customer(db).update_customer(schemas.CustomerOut(customer_id=customer_id, customer_details=details, customer_address=address))
+    assert search(db, "sharma") == []
+    assert search(db, "verma") == ["Verma"]
+
+
+def test_updated_rows_dont_crowd_out_better_matches(db):
+    # Enough other customers that the trigrams of sharma are stored as postings rather than dense
+    seed_bookings(db, 8)
+    customer_id = add_customer(db, "Asha", "Sharma", "9811111111", "asha@example.com")
+    add_customer(db, "Ravi", "Sharma", "9822222222", "ravi@example.com")
+    address = schemas.CustomerAddressBase(first_line="1 Main Rd", second_line="Block A", landmark=None, district="Central",
+                                          state="KA", pin="560001", address_type="Permanent")
+    assert search(db, "sharma") == ["Sharma", "Sharma"]
+    for last_name in ["Verma", "Sharma", "Verma", "Sharma", "Verma"]:
+        details = schemas.CustomerBase(first_name="Asha", middle_name=None, last_name=last_name, email="asha@example.com", phone="9811111111")
+        crud.Customer(db).update_customer(schemas.CustomerOut(customer_id=customer_id, customer_details=details, customer_address=address))
+    # The edited customer no longer contains the trigrams of sharma, and doesn't take the only candidate slot
+    assert [c.customer_details.first_name for c in crud.Customer(db).search_customers("ravi sharma", 0, 1)] == ["Ravi"]
+    assert search(db, "sharma", limit=1) == ["Sharma"]
+    assert search(db, "verma") == ["Verma"]
+    assert customer_search.stats()["stale_postings"] > 0
+
+
+def test_rows_of_other_processes_are_read_on_refresh(db, monkeypatch):
+    add_customer(db, "Asha", "Sharma", "9811111111", "asha@example.com")
+    assert search(db, "sharma") == ["Sharma"]
+    db.add(models.Customer(first_name="Ravi", middle_name=None, last_name="Sharman", email="ravi@example.com", phone="9822222222"))
+    db.add(models.CustomerAddress(customer_id=2, address_type="Permanent", first_line="2 Main Rd", second_line="Block A",
+                                  landmark=None, district="Central", state="KA", pin="560001"))
+    db.commit()
+    assert search(db, "sharma") == ["Sharma"]
+    monkeypatch.setattr(customer_search, "max_age", 0)
+    assert search(db, "sharma") == ["Sharma", "Sharman"]
+
+
+def test_search_endpoints(db, client):
+    add_customer(db, "Asha", "Sharma", "9811111111", "asha@example.com")
+    response = client.get("/cust/search/", params={"q": "sharm"})
+    assert response.status_code == 200
+    assert [c["customer_id"] for c in response.json()] == [1]
+    assert client.get("/cust/search/", params={"q": "s"}).status_code == 400
+    assert [e["emp_id"] for e in client.get("/emp/search/", params={"q": "front desk"}).json()] == [1001]
@@ -0,0 +1,52 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from utils import auth, crud
+from utils.token_cache import TokenCache
+
+
+def test_get_current_employee_uses_cache(db, monkeypatch):
+    cache = TokenCache(max_size=8)
+    monkeypatch.setattr(auth, "token_cache", cache)
+    token = crud.Employee(db).create_access_token("desk@example.com", 1001, timedelta(minutes=5), roles=["Admin"])
+
+    first = asyncio.run(auth.get_current_employee(token, db))
+    second = asyncio.run(auth.get_current_employee(token, db))
+    assert first == second == {"email": "desk@example.com", "emp_id": 1001, "roles": ["Admin"]}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_is_bounded_and_expires():
+    cache = TokenCache(max_size=2)
+    now = time.time()
+    cache.put("a", {"emp_id": 1}, now + 60)
+    cache.put("b", {"emp_id": 2}, now + 60)
+    cache.get("a")
+    cache.put("c", {"emp_id": 3}, now + 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == {"emp_id": 1}
+    cache.put("d", {"emp_id": 4}, now - 1)
+    assert cache.get("d") is None
+    assert cache.stats()["size"] == 1
+
+
+def test_deactivating_employee_evicts_tokens(db, monkeypatch):
+    cache = TokenCache(max_size=8)
+    monkeypatch.setattr(crud, "token_cache", cache)
+    cache.put("token", {"emp_id": 1001}, time.time() + 60)
+    crud.manage_employee(1001, False, db)
+    assert cache.get("token") is None
+
+
+def test_deactivated_employee_token_is_rejected(db, client):
+    import cloudbeds
+    # Verify the token for real instead of the fixture's authenticated employee
+    del cloudbeds.api.dependency_overrides[cloudbeds.get_current_employee]
+    token = crud.Employee(db).create_access_token("desk@example.com", 1001, timedelta(minutes=5))
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/", headers=headers).status_code == 200
+    crud.manage_employee(1001, False, db)
+    assert client.get("/", headers=headers).status_code == 401
+    # Still rejected once the rejection isn't cached
+    assert client.get("/", headers=headers).status_code == 401